@@ -8,6 +8,12 @@ import ReactMarkdown from 'react-markdown';
 import { Button } from './ui/button';
 import { Card } from './ui/card';
 
+// Citation label for a streamed source ("Page 4" or "Pages 4-5"); pages arrive 1-based
+const sourceLabel = (source) =>
+  source.page_end != null && source.page_end !== source.page
+    ? `Pages ${source.page}-${source.page_end}`
+    : `Page ${source.page}`;
+
 const ChatInterface = () => {
   const navigate = useNavigate();
   const {
@@ -19,6 +25,7 @@ const ChatInterface = () => {
     setIsStreaming,
     addMessage,
     updateLastMessage,
+    setLastMessageSources,
     setQuizData,
   } = useApp();
 
@@ -82,6 +89,10 @@ const ChatInterface = () => {
             console.log('Tool started:', action);
             setToolStatus(action);
           },
+          onSources: (sources) => {
+            // Citations arrive before the answer that uses them
+            setLastMessageSources(sources);
+          },
           onEnd: () => {
             console.log('Stream ended');
             setIsStreaming(false);
@@ -216,6 +227,22 @@ const ChatInterface = () => {
                           <div className="prose prose-sm max-w-none text-[rgb(var(--color-foreground))]">
                             <ReactMarkdown>{message.content || '...'}</ReactMarkdown>
                           </div>
+                          {message.sources?.length > 0 && (
+                            <div className="mt-3 pt-3 border-t border-[rgb(var(--color-border))]">
+                              <p className="text-xs font-semibold text-[rgb(var(--color-muted-foreground))] mb-2">Sources</p>
+                              <ul className="space-y-1">
+                                {message.sources.map((source, sourceIndex) => (
+                                  <li key={sourceIndex} className="text-xs text-[rgb(var(--color-muted-foreground))]">
+                                    <span className="font-medium text-[rgb(var(--color-primary))]">
+                                      {sourceLabel(source)}
+                                    </span>
+                                    {source.section && <span> · {source.section}</span>}
+                                    <span className="block italic">{source.snippet}</span>
+                                  </li>
+                                ))}
+                              </ul>
+                            </div>
+                          )}
                         </div>
                       </div>
                     </div>
@@ -98,6 +98,20 @@ export const AppProvider = ({ children }) => {
     });
   };
 
+  const setLastMessageSources = (sources) => {
+    setMessages((prev) => {
+      const newMessages = [...prev];
+      if (newMessages.length > 0) {
+        const lastMessage = newMessages[newMessages.length - 1];
+        newMessages[newMessages.length - 1] = {
+          ...lastMessage,
+          sources: [...(lastMessage.sources || []), ...sources],
+        };
+      }
+      return newMessages;
+    });
+  };
+
   const startNewConversation = () => {
     setMessages([]);
     setCheckpointId(null);
@@ -123,6 +137,7 @@ export const AppProvider = ({ children }) => {
     setIsStreaming,
     addMessage,
     updateLastMessage,
+    setLastMessageSources,
     startNewConversation,
 
     // Quiz state
@@ -49,6 +49,25 @@ export const deleteDocument = async (docId) => {
   return response.data;
 };
 
+/**
+ * Generate a structured quiz without going through the chat agent
+ * @param {string} docId - The document ID to create the quiz from
+ * @param {Object} options - Quiz options
+ * @param {number} options.numQuestions - Number of questions (1-10)
+ * @param {string} options.difficulty - Difficulty level (easy, medium, hard)
+ * @param {string|null} options.pages - Optional comma-separated page numbers
+ * @returns {Promise} - Quiz with questions in the same shape as parseQuizFromAI
+ */
+export const generateQuiz = async (docId, { numQuestions = 5, difficulty = 'medium', pages = null } = {}) => {
+  const response = await apiClient.post('/quiz', {
+    doc_id: docId,
+    num_questions: numQuestions,
+    difficulty,
+    pages,
+  });
+  return response.data;
+};
+
 /**
  * Health check endpoint
  * @returns {Promise} - Health status
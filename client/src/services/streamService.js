@@ -12,15 +12,22 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || 'https://pdf-study-assistan
  * @param {Function} callbacks.onToolStart - Called when tool execution starts
  * @param {Function} callbacks.onEnd - Called when streaming ends
  * @param {Function} callbacks.onError - Called when an error occurs
+ * @param {Function} callbacks.onUsage - Called with cached/uncached prompt token counts for the turn
+ * @param {Function} callbacks.onSources - Called with the sources a tool retrieved ({ id, page, page_end?, section?, snippet })
+ * @param {Object} [direct] - Optional direct tool call that skips the routing step
+ * @param {string} [direct.tool] - Tool name (e.g. 'generate_summary_tool', 'generate_quiz_tool')
+ * @param {Object} [direct.toolArgs] - Tool arguments (e.g. { pages: '1,2,3' })
  * @returns {Function} - Cleanup function to abort the stream
  */
-export const streamChat = async (message, docId, checkpointId, callbacks) => {
+export const streamChat = async (message, docId, checkpointId, callbacks, { tool = null, toolArgs = null } = {}) => {
   const {
     onCheckpoint = () => {},
     onContent = () => {},
     onToolStart = () => {},
     onEnd = () => {},
     onError = () => {},
+    onUsage = () => {},
+    onSources = () => {},
   } = callbacks;
 
   // Create AbortController for cleanup
@@ -36,6 +43,8 @@ export const streamChat = async (message, docId, checkpointId, callbacks) => {
         message,
         doc_id: docId,
         checkpoint_id: checkpointId,
+        tool,
+        tool_args: toolArgs,
       }),
       signal: abortController.signal,
     });
@@ -46,6 +55,7 @@ export const streamChat = async (message, docId, checkpointId, callbacks) => {
 
     const reader = response.body.getReader();
     const decoder = new TextDecoder();
+    let buffer = '';
 
     // Read the stream
     while (true) {
@@ -55,13 +65,13 @@ export const streamChat = async (message, docId, checkpointId, callbacks) => {
         break;
       }
 
-      // Decode the chunk
-      const chunk = decoder.decode(value, { stream: true });
-
-      // Split by newlines to handle multiple events in one chunk
-      const lines = chunk.split('\n');
+      // Decode the chunk and keep any trailing partial line for the next read
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
 
       for (const line of lines) {
+        // Lines starting with ':' are keepalive comments and are ignored
         // SSE format: "data: {json}"
         if (line.startsWith('data: ')) {
           try {
@@ -82,6 +92,14 @@ export const streamChat = async (message, docId, checkpointId, callbacks) => {
                 onToolStart(data.action);
                 break;
 
+              case 'sources':
+                onSources(data.sources, data.tool);
+                break;
+
+              case 'usage':
+                onUsage(data);
+                break;
+
               case 'end':
                 onEnd();
                 break;
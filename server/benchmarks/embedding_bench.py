@@ -0,0 +1,130 @@
+"""
+Embedding throughput and memory: per-worker models vs. the shared server.
+
+For each worker count, runs N worker processes that embed chunk-sized
+texts for a fixed duration and reports:
+    - embed QPS (texts/second across all workers)
+    - total RSS (workers + embedding server) and RSS per worker
+
+Modes:
+    inprocess  every worker loads its own model (current multi-worker behavior)
+    shared     workers call one EmbeddingServer over a local socket
+
+Usage (from the server/ directory; Linux, reads /proc for RSS):
+    python -m benchmarks.embedding_bench --workers 1 2 4 8 --duration 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import multiprocessing
+
+SAMPLE_TEXT = (
+    "Entropy is a measure of the number of microscopic configurations that "
+    "correspond to a thermodynamic system in a state specified by certain "
+    "macroscopic variables. The second law states that the entropy of an "
+    "isolated system never decreases over time. "
+) * 4
+
+
+def _rss_bytes(pid: int) -> int:
+    """Resident set size of a process (Linux)"""
+    with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _worker(mode: str, address: str, batch: int, duration: float, start_at: float, results):
+    """Embed batches until the deadline; report text count and RSS"""
+    if mode == "shared":
+        from server_apps.EmbeddingServer import RemoteEmbeddings
+        embeddings = RemoteEmbeddings(address)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from server_apps.Document import EMBEDDING_MODEL
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+    texts = [f"{i} {SAMPLE_TEXT}" for i in range(batch)]
+    embeddings.embed_documents(texts[:1])  # Load / connect before the clock starts
+
+    while time.time() < start_at:
+        time.sleep(0.01)
+
+    count = 0
+    deadline = start_at + duration
+    while time.time() < deadline:
+        embeddings.embed_documents(texts)
+        count += len(texts)
+
+    results.put({"pid": os.getpid(), "texts": count, "rss": _rss_bytes(os.getpid())})
+
+
+def run_mode(mode: str, workers: int, batch: int, duration: float, address: str) -> dict:
+    server = None
+    if mode == "shared":
+        server = subprocess.Popen(
+            [sys.executable, "-m", "server_apps.EmbeddingServer", "--serve-only", "--socket", address]
+        )
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    # Generous start barrier: model loads happen before it
+    start_at = time.time() + 30 + 10 * workers
+    processes = [
+        context.Process(target=_worker, args=(mode, address, batch, duration, start_at, results))
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        reports = [results.get(timeout=start_at - time.time() + duration + 120) for _ in processes]
+        server_rss = _rss_bytes(server.pid) if server is not None else 0
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    worker_rss = sum(r["rss"] for r in reports)
+    return {
+        "mode": mode,
+        "workers": workers,
+        "qps": sum(r["texts"] for r in reports) / duration,
+        "total_rss_mb": (worker_rss + server_rss) / 2**20,
+        "worker_rss_mb": worker_rss / workers / 2**20,
+        "server_rss_mb": server_rss / 2**20
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding QPS and RSS by worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", choices=["inprocess", "shared"], default=["inprocess", "shared"])
+    parser.add_argument("--batch", type=int, default=8, help="Texts per request (one upload batch or query)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per run")
+    parser.add_argument("--socket", default=f"/tmp/embedding_bench_{os.getpid()}.sock")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    report = []
+    for mode in args.modes:
+        for workers in args.workers:
+            result = run_mode(mode, workers, args.batch, args.duration, args.socket)
+            print(json.dumps(result), file=sys.stderr)
+            report.append(result)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
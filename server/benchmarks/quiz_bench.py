@@ -0,0 +1,134 @@
+"""
+Quiz latency: structured POST /quiz vs. the agent path through POST /chat.
+
+Runs against a live server and reports, per path, total latency, time to
+first question (streamed /quiz) or first token (/chat), and how many of the
+requested questions came back valid. The /chat path is scored with the same
+"Question N: ... Correct Answer: X" format that quizService.js parses.
+
+Usage (from the server/ directory, with the API running):
+    python -m benchmarks.quiz_bench --url http://localhost:8000 --doc-id <id> --runs 5
+"""
+
+import re
+import json
+import time
+import argparse
+import statistics
+
+import requests
+
+
+def _read_sse(response):
+    """Yield (elapsed_seconds, event_dict) for each SSE data frame"""
+    start = time.perf_counter()
+    buffer = ""
+    for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.startswith("data: "):
+                yield time.perf_counter() - start, json.loads(line[6:])
+
+
+def _count_text_questions(text: str) -> int:
+    """Count questions the client-side regex parser would accept"""
+    blocks = [b for b in re.split(r"Question \d+:", text, flags=re.IGNORECASE) if b.strip()]
+    valid = 0
+    for block in blocks:
+        options = re.findall(r"^\s*[A-D][):.]?\s*(.+)$", block, flags=re.MULTILINE)
+        if len(options) >= 4 and re.search(r"correct\s*answer", block, flags=re.IGNORECASE):
+            valid += 1
+    return valid
+
+
+def run_quiz_json(url: str, doc_id: str, num_questions: int) -> dict:
+    start = time.perf_counter()
+    response = requests.post(
+        f"{url}/quiz",
+        json={"doc_id": doc_id, "num_questions": num_questions},
+        timeout=300
+    )
+    response.raise_for_status()
+    body = response.json()
+    return {
+        "total_s": time.perf_counter() - start,
+        "first_s": time.perf_counter() - start,
+        "valid": len(body.get("questions", []))
+    }
+
+
+def run_quiz_stream(url: str, doc_id: str, num_questions: int) -> dict:
+    start = time.perf_counter()
+    first, valid = None, 0
+    with requests.post(
+        f"{url}/quiz",
+        json={"doc_id": doc_id, "num_questions": num_questions, "stream": True},
+        stream=True,
+        timeout=300
+    ) as response:
+        response.raise_for_status()
+        for elapsed, event in _read_sse(response):
+            if event["type"] == "question":
+                valid += 1
+                first = first if first is not None else elapsed
+    return {"total_s": time.perf_counter() - start, "first_s": first, "valid": valid}
+
+
+def run_chat(url: str, doc_id: str, num_questions: int) -> dict:
+    start = time.perf_counter()
+    first, text = None, []
+    with requests.post(
+        f"{url}/chat",
+        json={"doc_id": doc_id, "message": f"Create {num_questions} quiz questions"},
+        stream=True,
+        timeout=300
+    ) as response:
+        response.raise_for_status()
+        for elapsed, event in _read_sse(response):
+            if event["type"] == "content":
+                text.append(event["content"])
+                first = first if first is not None else elapsed
+    return {
+        "total_s": time.perf_counter() - start,
+        "first_s": first,
+        "valid": _count_text_questions("".join(text))
+    }
+
+
+def summarize(samples: list, num_questions: int) -> dict:
+    totals = [s["total_s"] for s in samples]
+    firsts = [s["first_s"] for s in samples if s["first_s"] is not None]
+    return {
+        "runs": len(samples),
+        "total_mean_s": statistics.mean(totals),
+        "total_max_s": max(totals),
+        "first_mean_s": statistics.mean(firsts) if firsts else None,
+        "valid_rate": sum(s["valid"] for s in samples) / (num_questions * len(samples))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /quiz against the agent quiz path")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--doc-id", required=True)
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = {
+        "quiz_json": run_quiz_json,
+        "quiz_stream": run_quiz_stream,
+        "chat_agent": run_chat,
+    }
+
+    report = {}
+    for name, runner in paths.items():
+        samples = [runner(args.url, args.doc_id, args.num_questions) for _ in range(args.runs)]
+        report[name] = summarize(samples, args.num_questions)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
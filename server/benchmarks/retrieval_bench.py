@@ -0,0 +1,350 @@
+"""
+Retrieval micro-benchmark and quality harness for DocumentProcessor.
+
+Measures, for one or more PDFs:
+    - process_pdf stage timings (load / split / embed / total)
+    - cold vs warm get_vector_store load time
+    - search_document latency by k and page filter (store size = chunk count),
+      including wide filters: the legacy whole-document $in list vs range specs
+    - recall@k against a labeled question set (optional)
+    - storage footprint: disk and vector bytes per 1k chunks
+
+The labeled question set is a JSON list of objects:
+    [{"question": "What is entropy?", "pages": [4, 5]}, ...]
+where "pages" are the 0-based page numbers that contain the answer.
+
+Usage (from the server/ directory):
+    python -m benchmarks.retrieval_bench --pdf notes.pdf --questions qa.json
+    python -m benchmarks.retrieval_bench --pdf notes.pdf --output run.json \\
+        --baseline baseline.json --max-regression 0.15
+    python -m benchmarks.retrieval_bench --pdf notes.pdf --questions qa.json \\
+        --chunker recursive --output recursive.json
+
+Compact storage is compared against full float32 vectors with a baseline:
+    python -m benchmarks.retrieval_bench --pdf big.pdf --questions qa.json \\
+        --storage float32 --output float32.json
+    python -m benchmarks.retrieval_bench --pdf big.pdf --questions qa.json \\
+        --storage int8 --index-dims 128 --baseline float32.json
+
+When --baseline is given the run exits with status 1 if latency grows or
+recall drops by more than --max-regression (relative), so it can be used
+as a pre-deploy gate for chunking and retrieval changes.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import List, Optional, Union
+
+from server_apps.Document import (
+    DocumentProcessor,
+    CHUNKER,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    db_base_dir,
+)
+from server_apps.Quantization import EMBEDDING_STORAGE, EMBEDDING_INDEX_DIMS, STORAGE_TYPES
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of floats"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _summarize(samples: List[float]) -> dict:
+    """Latency summary in milliseconds"""
+    return {
+        "mean_ms": statistics.mean(samples) * 1000 if samples else 0.0,
+        "p50_ms": _percentile(samples, 50) * 1000,
+        "p95_ms": _percentile(samples, 95) * 1000,
+        "runs": len(samples)
+    }
+
+
+def _filter_label(page_filter) -> Optional[Union[str, int]]:
+    """Report label for a page filter: page count for lists, the spec for strings"""
+    if not page_filter:
+        return None
+    if isinstance(page_filter, str):
+        return page_filter
+    if isinstance(page_filter, dict):
+        return f"$in:{len(page_filter['page']['$in'])}"
+    return len(page_filter)
+
+
+def legacy_page_filter(pages: List[int]) -> dict:
+    """The pre-range where-filter for a page list: one $in over every page"""
+    return {"page": {"$in": pages}}
+
+
+def bench_store_load(processor: DocumentProcessor, doc_id: str, repeats: int) -> dict:
+    """Time get_vector_store with an empty cache (cold) and a primed cache (warm)"""
+    cold, warm = [], []
+    for _ in range(repeats):
+        processor.clear_cache()
+        start = time.perf_counter()
+        processor.get_vector_store(doc_id)
+        cold.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        processor.get_vector_store(doc_id)
+        warm.append(time.perf_counter() - start)
+
+    return {"cold": _summarize(cold), "warm": _summarize(warm)}
+
+
+def bench_search(
+    processor: DocumentProcessor,
+    doc_id: str,
+    queries: List[str],
+    k_values: List[int],
+    page_filters: List[Optional[Union[str, List[int], dict]]],
+    repeats: int
+) -> List[dict]:
+    """
+    Time search_document across every (k, page_filter) combination.
+
+    A dict page_filter is a raw where-filter: it is passed straight to the
+    store (bypassing compile_page_filter) to time the legacy $in form.
+    """
+    results = []
+    for k in k_values:
+        for page_filter in page_filters:
+            samples = []
+            for _ in range(repeats):
+                for query in queries:
+                    start = time.perf_counter()
+                    if isinstance(page_filter, dict):
+                        db = processor.get_vector_store(doc_id)
+                        processor.retrieve(doc_id, db, query, k, page_filter)
+                    else:
+                        processor.search_document(doc_id, query, k=k, page_filter=page_filter)
+                    samples.append(time.perf_counter() - start)
+            results.append({
+                "k": k,
+                "page_filter": _filter_label(page_filter),
+                **_summarize(samples)
+            })
+    return results
+
+
+def measure_storage(processor: DocumentProcessor, doc_id: str, chunks: int) -> dict:
+    """Disk usage of the store and bytes spent on vectors, per 1k chunks"""
+    persist_directory = os.path.join(db_base_dir, f"chroma_{doc_id}")
+    disk_bytes = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(persist_directory)
+        for name in names
+    )
+
+    dims = len(processor.embeddings.embed_query("dimension probe"))
+    compact = processor.compact_stores.get(doc_id)
+    if compact is not None:
+        vector_bytes = chunks * compact.meta["index_dims"] * 4 + compact.nbytes
+    else:
+        vector_bytes = chunks * dims * 4
+
+    per_1k = 1000 / chunks if chunks else 0.0
+    return {
+        "storage": compact.meta["storage"] if compact is not None else "float32",
+        "index_dims": compact.meta["index_dims"] if compact is not None else dims,
+        "disk_bytes": disk_bytes,
+        "disk_bytes_per_1k_chunks": disk_bytes * per_1k,
+        "vector_bytes_per_1k_chunks": vector_bytes * per_1k,
+        "float32_vector_bytes_per_1k_chunks": dims * 4 * 1000
+    }
+
+
+def evaluate_recall(
+    processor: DocumentProcessor,
+    doc_id: str,
+    labeled: List[dict],
+    k_values: List[int]
+) -> dict:
+    """
+    Compute recall@k against a labeled question set.
+
+    A question counts as a hit when at least one retrieved chunk spans one
+    of its labeled pages. Page coverage is the fraction of labeled pages
+    covered by the retrieved chunks.
+    """
+    report = {}
+    for k in k_values:
+        hits, coverage = 0, []
+        for item in labeled:
+            expected = set(item["pages"])
+            results = processor.search_document(doc_id, item["question"], k=k)
+            retrieved = set()
+            for r in results:
+                if isinstance(r.get("page"), int):
+                    retrieved.update(range(r["page"], r.get("page_end", r["page"]) + 1))
+            if expected & retrieved:
+                hits += 1
+            coverage.append(len(expected & retrieved) / len(expected) if expected else 0.0)
+        report[f"recall@{k}"] = hits / len(labeled) if labeled else 0.0
+        report[f"page_coverage@{k}"] = statistics.mean(coverage) if coverage else 0.0
+    return report
+
+
+def run(args) -> dict:
+    """Run the full harness and return the report dict"""
+    processor = DocumentProcessor(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        chunker=args.chunker,
+        chunk_tokens=args.chunk_tokens,
+        chunk_overlap_tokens=args.chunk_overlap_tokens,
+        storage=args.storage,
+        index_dims=args.index_dims
+    )
+
+    labeled = []
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            labeled = json.load(f)
+
+    queries = [item["question"] for item in labeled[:args.max_queries]] or [
+        "main topics concepts ideas key points summary",
+        "important concepts definitions facts key information"
+    ]
+
+    report = {
+        "config": {
+            "chunker": args.chunker,
+            "chunk_size": args.chunk_size,
+            "chunk_overlap": args.chunk_overlap,
+            "chunk_tokens": processor.chunk_tokens,
+            "chunk_overlap_tokens": args.chunk_overlap_tokens,
+            "storage": args.storage,
+            "index_dims": args.index_dims,
+            "k": args.k,
+            "repeats": args.repeats
+        },
+        "documents": []
+    }
+
+    for index, pdf_path in enumerate(args.pdf):
+        doc_id = f"bench-{os.getpid()}-{index}"
+        processed = processor.process_pdf(os.path.abspath(pdf_path), doc_id)
+        if processed.get("status") == "error":
+            raise RuntimeError(f"Failed to process {pdf_path}: {processed.get('error')}")
+
+        try:
+            total_pages = processed.get("total_pages", 1)
+            # Narrow filters, then wide ones: the legacy $in over every page (what
+            # an LLM expanding "pages 1-N" used to produce) vs. the equivalent range
+            # specs. Specs and lists are 1-based like user input; the raw $in filter
+            # uses the 0-based numbers stored in chunk metadata
+            page_filters = [
+                None,
+                [1],
+                list(range(1, min(total_pages, 10) + 1)),
+                legacy_page_filter(list(range(total_pages))),
+                f"1-{total_pages}",
+                f"{total_pages // 2 + 1}-",
+                f"1-{total_pages // 4 + 1},{total_pages // 2 + 1}-{3 * total_pages // 4 + 1}",
+            ]
+
+            doc_report = {
+                "pdf": pdf_path,
+                "chunks": processed["chunks"],
+                "total_pages": total_pages,
+                "ingest_timings_s": processed.get("timings", {}),
+                "store_load": bench_store_load(processor, doc_id, args.repeats),
+                "search": bench_search(
+                    processor, doc_id, queries, args.k, page_filters, args.repeats
+                )
+            }
+            processor.get_vector_store(doc_id)
+            doc_report["storage"] = measure_storage(processor, doc_id, processed["chunks"])
+            if labeled:
+                doc_report["quality"] = evaluate_recall(processor, doc_id, labeled, args.k)
+
+            report["documents"].append(doc_report)
+        finally:
+            if not args.keep:
+                processor.delete_document(doc_id)
+
+    return report
+
+
+def compare_to_baseline(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Return a list of human-readable regressions against a previous report"""
+    failures = []
+    for current, previous in zip(report["documents"], baseline.get("documents", [])):
+        name = current["pdf"]
+
+        for now, before in zip(current["search"], previous.get("search", [])):
+            if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+                failures.append(
+                    f"{name}: search p95 k={now['k']} filter={now['page_filter']} "
+                    f"{before['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms"
+                )
+
+        now_total = current["ingest_timings_s"].get("total", 0.0)
+        before_total = previous.get("ingest_timings_s", {}).get("total", 0.0)
+        if before_total and now_total > before_total * (1 + max_regression):
+            failures.append(f"{name}: ingest {before_total:.2f}s -> {now_total:.2f}s")
+
+        for metric, before in previous.get("quality", {}).items():
+            now = current.get("quality", {}).get(metric)
+            if now is not None and now < before * (1 - max_regression):
+                failures.append(f"{name}: {metric} {before:.3f} -> {now:.3f}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DocumentProcessor retrieval benchmark")
+    parser.add_argument("--pdf", action="append", required=True, help="PDF to benchmark (repeatable)")
+    parser.add_argument("--questions", help="Labeled question set (JSON)")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 8, 12], help="k values to test")
+    parser.add_argument("--repeats", type=int, default=3, help="Repetitions per measurement")
+    parser.add_argument("--max-queries", type=int, default=20, help="Queries used for latency runs")
+    parser.add_argument("--chunker", choices=["layout", "recursive"], default=CHUNKER)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Characters (recursive chunker)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="Characters (recursive chunker)")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="Tokens (layout chunker)")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS, help="Tokens (layout chunker)")
+    parser.add_argument("--storage", choices=STORAGE_TYPES, default=EMBEDDING_STORAGE,
+                        help="Vector storage for the benchmark stores")
+    parser.add_argument("--index-dims", type=int, default=EMBEDDING_INDEX_DIMS,
+                        help="Dimensions indexed by Chroma with compact storage")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--baseline", help="Previous JSON report to gate against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed relative regression before failing (default 0.15)")
+    parser.add_argument("--keep", action="store_true", help="Keep benchmark vector stores")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = compare_to_baseline(report, baseline, args.max_regression)
+        if failures:
+            print("\nREGRESSIONS:", file=sys.stderr)
+            for failure in failures:
+                print(f"  - {failure}", file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from uuid import uuid4
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from .Metrics import metrics
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis backend is optional
+    aioredis = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# Optional Redis-compatible server (Redis, Valkey, KeyDB...) shared by workers
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# Use the first X-Forwarded-For hop as client identity (enable behind a proxy)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+# How long a request may wait for a free concurrency slot
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Retry-After sent when every slot stays busy for the whole queue timeout
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+# Leases older than this are considered leaked (crashed worker) in Redis mode
+SLOT_LEASE_SECONDS = int(os.getenv("SLOT_LEASE_SECONDS", "900"))
+
+
+@dataclass
+class PoolLimits:
+    """Admission limits for one class of work"""
+    rate_per_minute: float  # Token bucket refill rate per client
+    burst: int  # Token bucket capacity per client
+    max_concurrent: int  # Global concurrency cap for the pool
+
+
+POOL_LIMITS = {
+    "chat": PoolLimits(
+        rate_per_minute=float(os.getenv("RATE_LIMIT_CHAT_PER_MIN", "30")),
+        burst=int(os.getenv("RATE_LIMIT_CHAT_BURST", "10")),
+        max_concurrent=int(os.getenv("MAX_CONCURRENT_CHAT", "32"))
+    ),
+    "ingest": PoolLimits(
+        rate_per_minute=float(os.getenv("RATE_LIMIT_UPLOAD_PER_MIN", "6")),
+        burst=int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "3")),
+        max_concurrent=int(os.getenv("MAX_CONCURRENT_INGEST", "2"))
+    ),
+}
+
+# ==========================================================
+# STORES
+# ==========================================================
+
+
+class InMemoryStore:
+    """Per-process token buckets and concurrency slots"""
+
+    def __init__(self, limits: Dict[str, PoolLimits], max_buckets: int = 10000):
+        self.buckets = {}  # (pool, client) -> (tokens, last_refill)
+        self.max_buckets = max_buckets
+        self.semaphores = {
+            pool: asyncio.Semaphore(limit.max_concurrent)
+            for pool, limit in limits.items()
+        }
+
+    async def take_token(self, pool: str, client_id: str, limit: PoolLimits) -> float:
+        """Consume one token; return 0 if allowed, else seconds until one is available"""
+        rate = limit.rate_per_minute / 60
+        now = time.monotonic()
+        key = (pool, client_id)
+
+        tokens, last = self.buckets.get(key, (float(limit.burst), now))
+        tokens = min(limit.burst, tokens + (now - last) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate if rate > 0 else float(ADMISSION_RETRY_AFTER)
+
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_buckets:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        """Drop buckets that have been idle long enough to be full again"""
+        for key, (tokens, last) in list(self.buckets.items()):
+            limit = POOL_LIMITS.get(key[0])
+            refill = limit.burst / (limit.rate_per_minute / 60) if limit and limit.rate_per_minute else 0
+            if now - last > refill:
+                del self.buckets[key]
+
+    async def acquire_slot(self, pool: str, limit: PoolLimits, timeout: float) -> Optional[str]:
+        """Wait up to timeout for a concurrency slot; return a lease id or None"""
+        try:
+            await asyncio.wait_for(self.semaphores[pool].acquire(), timeout=timeout)
+            return str(uuid4())
+        except asyncio.TimeoutError:
+            return None
+
+    async def release_slot(self, pool: str, lease_id: str):
+        """Return a concurrency slot"""
+        self.semaphores[pool].release()
+
+
+# Token bucket: returns seconds to wait (0 when the token was granted)
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# Concurrency lease: sorted set of lease ids scored by acquire time
+_ACQUIRE_SLOT_LUA = """
+local limit = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local lease_seconds = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease_seconds)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], lease_seconds)
+    return 1
+end
+return 0
+"""
+
+
+class RedisStore:
+    """Token buckets and concurrency slots shared by all workers via Redis"""
+
+    def __init__(self, url: str, poll_interval: float = 0.1):
+        self.client = aioredis.from_url(url)
+        self.poll_interval = poll_interval
+        self._take = self.client.register_script(_TOKEN_BUCKET_LUA)
+        self._acquire = self.client.register_script(_ACQUIRE_SLOT_LUA)
+
+    async def take_token(self, pool: str, client_id: str, limit: PoolLimits) -> float:
+        """Consume one token; return 0 if allowed, else seconds until one is available"""
+        rate = limit.rate_per_minute / 60
+        if rate <= 0:
+            return float(ADMISSION_RETRY_AFTER)
+        wait = await self._take(
+            keys=[f"admission:bucket:{pool}:{client_id}"],
+            args=[rate, limit.burst, time.time()]
+        )
+        return float(wait)
+
+    async def acquire_slot(self, pool: str, limit: PoolLimits, timeout: float) -> Optional[str]:
+        """Poll for a concurrency slot until timeout; return a lease id or None"""
+        lease_id = str(uuid4())
+        deadline = time.monotonic() + timeout
+        while True:
+            granted = await self._acquire(
+                keys=[f"admission:slots:{pool}"],
+                args=[limit.max_concurrent, time.time(), SLOT_LEASE_SECONDS, lease_id]
+            )
+            if int(granted):
+                return lease_id
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def release_slot(self, pool: str, lease_id: str):
+        """Return a concurrency slot"""
+        await self.client.zrem(f"admission:slots:{pool}", lease_id)
+
+
+# ==========================================================
+# ADMISSION CONTROLLER
+# ==========================================================
+
+
+class Slot:
+    """A granted concurrency slot; release exactly once when the work ends"""
+
+    def __init__(self, controller: "AdmissionController", pool: str, lease_id: str):
+        self.controller = controller
+        self.pool = pool
+        self.lease_id = lease_id
+        self.released = False
+
+    async def release(self):
+        if self.released:
+            return
+        self.released = True
+        await self.controller.release(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    async def guard(self, stream: AsyncIterator) -> AsyncIterator:
+        """Hold the slot for the lifetime of a streaming response"""
+        try:
+            async for item in stream:
+                yield item
+        finally:
+            await self.release()
+
+
+class AdmissionController:
+    """Per-client rate limiting plus global concurrency caps per pool"""
+
+    def __init__(self, limits: Dict[str, PoolLimits] = POOL_LIMITS, redis_url: str = RATE_LIMIT_REDIS_URL):
+        self.limits = limits
+        if redis_url and aioredis is not None:
+            self.store = RedisStore(redis_url)
+            logger.info("Admission control using shared Redis store")
+        else:
+            if redis_url:
+                logger.warning("RATE_LIMIT_REDIS_URL set but redis is not installed; using in-process store")
+            self.store = InMemoryStore(limits)
+        self.active = {pool: 0 for pool in limits}
+        self.waiting = {pool: 0 for pool in limits}
+
+    @staticmethod
+    def client_id(request: Request) -> str:
+        """Identify the caller for per-client buckets"""
+        if TRUST_FORWARDED_FOR:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def admit(self, pool: str, request: Request) -> Slot:
+        """
+        Admit a request into a pool or reject it with 429.
+
+        Args:
+            pool: "chat" or "ingest"
+            request: Incoming request (used to identify the client)
+
+        Returns:
+            Slot that must be released when the work finishes
+
+        Raises:
+            HTTPException: 429 with Retry-After when rate limited or saturated
+        """
+        limit = self.limits[pool]
+        client = self.client_id(request)
+
+        wait = await self.store.take_token(pool, client, limit)
+        if wait > 0:
+            metrics.inc(f"admission_rate_limited_{pool}")
+            logger.info(f"Rate limited {client} on {pool} (retry in {wait:.1f}s)")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many {pool} requests. Please slow down.",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+        self.waiting[pool] += 1
+        metrics.set(f"admission_waiting_{pool}", self.waiting[pool])
+        start = time.monotonic()
+        try:
+            lease_id = await self.store.acquire_slot(pool, limit, ADMISSION_QUEUE_TIMEOUT)
+        finally:
+            self.waiting[pool] -= 1
+            metrics.set(f"admission_waiting_{pool}", self.waiting[pool])
+        metrics.inc(f"admission_queue_seconds_{pool}", time.monotonic() - start)
+
+        if lease_id is None:
+            metrics.inc(f"admission_rejected_busy_{pool}")
+            logger.warning(f"No {pool} slot free after {ADMISSION_QUEUE_TIMEOUT}s, rejecting")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is busy with other {pool} requests. Please retry shortly.",
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)}
+            )
+
+        metrics.inc(f"admission_admitted_{pool}")
+        self.active[pool] += 1
+        metrics.set(f"admission_active_{pool}", self.active[pool])
+        return Slot(self, pool, lease_id)
+
+    async def acquire(self, pool: str) -> Slot:
+        """
+        Wait for a slot for background work, without a rate limit or timeout.
+
+        Used for work already admitted as a request (each file of a bulk
+        upload, GC re-ingestion) so it counts against the same global cap
+        as interactive requests instead of running on top of it.
+
+        Args:
+            pool: "chat" or "ingest"
+
+        Returns:
+            Slot that must be released when the work finishes
+        """
+        limit = self.limits[pool]
+        self.waiting[pool] += 1
+        metrics.set(f"admission_waiting_{pool}", self.waiting[pool])
+        start = time.monotonic()
+        try:
+            lease_id = None
+            while lease_id is None:
+                lease_id = await self.store.acquire_slot(pool, limit, ADMISSION_QUEUE_TIMEOUT)
+        finally:
+            self.waiting[pool] -= 1
+            metrics.set(f"admission_waiting_{pool}", self.waiting[pool])
+        metrics.inc(f"admission_queue_seconds_{pool}", time.monotonic() - start)
+
+        self.active[pool] += 1
+        metrics.set(f"admission_active_{pool}", self.active[pool])
+        return Slot(self, pool, lease_id)
+
+    async def release(self, slot: Slot):
+        """Release a slot (called via Slot.release)"""
+        self.active[slot.pool] -= 1
+        metrics.set(f"admission_active_{slot.pool}", self.active[slot.pool])
+        try:
+            await self.store.release_slot(slot.pool, slot.lease_id)
+        except Exception as e:
+            logger.error(f"Error releasing {slot.pool} slot: {str(e)}")
@@ -1,12 +1,34 @@
 import os
+import re
+import json
+import time
 import logging
-from typing import Optional, List
+import statistics
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, Union
 from collections import OrderedDict
+from uuid import UUID, uuid4
 
+import fitz  # PyMuPDF
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+
+from .OCR import OCR_ENABLED, ocr_textless_pages, blocks_to_text
+from .Quantization import (
+    EMBEDDING_STORAGE,
+    EMBEDDING_INDEX_DIMS,
+    RERANK_OVERSAMPLE,
+    CompactVectors,
+    TruncatedEmbeddings,
+    normalize,
+    truncate,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -18,10 +40,324 @@ logger = logging.getLogger(__name__)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 uploads_dir = os.path.join(current_dir, "uploads")
 db_base_dir = os.path.join(current_dir, "db")
+ocr_cache_dir = os.path.join(db_base_dir, "ocr_cache")
+# Deleted documents are moved here and removed in the background
+trash_dir = os.path.join(db_base_dir, "trash")
+# One marker file per document being ingested, visible to every worker
+ingesting_dir = os.path.join(db_base_dir, "ingesting")
 
 os.makedirs(uploads_dir, exist_ok=True)
 os.makedirs(db_base_dir, exist_ok=True)
 
+# Chunking strategy: "layout" (token-based, layout-aware) or "recursive" (legacy characters)
+CHUNKER = os.getenv("CHUNKER", "layout")
+
+# Legacy chunking parameters (characters)
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 200
+
+# Embedding model (loaded on first use or during startup warmup)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+# Shared embedding server socket (multi-worker mode, see EmbeddingServer.py)
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+# Vector stores kept open per process (lower it when running many workers)
+MAX_CACHED_STORES = int(os.getenv("MAX_CACHED_STORES", "10"))
+
+# Per-document search counts, used to pick stores to preload at startup
+usage_path = os.path.join(db_base_dir, "store_usage.json")
+USAGE_FLUSH_EVERY = 50
+
+# Layout chunking parameters (embedding model tokens)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "320"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# ==========================================================
+# PDF LAYOUT EXTRACTION
+# ==========================================================
+
+
+@dataclass
+class LayoutBlock:
+    """A text block from the PDF layout"""
+    page: int
+    text: str
+    font_size: float
+    bold: bool
+    is_heading: bool = False
+
+
+def extract_layout_blocks(
+    file_path: str,
+    ocr_pages: Optional[Dict[int, List[dict]]] = None
+) -> Tuple[List[LayoutBlock], int]:
+    """
+    Extract text blocks (paragraphs, headings) with page numbers using PyMuPDF.
+
+    Args:
+        file_path: Path to the PDF file
+        ocr_pages: OCR text blocks replacing the embedded text of scanned pages
+
+    Returns:
+        Tuple of (blocks in reading order, total page count)
+    """
+    ocr_pages = ocr_pages or {}
+    blocks = []
+    with fitz.open(file_path) as pdf:
+        total_pages = pdf.page_count
+        for page in pdf:
+            if page.number in ocr_pages:
+                raw_blocks = ocr_pages[page.number]
+            else:
+                raw_blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
+
+            for block in raw_blocks:
+                if block.get("type", 0) != 0:
+                    continue
+
+                lines, sizes, bold = [], [], True
+                for line in block.get("lines", []):
+                    spans = [span for span in line["spans"] if span["text"].strip()]
+                    if not spans:
+                        continue
+                    lines.append("".join(span["text"] for span in line["spans"]).strip())
+                    sizes.extend(span["size"] for span in spans)
+                    bold = bold and all(span["flags"] & 16 for span in spans)
+
+                text = "\n".join(lines).strip()
+                if text:
+                    blocks.append(LayoutBlock(page=page.number, text=text, font_size=max(sizes), bold=bold))
+
+    _mark_headings(blocks)
+    return blocks, total_pages
+
+
+def _mark_headings(blocks: List[LayoutBlock]):
+    """Flag short blocks set larger (or bold) than the body text as headings"""
+    if not blocks:
+        return
+
+    # Body size = median font size weighted by text length
+    weighted = []
+    for block in blocks:
+        weighted.extend([block.font_size] * max(1, len(block.text) // 50))
+    body_size = statistics.median(weighted)
+
+    for block in blocks:
+        short = len(block.text) < 150 and block.text.count("\n") < 2
+        larger = block.font_size >= body_size * 1.15
+        block.is_heading = short and (larger or (block.bold and block.font_size >= body_size))
+
+
+def is_doc_id(value: str) -> bool:
+    """Whether a string is a doc_id generated by this server (a UUID)"""
+    try:
+        return str(UUID(value)) == value
+    except (ValueError, TypeError):
+        return False
+
+
+def mark_ingesting(doc_id: str):
+    """Flag a document as being ingested (storage GC leaves it alone)"""
+    os.makedirs(ingesting_dir, exist_ok=True)
+    with open(os.path.join(ingesting_dir, doc_id), "w", encoding="utf-8") as f:
+        f.write(str(os.getpid()))
+
+
+def clear_ingesting(doc_id: str):
+    """Remove a document's ingestion marker"""
+    try:
+        os.remove(os.path.join(ingesting_dir, doc_id))
+    except FileNotFoundError:
+        pass
+
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of a file or directory tree"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# ==========================================================
+# PAGE FILTERS
+# ==========================================================
+
+# Outline (PDF table of contents) saved next to each vector store
+OUTLINE_FILENAME = "outline.json"
+
+# Inclusive page range; last=None means "to the end of the document"
+PageRange = Tuple[int, Optional[int]]
+
+_RANGE_PATTERN = re.compile(r"^(\d*)\s*(?:-|–|\.\.|to)\s*(\d*)$", re.IGNORECASE)
+
+
+def extract_outline(file_path: str) -> dict:
+    """
+    Read the PDF outline (table of contents) as page ranges.
+
+    Args:
+        file_path: Path to the PDF file
+
+    Returns:
+        Dict with total_pages and outline entries (title, level,
+        page_start, page_end) using the same page numbers as chunk metadata
+    """
+    with fitz.open(file_path) as pdf:
+        total_pages = pdf.page_count
+        toc = pdf.get_toc(simple=True)  # [[level, title, 1-based page], ...]
+
+    entries = []
+    for i, (level, title, page) in enumerate(toc):
+        if page < 1:
+            continue
+        # A section ends where the next entry at the same or a higher level starts
+        end = total_pages - 1
+        for next_level, _, next_page in toc[i + 1:]:
+            if next_level <= level and next_page >= 1:
+                end = max(page - 1, next_page - 2)
+                break
+        entries.append({
+            "title": title.strip(),
+            "level": level,
+            "page_start": page - 1,
+            "page_end": end
+        })
+
+    return {"total_pages": total_pages, "outline": entries}
+
+
+def parse_page_spec(
+    pages: Union[str, List[int]],
+    outline: Optional[List[dict]] = None
+) -> List[PageRange]:
+    """
+    Parse a page specification into merged page ranges.
+
+    Accepts comma-separated items: single pages ("5"), ranges ("1-50"),
+    open ranges ("40-", "-10") and outline titles ("Chapter 3",
+    "Introduction"), which are matched case-insensitively against the
+    document outline. A list of ints is treated as single pages.
+
+    Page numbers are 1-based, as users write them (and as citations show
+    them); they are converted to the 0-based numbers of chunk metadata,
+    the same convention extract_outline uses for titles.
+
+    Args:
+        pages: Page specification or list of 1-based page numbers
+        outline: Outline entries from extract_outline (for titles)
+
+    Returns:
+        Sorted, non-overlapping list of 0-based (first, last) ranges; last may be None
+
+    Raises:
+        ValueError: If an item is not a page, range or known outline title
+    """
+    items = [str(p) for p in pages] if isinstance(pages, list) else str(pages).split(",")
+
+    ranges = []
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+
+        if item.isdigit():
+            page = _zero_based(int(item), item)
+            ranges.append((page, page))
+            continue
+
+        match = _RANGE_PATTERN.match(item)
+        if match and (match.group(1) or match.group(2)):
+            first = _zero_based(int(match.group(1)), item) if match.group(1) else 0
+            last = _zero_based(int(match.group(2)), item) if match.group(2) else None
+            if last is not None and last < first:
+                raise ValueError(f"Invalid page range: {item}")
+            ranges.append((first, last))
+            continue
+
+        section = _match_outline(item, outline or [])
+        if section is None:
+            raise ValueError(f"Unrecognized page or section: {item}")
+        ranges.append((section["page_start"], section["page_end"]))
+
+    return _merge_ranges(ranges)
+
+
+def _zero_based(page: int, item: str) -> int:
+    """Convert a 1-based page number from a page specification to chunk metadata numbering"""
+    if page < 1:
+        raise ValueError(f"Page numbers start at 1: {item}")
+    return page - 1
+
+
+def _match_outline(name: str, outline: List[dict]) -> Optional[dict]:
+    """Find the outline entry for a section name (exact title first, then prefix/substring)"""
+    wanted = " ".join(name.lower().split())
+    titles = [(" ".join(entry["title"].lower().split()), entry) for entry in outline]
+
+    for title, entry in titles:
+        if title == wanted:
+            return entry
+    # "chapter 3" should match "Chapter 3: Thermodynamics" but not "Chapter 30"
+    for title, entry in titles:
+        if re.match(re.escape(wanted) + r"(?!\d)", title):
+            return entry
+    for title, entry in titles:
+        if wanted in title:
+            return entry
+    return None
+
+
+def _merge_ranges(ranges: List[PageRange]) -> List[PageRange]:
+    """Sort ranges and merge ones that overlap or touch"""
+    merged = []
+    for first, last in sorted(ranges, key=lambda r: r[0]):
+        if merged:
+            prev_first, prev_last = merged[-1]
+            if prev_last is None or first <= prev_last + 1:
+                if prev_last is not None and (last is None or last > prev_last):
+                    merged[-1] = (prev_first, last)
+                continue
+        merged.append((first, last))
+    return merged
+
+
+def compile_page_filter(ranges: List[PageRange], page_spans: bool) -> dict:
+    """
+    Compile page ranges into a Chroma where-filter of range predicates.
+
+    Args:
+        ranges: Merged ranges from parse_page_spec
+        page_spans: True if chunks carry page_start/page_end (layout chunker),
+            False for legacy single-page chunks
+
+    Returns:
+        Where-filter using $gte/$lte (a chunk matches if it overlaps a range)
+    """
+    start_key, end_key = ("page_start", "page_end") if page_spans else ("page", "page")
+
+    clauses = []
+    for first, last in ranges:
+        if last is not None and first == last and not page_spans:
+            clauses.append({"page": first})
+            continue
+
+        predicates = []
+        if last is not None:
+            predicates.append({start_key: {"$lte": last}})
+        if first > 0 or not predicates:
+            predicates.append({end_key: {"$gte": first}})
+        clauses.append(predicates[0] if len(predicates) == 1 else {"$and": predicates})
+
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
 # ==========================================================
 # RAG DOCUMENT PROCESSING 
 # ==========================================================
@@ -29,19 +365,191 @@ os.makedirs(db_base_dir, exist_ok=True)
 class DocumentProcessor:
     """Handles PDF processing and vector store management"""
 
-    def __init__(self, max_cached_stores: int = 10):
+    def __init__(
+        self,
+        max_cached_stores: int = MAX_CACHED_STORES,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        chunker: str = CHUNKER,
+        chunk_tokens: int = CHUNK_TOKENS,
+        chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        ocr: bool = OCR_ENABLED,
+        storage: str = EMBEDDING_STORAGE,
+        index_dims: int = EMBEDDING_INDEX_DIMS
+    ):
         """
         Initialize the document processor.
         
         Args:
             max_cached_stores: Maximum number of vector stores to keep in memory (LRU eviction)
+            chunk_size: Maximum chunk length in characters (recursive chunker)
+            chunk_overlap: Overlap between consecutive chunks in characters (recursive chunker)
+            chunker: "layout" (token-based, layout-aware) or "recursive" (legacy)
+            chunk_tokens: Maximum chunk length in embedding tokens (layout chunker)
+            chunk_overlap_tokens: Maximum overlap in embedding tokens (layout chunker)
+            ocr: OCR pages without embedded text (needs Tesseract)
+            storage: Vector storage for new documents: "float32" (full vectors
+                in Chroma), or "float16"/"int8" (compact: truncated index + rerank)
+            index_dims: Dimensions indexed by Chroma in compact mode
         """
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2"
-        )
+        self._embeddings = None
+        self._embeddings_lock = threading.Lock()
+        self.tokenizer = None
         self.active_stores = OrderedDict()  # LRU cache
         self.max_cached_stores = max_cached_stores
-        logger.info("DocumentProcessor initialized")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunker = chunker
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.ocr = ocr
+        self.storage = storage
+        self.index_dims = index_dims
+        self.compact_stores = {}  # doc_id -> CompactVectors (compact stores only)
+        self.page_span_stores = {}  # doc_id -> whether chunks carry page_start/page_end
+        self.outlines = {}  # doc_id -> outline captured at ingestion
+
+        self.chunk_tokens = chunk_tokens
+        self.usage = self._load_usage()
+        self._unsaved_uses = 0
+        # Searches run on many threadpool threads; guards usage and the counter
+        self._usage_lock = threading.Lock()
+        self._usage_save_lock = threading.Lock()
+
+        logger.info(f"DocumentProcessor initialized ({chunker} chunker)")
+
+    @property
+    def embeddings(self):
+        """Embedding model, loaded once on first access (thread-safe)"""
+        if self._embeddings is None:
+            with self._embeddings_lock:
+                if self._embeddings is None:
+                    self._load_embeddings()
+        return self._embeddings
+
+    def _load_embeddings(self):
+        """Import and load the embedding model (or connect to the shared server) and its tokenizer"""
+        start = time.perf_counter()
+
+        if EMBEDDING_SERVER_SOCKET:
+            from .EmbeddingServer import RemoteEmbeddings
+
+            embeddings = RemoteEmbeddings(EMBEDDING_SERVER_SOCKET)
+            self.tokenizer = embeddings.tokenizer
+            max_seq_length = embeddings.info.get("max_seq_length")
+        else:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+            # Count tokens with the embedding model's own tokenizer when available
+            client = getattr(embeddings, "_client", None)
+            self.tokenizer = getattr(client, "tokenizer", None)
+            max_seq_length = getattr(client, "max_seq_length", None)
+
+        if max_seq_length:
+            self.chunk_tokens = min(self.chunk_tokens, max_seq_length - 2)
+
+        self._embeddings = embeddings
+        source = f"server at {EMBEDDING_SERVER_SOCKET}" if EMBEDDING_SERVER_SOCKET else "in-process"
+        logger.info(f"Loaded embedding model {EMBEDDING_MODEL} ({source}) in {time.perf_counter() - start:.2f}s")
+
+    def warmup(self) -> float:
+        """
+        Load the embedding model and run one embedding so the first real
+        request does not pay for model load or first-call initialization.
+
+        Returns:
+            Seconds spent
+        """
+        start = time.perf_counter()
+        self.embeddings.embed_query("warmup")
+        return time.perf_counter() - start
+
+    def _load_usage(self) -> dict:
+        """Read per-document search counts saved by earlier runs"""
+        try:
+            with open(usage_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_usage(self):
+        """
+        Persist search counts (atomic replace). With several workers the last
+        writer wins, which is fine for choosing stores to preload.
+        """
+        with self._usage_lock:
+            snapshot = dict(self.usage)
+            self._unsaved_uses = 0
+
+        with self._usage_save_lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=f"{os.path.basename(usage_path)}.", suffix=".tmp", dir=db_base_dir
+                )
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(snapshot, f)
+                    os.replace(tmp_path, usage_path)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+            except OSError as e:
+                logger.warning(f"Could not save store usage: {str(e)}")
+
+    def _record_use(self, doc_id: str):
+        """Count a search against a document (never raises: bookkeeping only)"""
+        try:
+            with self._usage_lock:
+                self.usage[doc_id] = self.usage.get(doc_id, 0) + 1
+                self._unsaved_uses += 1
+                flush = self._unsaved_uses >= USAGE_FLUSH_EVERY
+            if flush:
+                self.save_usage()
+        except Exception as e:
+            logger.warning(f"Could not record store usage: {str(e)}")
+
+    def usage_snapshot(self) -> Dict[str, int]:
+        """Copy of the search counts, safe to iterate while searches run"""
+        with self._usage_lock:
+            return dict(self.usage)
+
+    def forget_usage(self, doc_ids: List[str]):
+        """Drop search counts of documents that no longer exist"""
+        with self._usage_lock:
+            for doc_id in doc_ids:
+                self.usage.pop(doc_id, None)
+
+    def preload_stores(self, count: int) -> List[str]:
+        """
+        Load the most-searched vector stores into the cache.
+
+        Args:
+            count: Number of stores to load (bounded by max_cached_stores)
+
+        Returns:
+            Doc ids that were loaded
+        """
+        with self._usage_lock:
+            ranked = sorted(self.usage.items(), key=lambda item: item[1], reverse=True)
+        loaded = []
+        for doc_id, _ in ranked:
+            if len(loaded) >= min(count, self.max_cached_stores):
+                break
+            if not os.path.exists(os.path.join(db_base_dir, f"chroma_{doc_id}")):
+                continue
+            try:
+                self.get_vector_store(doc_id)
+                loaded.append(doc_id)
+            except Exception as e:
+                logger.warning(f"Could not preload store {doc_id}: {str(e)}")
+        return loaded
+
+    def count_tokens(self, text: str) -> int:
+        """Number of embedding-model tokens in text (~4 chars/token fallback)"""
+        if self.tokenizer is None:
+            return max(1, len(text) // 4)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
 
     def process_pdf(self, file_path: str, doc_id: str) -> dict:
         """
@@ -52,24 +560,26 @@ class DocumentProcessor:
             doc_id: Unique identifier for the document
             
         Returns:
-            Dict with processing status and metadata
+            Dict with processing status, metadata and per-stage timings (seconds)
         """
         persist_directory = os.path.join(db_base_dir, f'chroma_{doc_id}')
+        timings = {}
+        start = time.perf_counter()
+        mark_ingesting(doc_id)
 
         try:
             # Check if a vector store already exists
             if os.path.exists(persist_directory):
                 logger.info(f"Loading existing vector store for doc_id: {doc_id}")
-                db = Chroma(
-                    persist_directory=persist_directory, 
-                    embedding_function=self.embeddings
-                )
+                db = self._open_store(doc_id, persist_directory)
                 self._cache_store(doc_id, db)
+                timings["total"] = time.perf_counter() - start
                 
                 return {
                     "doc_id": doc_id,
                     "status": "loaded",
-                    "chunks": db._collection.count()
+                    "chunks": db._collection.count(),
+                    "timings": timings
                 }
             
             # Load and split the document if not already processed
@@ -78,48 +588,65 @@ class DocumentProcessor:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"PDF file not found: {file_path}")
             
-            loader = PyMuPDFLoader(file_path)
-            documents = loader.load()
-
-            if not documents:
-                raise ValueError("PDF contains no readable content")
-
-            # Extract metadata
-            total_pages = len(documents)
-            logger.info(f"Loaded {total_pages} pages from PDF")
-
-            # Split into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1500, 
-                chunk_overlap=200,
-                separators=["\n\n", "\n", " ", ""],
-                length_function=len
-            )
+            # OCR scanned pages (no embedded text) before chunking
+            ocr_pages, ocr_report = {}, None
+            if self.ocr:
+                stage_start = time.perf_counter()
+                ocr_pages, ocr_report = ocr_textless_pages(file_path, ocr_cache_dir)
+                timings["ocr"] = time.perf_counter() - stage_start
+                if ocr_report["pages"]:
+                    logger.info(
+                        f"OCR: {len(ocr_report['pages'])} scanned pages, {ocr_report['cached']} cached, "
+                        f"{len(ocr_report['failed'])} failed in {ocr_report['seconds']:.1f}s"
+                    )
 
-            docs = text_splitter.split_documents(documents)
-
-            # Ensure page metadata exists (PyMuPDF usually adds this)
-            for doc in docs:
-                if 'page' not in doc.metadata:
-                    logger.warning(f"Missing page metadata for chunk, defaulting to 0")
-                    doc.metadata['page'] = 0
+            try:
+                if self.chunker == "layout":
+                    docs, total_pages = self._split_layout(file_path, timings, ocr_pages)
+                else:
+                    docs, total_pages = self._split_recursive(file_path, timings, ocr_pages)
+            except ValueError:
+                if ocr_report and ocr_report["failed"]:
+                    reason = ocr_report["skipped"] or "OCR failed"
+                    raise ValueError(
+                        f"PDF contains no readable content ({len(ocr_report['failed'])} scanned pages "
+                        f"could not be OCR'd: {reason})"
+                    )
+                raise
 
             logger.info(f"Created {len(docs)} chunks from {total_pages} pages")
 
             # Create and persist the vector store
-            db = Chroma.from_documents(
-                docs,
-                self.embeddings,
-                persist_directory=persist_directory
-            )
+            stage_start = time.perf_counter()
+            if self.storage == "float32":
+                db = Chroma.from_documents(
+                    docs,
+                    self.embeddings,
+                    persist_directory=persist_directory
+                )
+            else:
+                db = self._create_compact_store(doc_id, docs, persist_directory)
+            timings["embed"] = time.perf_counter() - stage_start
             
             self._cache_store(doc_id, db)
+            self.page_span_stores[doc_id] = self.chunker == "layout"
+
+            # Save the PDF outline so chapter names can be used as page filters
+            try:
+                outline = extract_outline(file_path)
+                self._save_outline(doc_id, outline)
+                self.outlines[doc_id] = outline
+            except Exception as e:
+                logger.warning(f"Could not extract outline for {doc_id}: {str(e)}")
+            timings["total"] = time.perf_counter() - start
 
             return {
                 "doc_id": doc_id,
                 "status": "created",
                 "total_pages": total_pages,
-                "chunks": len(docs)
+                "chunks": len(docs),
+                "ocr": ocr_report,
+                "timings": timings
             }
             
         except Exception as e:
@@ -129,7 +656,243 @@ class DocumentProcessor:
                 "status": "error",
                 "error": str(e)
             }
+
+        finally:
+            clear_ingesting(doc_id)
     
+    def _split_recursive(
+        self,
+        file_path: str,
+        timings: dict,
+        ocr_pages: Optional[Dict[int, List[dict]]] = None
+    ) -> Tuple[List[Document], int]:
+        """Legacy chunking: per-page text split by character count"""
+        stage_start = time.perf_counter()
+        loader = PyMuPDFLoader(file_path)
+        documents = loader.load()
+        timings["load"] = time.perf_counter() - stage_start
+
+        # Extract metadata
+        total_pages = len(documents)
+
+        # Use OCR text for scanned pages and skip pages that are still empty
+        for doc in documents:
+            page = doc.metadata.get("page")
+            if ocr_pages and page in ocr_pages:
+                doc.page_content = blocks_to_text(ocr_pages[page])
+        documents = [doc for doc in documents if doc.page_content.strip()]
+
+        if not documents:
+            raise ValueError("PDF contains no readable content")
+
+        logger.info(f"Loaded {len(documents)} pages with text from {total_pages}-page PDF")
+
+        # Split into chunks
+        stage_start = time.perf_counter()
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size, 
+            chunk_overlap=self.chunk_overlap,
+            separators=["\n\n", "\n", " ", ""],
+            length_function=len
+        )
+
+        docs = text_splitter.split_documents(documents)
+        timings["split"] = time.perf_counter() - stage_start
+
+        # Ensure page metadata exists (PyMuPDF usually adds this)
+        for doc in docs:
+            if 'page' not in doc.metadata:
+                logger.warning(f"Missing page metadata for chunk, defaulting to 0")
+                doc.metadata['page'] = 0
+
+        return docs, total_pages
+
+    def _split_layout(
+        self,
+        file_path: str,
+        timings: dict,
+        ocr_pages: Optional[Dict[int, List[dict]]] = None
+    ) -> Tuple[List[Document], int]:
+        """
+        Layout-aware chunking measured in embedding tokens.
+
+        Paragraph blocks are packed into chunks of at most chunk_tokens; a
+        heading always starts a new chunk. Overlap is whole trailing blocks
+        up to chunk_overlap_tokens, trimmed so overlap plus the next piece
+        fits in chunk_tokens (none across headings). Each chunk records
+        page_start/page_end (page = page_start) and its section heading.
+        """
+        # Load the model first so its tokenizer and max sequence length are known
+        _ = self.embeddings  # load tokenizer
+
+        stage_start = time.perf_counter()
+        blocks, total_pages = extract_layout_blocks(file_path, ocr_pages)
+        timings["load"] = time.perf_counter() - stage_start
+
+        if not blocks:
+            raise ValueError("PDF contains no readable content")
+
+        logger.info(f"Extracted {len(blocks)} layout blocks from {total_pages} pages")
+
+        stage_start = time.perf_counter()
+        oversize_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_tokens,
+            chunk_overlap=self.chunk_overlap_tokens,
+            separators=["\n\n", "\n", ". ", " ", ""],
+            length_function=self.count_tokens
+        )
+
+        docs = []
+        current = []  # [(block, tokens)]
+        current_tokens = 0
+        section = ""
+
+        def emit():
+            pages = [block.page for block, _ in current]
+            docs.append(Document(
+                page_content="\n\n".join(block.text for block, _ in current),
+                metadata={
+                    "source": file_path,
+                    "page": min(pages),
+                    "page_start": min(pages),
+                    "page_end": max(pages),
+                    "section": section,
+                    "tokens": current_tokens,
+                    "chunk_index": len(docs)
+                }
+            ))
+
+        for block in blocks:
+            if block.is_heading and current:
+                emit()
+                current, current_tokens = [], 0
+            if block.is_heading:
+                section = block.text.replace("\n", " ")[:200]
+
+            tokens = self.count_tokens(block.text)
+
+            # Blocks longer than a chunk are split on their own
+            pieces = [(block, tokens)]
+            if tokens > self.chunk_tokens:
+                pieces = [
+                    (LayoutBlock(block.page, text, block.font_size, block.bold), self.count_tokens(text))
+                    for text in oversize_splitter.split_text(block.text)
+                ]
+
+            for piece, piece_tokens in pieces:
+                if current and current_tokens + piece_tokens > self.chunk_tokens:
+                    emit()
+                    # Carry trailing blocks that fit in the overlap budget and still
+                    # leave room for the piece, so no chunk exceeds chunk_tokens
+                    budget = min(self.chunk_overlap_tokens, self.chunk_tokens - piece_tokens)
+                    overlap, overlap_tokens = [], 0
+                    for prev, prev_tokens in reversed(current):
+                        if overlap_tokens + prev_tokens > budget:
+                            break
+                        overlap.insert(0, (prev, prev_tokens))
+                        overlap_tokens += prev_tokens
+                    current, current_tokens = overlap, overlap_tokens
+
+                current.append((piece, piece_tokens))
+                current_tokens += piece_tokens
+
+        if current:
+            emit()
+
+        timings["split"] = time.perf_counter() - stage_start
+        return docs, total_pages
+
+    def _create_compact_store(self, doc_id: str, docs: List[Document], persist_directory: str) -> Chroma:
+        """
+        Build a compact store: Chroma indexes truncated vectors, full
+        vectors are saved quantized (float16/int8) next to it for reranking.
+        """
+        texts = [doc.page_content for doc in docs]
+        metadatas = [doc.metadata for doc in docs]
+        ids = [str(uuid4()) for _ in docs]
+
+        # Embed once; both representations come from the same vectors
+        vectors = normalize(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+        index_vectors = truncate(vectors, self.index_dims)
+
+        # Marker first: the Chroma index below is truncated and unusable without compact.json
+        CompactVectors.begin(persist_directory)
+        db = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=TruncatedEmbeddings(self.embeddings, self.index_dims)
+        )
+        batch_size = 1000
+        for i in range(0, len(ids), batch_size):
+            db._collection.add(
+                ids=ids[i:i + batch_size],
+                embeddings=index_vectors[i:i + batch_size].tolist(),
+                documents=texts[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size]
+            )
+
+        compact = CompactVectors.save(persist_directory, ids, vectors, self.storage, self.index_dims)
+        self.compact_stores[doc_id] = compact
+        logger.info(
+            f"Created compact store for {doc_id}: {self.index_dims}-dim index, "
+            f"{self.storage} rerank vectors ({compact.nbytes} bytes)"
+        )
+        return db
+
+    def _open_store(self, doc_id: str, persist_directory: str) -> Chroma:
+        """Open a persisted store with the embedding function it was built with"""
+        if CompactVectors.pending(persist_directory):
+            raise ValueError(
+                f"Vector store for document ID {doc_id} is incomplete (interrupted compact build). "
+                "Please upload the document again."
+            )
+
+        if CompactVectors.exists(persist_directory):
+            compact = CompactVectors.load(persist_directory)
+            self.compact_stores[doc_id] = compact
+            return Chroma(
+                persist_directory=persist_directory,
+                embedding_function=TruncatedEmbeddings(self.embeddings, compact.meta["index_dims"])
+            )
+
+        return Chroma(
+            persist_directory=persist_directory,
+            embedding_function=self.embeddings
+        )
+
+    def _search_compact(
+        self,
+        compact: CompactVectors,
+        db: Chroma,
+        query: str,
+        k: int,
+        where_filter: Optional[dict]
+    ) -> List[Document]:
+        """
+        Coarse search on the truncated index, then exact MMR rerank of the
+        candidates using the full (dequantized) vectors.
+        """
+        query_vector = normalize(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+
+        candidates = db._collection.query(
+            query_embeddings=[truncate(query_vector, compact.meta["index_dims"]).tolist()],
+            n_results=max(20, k * RERANK_OVERSAMPLE),
+            where=where_filter,
+            include=["documents", "metadatas"]
+        )
+        rows = [
+            (chunk_id, text, metadata)
+            for chunk_id, text, metadata in zip(
+                candidates["ids"][0], candidates["documents"][0], candidates["metadatas"][0]
+            )
+            if chunk_id in compact.rows
+        ]
+        if not rows:
+            return []
+
+        vectors = compact.get([chunk_id for chunk_id, _, _ in rows])
+        selected = maximal_marginal_relevance(query_vector, vectors, k=min(k, len(rows)))
+        return [Document(page_content=rows[i][1], metadata=rows[i][2] or {}) for i in selected]
+
     def _cache_store(self, doc_id: str, db: Chroma):
         """
         Cache a vector store with LRU eviction.
@@ -150,6 +913,7 @@ class DocumentProcessor:
             oldest_doc_id = next(iter(self.active_stores))
             logger.info(f"Evicting {oldest_doc_id} from cache (LRU)")
             del self.active_stores[oldest_doc_id]
+            self.compact_stores.pop(oldest_doc_id, None)
     
     def get_vector_store(self, doc_id: str) -> Chroma:
         """
@@ -182,20 +946,58 @@ class DocumentProcessor:
         
         # Load the vector store from disk
         logger.info(f"Loading vector store from disk for doc_id: {doc_id}")
-        db = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=self.embeddings
-        )
+        db = self._open_store(doc_id, persist_directory)
         
         self._cache_store(doc_id, db)
         return db
     
+    def _has_page_spans(self, doc_id: str, db: Chroma) -> bool:
+        """Whether a store's chunks carry page_start/page_end (layout chunker)"""
+        if doc_id not in self.page_span_stores:
+            sample = db._collection.get(limit=1, include=["metadatas"])
+            metadatas = sample.get("metadatas") or [{}]
+            self.page_span_stores[doc_id] = "page_start" in (metadatas[0] or {})
+        return self.page_span_stores[doc_id]
+
+    def get_outline(self, doc_id: str) -> dict:
+        """
+        Outline and page count captured at ingestion (cached in memory).
+
+        Documents ingested before outlines were saved get one extracted from
+        the uploaded PDF on first use; otherwise an empty outline is returned.
+        """
+        if doc_id in self.outlines:
+            return self.outlines[doc_id]
+
+        path = os.path.join(db_base_dir, f"chroma_{doc_id}", OUTLINE_FILENAME)
+        outline = {"total_pages": None, "outline": []}
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    outline = json.load(f)
+            else:
+                pdf_path = os.path.join(uploads_dir, f"{doc_id}.pdf")
+                if os.path.exists(pdf_path) and os.path.isdir(os.path.dirname(path)):
+                    outline = extract_outline(pdf_path)
+                    self._save_outline(doc_id, outline)
+        except Exception as e:
+            logger.warning(f"Could not load outline for {doc_id}: {str(e)}")
+
+        self.outlines[doc_id] = outline
+        return outline
+
+    def _save_outline(self, doc_id: str, outline: dict):
+        """Persist an outline next to the document's vector store"""
+        path = os.path.join(db_base_dir, f"chroma_{doc_id}", OUTLINE_FILENAME)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(outline, f)
+
     def search_document(
         self, 
         doc_id: str, 
         query: str, 
         k: int = 5,
-        page_filter: Optional[List[int]] = None,
+        page_filter: Optional[Union[str, List[int]]] = None,
         score_threshold: float = 0.0
     ) -> List[dict]:
         """
@@ -205,11 +1007,15 @@ class DocumentProcessor:
             doc_id: Document identifier
             query: Search query
             k: Number of results to return
-            page_filter: Optional list of page numbers to filter by
+            page_filter: Optional page numbers, or a page specification such
+                as "1-50", "40-" or "Chapter 3" (see parse_page_spec)
             score_threshold: Minimum similarity score (0-1)
             
         Returns:
-            List of dicts with content, page, and source
+            List of dicts with content, page, page_end, section and source
+
+        Raises:
+            ValueError: If the document is not found or the page filter is invalid
         """
         try:
             db = self.get_vector_store(doc_id)
@@ -217,31 +1023,20 @@ class DocumentProcessor:
             # Build metadata filter if page_filter is provided
             where_filter = None
             if page_filter:
-                where_filter = {"page": {"$in": page_filter}}
+                ranges = parse_page_spec(page_filter, self.get_outline(doc_id)["outline"])
+                if ranges:
+                    where_filter = compile_page_filter(ranges, self._has_page_spans(doc_id, db))
 
-            # Create retriever with proper filter syntax
-            search_kwargs = {
-                "k": k, 
-                "score_threshold": score_threshold
-            }
-            
-            if where_filter:
-                search_kwargs["filter"] = where_filter
-
-            retriever = db.as_retriever(
-                search_type="mmr",
-                search_kwargs=search_kwargs
-            )
-
-            # Get relevant docs
-            docs = retriever.invoke(query)
+            docs = self.retrieve(doc_id, db, query, k, where_filter, score_threshold)
             
             logger.info(f"Found {len(docs)} results for query in doc {doc_id}")
 
-            return [
+            results = [
                 {
                     "content": doc.page_content,
                     "page": doc.metadata.get("page", "unknown"),
+                    "page_end": doc.metadata.get("page_end", doc.metadata.get("page", "unknown")),
+                    "section": doc.metadata.get("section", ""),
                     "source": doc.metadata.get("source", "unknown")
                 }
                 for doc in docs
@@ -253,7 +1048,59 @@ class DocumentProcessor:
         except Exception as e:
             logger.error(f"Error searching document {doc_id}: {str(e)}")
             return []
+
+        # Outside the try: bookkeeping must never hide search results
+        self._record_use(doc_id)
+        return results
     
+    def retrieve(
+        self,
+        doc_id: str,
+        db: Chroma,
+        query: str,
+        k: int,
+        where_filter: Optional[dict] = None,
+        score_threshold: float = 0.0
+    ) -> List[Document]:
+        """
+        Run a search against an opened store with a ready-made where-filter.
+
+        search_document builds the filter from a page specification; this is
+        the step after it (also used by the benchmark to time raw filters).
+        """
+        # Fetched once: LRU or GC eviction may drop the entry at any moment
+        compact = self.compact_stores.get(doc_id)
+        if compact is None and isinstance(db.embeddings, TruncatedEmbeddings):
+            # Evicted after the store was opened; the index still needs the rerank vectors
+            compact = CompactVectors.load(os.path.join(db_base_dir, f"chroma_{doc_id}"))
+        if compact is not None:
+            return self._search_compact(compact, db, query, k, where_filter)
+
+        # Create retriever with proper filter syntax
+        search_kwargs = {
+            "k": k,
+            "score_threshold": score_threshold
+        }
+
+        if where_filter:
+            search_kwargs["filter"] = where_filter
+
+        retriever = db.as_retriever(
+            search_type="mmr",
+            search_kwargs=search_kwargs
+        )
+        return retriever.invoke(query)
+
+    def evict(self, doc_id: str):
+        """Drop every in-memory reference to a document"""
+        self.page_span_stores.pop(doc_id, None)
+        self.outlines.pop(doc_id, None)
+        self.compact_stores.pop(doc_id, None)
+        self.forget_usage([doc_id])
+        if doc_id in self.active_stores:
+            del self.active_stores[doc_id]
+            logger.info(f"Removed {doc_id} from cache")
+
     def delete_document(self, doc_id: str) -> bool:
         """
         Delete a document and its vector store.
@@ -270,9 +1117,8 @@ class DocumentProcessor:
         
         try:
             # Remove from cache
-            if doc_id in self.active_stores:
-                del self.active_stores[doc_id]
-                logger.info(f"Removed {doc_id} from cache")
+            self.evict(doc_id)
+            clear_ingesting(doc_id)
             
             # Remove from disk
             if os.path.exists(persist_directory):
@@ -296,8 +1142,88 @@ class DocumentProcessor:
         except Exception as e:
             logger.error(f"Error deleting document {doc_id}: {str(e)}")
             return False
+
+    def trash_documents(self, doc_ids: List[str]) -> dict:
+        """
+        Delete documents by moving their files to the trash directory.
+
+        Renames are cheap, so documents disappear immediately; the actual
+        removal happens later in empty_trash().
+
+        Args:
+            doc_ids: Document identifiers
+
+        Returns:
+            Dict with "deleted" and "not_found" doc_id lists
+
+        Raises:
+            ValueError: If any doc_id is not a UUID (ids become file paths)
+        """
+        invalid = [doc_id for doc_id in doc_ids if not is_doc_id(doc_id)]
+        if invalid:
+            raise ValueError(f"Invalid doc_ids: {', '.join(map(repr, invalid))}")
+
+        os.makedirs(trash_dir, exist_ok=True)
+        deleted, not_found = [], []
+
+        for doc_id in doc_ids:
+            paths = [
+                os.path.join(db_base_dir, f"chroma_{doc_id}"),
+                os.path.join(uploads_dir, f"{doc_id}.pdf"),
+                os.path.join(uploads_dir, f"{doc_id}.txt")
+            ]
+            existing = [path for path in paths if os.path.exists(path)]
+            if not existing:
+                not_found.append(doc_id)
+                continue
+
+            self.evict(doc_id)
+            target = os.path.join(trash_dir, f"{doc_id}-{uuid4().hex[:8]}")
+            os.makedirs(target)
+            for path in existing:
+                os.replace(path, os.path.join(target, os.path.basename(path)))
+            deleted.append(doc_id)
+
+        if deleted:
+            logger.info(f"Moved {len(deleted)} documents to trash")
+        return {"deleted": deleted, "not_found": not_found}
+
+    def empty_trash(self) -> int:
+        """
+        Permanently remove trashed documents.
+
+        Returns:
+            Bytes freed
+        """
+        import shutil
+
+        if not os.path.exists(trash_dir):
+            return 0
+
+        freed = 0
+        for name in os.listdir(trash_dir):
+            path = os.path.join(trash_dir, name)
+            size = directory_size(path)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                freed += size
+            except OSError as e:
+                logger.error(f"Could not remove {path} from trash: {str(e)}")
+
+        if freed:
+            logger.info(f"Emptied trash: {freed} bytes freed")
+        return freed
     
     def clear_cache(self):
         """Clear all cached vector stores from memory"""
         self.active_stores.clear()
-        logger.info("Cleared all cached vector stores")
\ No newline at end of file
+        self.compact_stores.clear()
+        logger.info("Cleared all cached vector stores")
+
+
+# Shared processor for the API and the agent tools (cheap to construct; the
+# embedding model loads on first use or during startup warmup)
+processor = DocumentProcessor()
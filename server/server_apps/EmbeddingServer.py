@@ -0,0 +1,382 @@
+"""
+Shared embedding server for multi-worker deployments.
+
+One process loads the embedding model; uvicorn workers send texts over a
+local socket and requests from all workers are batched together. Start
+everything with:
+
+    python -m server_apps.EmbeddingServer --workers 4 --port 8000
+
+which runs the embedding server and `uvicorn ... --workers 4` with
+EMBEDDING_SERVER_SOCKET set, so each worker uses RemoteEmbeddings instead
+of its own model copy. The server can also run alone with --serve-only.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# Unix socket path, or tcp://host:port; empty = load the model in-process
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+DEFAULT_SOCKET = "/tmp/study_app_embeddings.sock"
+# Largest number of texts encoded in one model call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# How long the first request of a batch waits for others to join
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+# Requests with at most this many texts (queries) are encoded before document batches
+EMBED_QUERY_MAX_TEXTS = int(os.getenv("EMBED_QUERY_MAX_TEXTS", "4"))
+# How long clients keep retrying while the server starts (model load)
+EMBEDDING_SERVER_CONNECT_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_CONNECT_TIMEOUT", "120"))
+
+_HEADER = struct.Struct("!I")  # Frame length prefix
+
+# ==========================================================
+# FRAMING
+# ==========================================================
+
+
+def _parse_address(address: str):
+    """("unix", path) or ("tcp", (host, port))"""
+    if address.startswith("tcp://"):
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        return "tcp", (host, int(port))
+    return "unix", address
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Embedding server closed the connection")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return await reader.readexactly(size)
+
+
+def _write_frame(writer: asyncio.StreamWriter, payload: bytes):
+    writer.write(_HEADER.pack(len(payload)) + payload)
+
+
+# ==========================================================
+# SERVER
+# ==========================================================
+
+
+class BatchingEmbedder:
+    """
+    Collects embedding requests from all connections into shared model calls.
+
+    A batch closes when it reaches max_batch texts or max_wait seconds after
+    its first request; model calls run one at a time on a worker thread.
+
+    Large requests (document ingestion) are split into max_batch slices and
+    small ones (queries) are queued ahead of them, so a chat query waits for
+    at most one model call instead of a whole document.
+    """
+
+    def __init__(self, embeddings, max_batch: int = EMBED_BATCH_SIZE, max_wait: float = EMBED_BATCH_WAIT_MS / 1000):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.PriorityQueue()  # (priority, sequence, texts, future)
+        self._sequence = itertools.count()  # FIFO within a priority
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "encode_seconds": 0.0}
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0,), dtype=np.float32)
+
+        loop = asyncio.get_running_loop()
+        priority = 0 if len(texts) <= EMBED_QUERY_MAX_TEXTS else 1
+        futures = []
+        for i in range(0, len(texts), self.max_batch):
+            future = loop.create_future()
+            await self.queue.put((priority, next(self._sequence), texts[i:i + self.max_batch], future))
+            futures.append(future)
+
+        self.stats["requests"] += 1
+        parts = await asyncio.gather(*futures)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            count = len(batch[0][2])
+            deadline = loop.time() + self.max_wait
+            while count < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if count + len(item[2]) > self.max_batch:
+                    # Keep model calls within max_batch; the item keeps its place in line
+                    self.queue.put_nowait(item)
+                    break
+                batch.append(item)
+                count += len(item[2])
+
+            texts = [text for _, _, item_texts, _ in batch for text in item_texts]
+            start = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._encode, texts)
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats["texts"] += len(texts)
+            self.stats["batches"] += 1
+            self.stats["encode_seconds"] += time.perf_counter() - start
+
+            offset = 0
+            for _, _, item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+
+class EmbeddingServer:
+    """Serves embeddings from one model over a local socket"""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.embedder: Optional[BatchingEmbedder] = None
+        self.info = {}
+
+    def load_model(self):
+        from .Document import EMBEDDING_MODEL
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        start = time.perf_counter()
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        client = getattr(embeddings, "_client", None)
+        self.info = {
+            "model": EMBEDDING_MODEL,
+            "max_seq_length": getattr(client, "max_seq_length", None),
+            "load_seconds": time.perf_counter() - start
+        }
+        self.embedder = BatchingEmbedder(embeddings)
+        logger.info(f"Embedding server loaded {EMBEDDING_MODEL} in {self.info['load_seconds']:.2f}s")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break
+
+                op = request.get("op", "embed")
+                try:
+                    if op == "embed":
+                        vectors = await self.embedder.embed(request["texts"])
+                        header = {"count": int(vectors.shape[0]), "dims": int(vectors.shape[1]) if vectors.ndim == 2 else 0}
+                        _write_frame(writer, json.dumps(header).encode("utf-8"))
+                        _write_frame(writer, vectors.tobytes())
+                    elif op == "info":
+                        _write_frame(writer, json.dumps({**self.info, "stats": self.embedder.stats, "pid": os.getpid()}).encode("utf-8"))
+                    else:
+                        _write_frame(writer, json.dumps({"error": f"unknown op {op}"}).encode("utf-8"))
+                except Exception as e:
+                    logger.error(f"Embedding request failed: {str(e)}")
+                    _write_frame(writer, json.dumps({"error": str(e)}).encode("utf-8"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, ready: Optional[threading.Event] = None):
+        await asyncio.get_running_loop().run_in_executor(None, self.load_model)
+        batcher = asyncio.create_task(self.embedder.run())
+
+        kind, target = _parse_address(self.address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.remove(target)
+            server = await asyncio.start_unix_server(self.handle, path=target)
+        else:
+            server = await asyncio.start_server(self.handle, host=target[0], port=target[1])
+
+        logger.info(f"Embedding server listening on {self.address}")
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if kind == "unix" and os.path.exists(target):
+                os.remove(target)
+
+
+# ==========================================================
+# CLIENT
+# ==========================================================
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings client for the shared embedding server.
+
+    Thread-safe: each thread keeps its own connection. The tokenizer is
+    loaded locally (small) so chunking can count tokens without a round trip.
+    """
+
+    def __init__(self, address: str, connect_timeout: float = EMBEDDING_SERVER_CONNECT_TIMEOUT):
+        self.address = address
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+        self._info = None
+        self._tokenizer = None
+
+    def _connect(self) -> socket.socket:
+        kind, target = _parse_address(self.address)
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = None
+            try:
+                if kind == "unix":
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                else:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.connect(target)
+                return sock
+            except OSError:
+                if sock is not None:
+                    sock.close()
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"Embedding server not reachable at {self.address}")
+                time.sleep(0.5)
+
+    def _request(self, request: dict, expect_vectors: bool):
+        """Send one request, reconnecting once if a pooled connection went stale"""
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                _send_frame(sock, json.dumps(request).encode("utf-8"))
+                header = json.loads(_recv_frame(sock))
+                if "error" in header:
+                    raise RuntimeError(f"Embedding server error: {header['error']}")
+                if not expect_vectors:
+                    return header
+                data = _recv_frame(sock)
+                return np.frombuffer(data, dtype=np.float32).reshape(header["count"], header["dims"])
+            except (ConnectionError, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt == 1:
+                    raise
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._request({"op": "embed", "texts": list(texts)}, expect_vectors=True).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @property
+    def info(self) -> dict:
+        """Model name, max_seq_length and server stats"""
+        if self._info is None:
+            self._info = self._request({"op": "info"}, expect_vectors=False)
+        return self._info
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.info["model"])
+        return self._tokenizer
+
+
+# ==========================================================
+# LAUNCHER
+# ==========================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding server and multi-worker launcher")
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET or DEFAULT_SOCKET,
+                        help="Unix socket path or tcp://host:port")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--serve-only", action="store_true", help="Run only the embedding server")
+    args = parser.parse_args()
+
+    server = EmbeddingServer(args.socket)
+    if args.serve_only:
+        asyncio.run(server.serve())
+        return
+
+    # Embedding server on a background thread; uvicorn workers as a child process
+    ready = threading.Event()
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve(ready)), daemon=True)
+    thread.start()
+    if not ready.wait(timeout=EMBEDDING_SERVER_CONNECT_TIMEOUT):
+        logger.error("Embedding server failed to start")
+        sys.exit(1)
+
+    env = {**os.environ, "EMBEDDING_SERVER_SOCKET": args.socket}
+    command = [
+        sys.executable, "-m", "uvicorn", "server_apps.FastAPI_app:app",
+        "--host", args.host, "--port", str(args.port), "--workers", str(args.workers)
+    ]
+    logger.info(f"Starting {args.workers} API workers sharing {args.socket}")
+    workers = subprocess.Popen(command, env=env)
+    try:
+        sys.exit(workers.wait())
+    except KeyboardInterrupt:
+        workers.terminate()
+        sys.exit(workers.wait())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,41 @@
+import time
+_import_start = time.perf_counter()
+
 import os
+import asyncio
 import logging
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import List, Optional, Literal
 from uuid import uuid4
 
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
 
-from .Document import DocumentProcessor, uploads_dir, db_base_dir
-from .LangGraph_tool import graph
+from .Document import processor, uploads_dir, db_base_dir, is_doc_id, mark_ingesting
+from .Streaming import stream_sse
+from .Metrics import metrics
+from .Admission import AdmissionController
+from .LLM_client import turn_deadline, LLMUnavailableError
+from .OCR import shutdown_pool as shutdown_ocr_pool
+from .Startup import Warmup, load_module, record_timing
+from .Storage import StorageGCTask
+from .Library import (
+    BULK_MAX_FILES,
+    BulkUploadJob,
+    bulk_jobs,
+    register_job,
+    save_pdf,
+    save_zip_pdfs,
+    export_library,
+    import_library,
+)
 
 load_dotenv()
 
@@ -20,17 +43,36 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize document processor
-processor = DocumentProcessor()
+# Per-client rate limits and concurrency caps for chat and ingestion
+admission = AdmissionController()
 
 # ==========================================================
 # FASTAPI SERVER
 # ==========================================================
 
+# Loads the embedding model, agent and hot stores after the server is up
+warmup = Warmup()
+# Periodic orphan cleanup and consistency check of uploads/ and db/
+storage_gc = StorageGCTask(acquire_slot=lambda: admission.acquire("ingest"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown"""
+    warmup.start(processor)
+    storage_gc.start()
+    yield
+    await storage_gc.stop()
+    await warmup.stop()
+    processor.save_usage()
+    shutdown_ocr_pool()
+
+
 app = FastAPI(
     title="PDF Study Assistant API",
     description="RAG-based study assistant with chat, summarization, and quiz generation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend access
@@ -43,11 +85,84 @@ app.add_middleware(
 )
 
 
+# Background tasks that must outlive a cancelled request
+background_tasks = set()
+
+
+def _spawn_background(coro):
+    """Run a coroutine detached from the (possibly cancelled) request task"""
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def _record_output_tokens(output) -> int:
+    """Track completion tokens of finished LLM calls for the tokens-saved estimate"""
+    usage = getattr(output, "usage_metadata", None) or {}
+    tokens = usage.get("output_tokens", 0)
+    if tokens:
+        metrics.inc("llm_calls_completed")
+        metrics.inc("llm_output_tokens", tokens)
+    return tokens
+
+
+def _estimate_tokens_saved(partial_content: str) -> float:
+    """
+    Estimate completion tokens avoided by cancelling a turn.
+
+    Uses the running average of output tokens per completed LLM call minus
+    the (roughly 4 chars/token) text already generated.
+    """
+    calls = metrics.get("llm_calls_completed")
+    if not calls:
+        return 0.0
+    average = metrics.get("llm_output_tokens") / calls
+    return max(0.0, average - len(partial_content) / 4)
+
+
+def _tool_action(tool_name: str) -> str:
+    """Status message shown to the client while a tool runs"""
+    if "search" in tool_name:
+        return "Searching document..."
+    elif "summary" in tool_name:
+        return "Generating summary..."
+    elif "quiz" in tool_name:
+        return "Creating quiz questions..."
+    return "Processing..."
+
+
 class ChatRequest(BaseModel):
     """Request model for chat endpoint"""
     message: str
     doc_id: str
     checkpoint_id: Optional[str] = None
+    # Optional direct tool call: skips the routing LLM call when the intent is known
+    tool: Optional[Literal["search_document_tool", "generate_summary_tool", "generate_quiz_tool"]] = None
+    tool_args: Optional[dict] = None
+
+
+class QuizRequest(BaseModel):
+    """Request model for the structured quiz endpoint"""
+    doc_id: str
+    pages: Optional[str] = None
+    num_questions: int = Field(default=5, ge=1, le=10)
+    difficulty: Literal["easy", "medium", "hard"] = "medium"
+    stream: bool = False
+
+
+class BulkDeleteRequest(BaseModel):
+    """Request model for deleting many documents at once"""
+    doc_ids: List[str] = Field(min_length=1, max_length=1000)
+
+    @field_validator("doc_ids")
+    @classmethod
+    def check_doc_ids(cls, doc_ids: List[str]) -> List[str]:
+        # doc_ids become file names; anything but a UUID could escape uploads/ and db/
+        invalid = [doc_id for doc_id in doc_ids if not is_doc_id(doc_id)]
+        if invalid:
+            raise ValueError(f"Invalid doc_ids: {', '.join(map(repr, invalid))}")
+        return doc_ids
 
 
 # ============================================================================
@@ -55,11 +170,12 @@ class ChatRequest(BaseModel):
 # ============================================================================
 
 @app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(request: Request, file: UploadFile = File(...)):
     """
     Upload and process a PDF document.
 
-    Returns document ID and processing status.
+    Returns document ID and processing status. Subject to the ingestion
+    rate limit and concurrency cap (429 with Retry-After when exceeded).
     """
     # Validate file type
     if not file.filename.endswith('.pdf'):
@@ -68,13 +184,20 @@ async def upload_pdf(file: UploadFile = File(...)):
             detail="Only PDF files are allowed"
         )
 
+    async with await admission.admit("ingest", request):
+        return await _ingest_upload(file)
+
+
+async def _ingest_upload(file: UploadFile) -> dict:
+    """Save an uploaded PDF and build its vector store off the event loop"""
     # Generate unique document ID
     doc_id = str(uuid4())
     file_path = os.path.join(uploads_dir, f"{doc_id}.pdf")
     metadata_path = os.path.join(uploads_dir, f"{doc_id}.txt")
 
     try:
-        # Save uploaded file
+        # Save uploaded file (marked first so the storage GC leaves it alone)
+        mark_ingesting(doc_id)
         logger.info(f"Saving uploaded file: {file.filename}")
         with open(file_path, "wb") as f:
             content = await file.read()
@@ -86,10 +209,12 @@ async def upload_pdf(file: UploadFile = File(...)):
 
         # Process document (create vector store)
         logger.info(f"Processing PDF with doc_id: {doc_id}")
-        result = processor.process_pdf(file_path, doc_id)
+        result = await run_in_threadpool(processor.process_pdf, file_path, doc_id)
 
         # Check if processing was successful
         if result.get("status") == "error":
+            # Remove the PDF, metadata and any half-written store
+            await run_in_threadpool(processor.delete_document, doc_id)
             raise HTTPException(
                 status_code=500,
                 detail=f"Error processing PDF: {result.get('error')}"
@@ -106,9 +231,8 @@ async def upload_pdf(file: UploadFile = File(...)):
         raise
     except Exception as e:
         logger.error(f"Unexpected error processing PDF: {str(e)}")
-        # Clean up file if processing failed
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Clean up the PDF, metadata and any half-written store
+        await run_in_threadpool(processor.delete_document, doc_id)
         raise HTTPException(
             status_code=500, 
             detail=f"Error processing PDF: {str(e)}"
@@ -161,6 +285,24 @@ async def list_documents():
         )
 
 
+@app.get("/documents/{doc_id}/outline")
+async def get_document_outline(doc_id: str):
+    """
+    Get a document's outline (chapters/sections with page ranges).
+
+    Outline titles can be used as page filters, e.g. pages="Chapter 3".
+    """
+    db_path = os.path.join(db_base_dir, f'chroma_{doc_id}')
+    if not os.path.exists(db_path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document {doc_id} not found"
+        )
+
+    outline = await run_in_threadpool(processor.get_outline, doc_id)
+    return {"doc_id": doc_id, **outline}
+
+
 @app.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str):
     """
@@ -186,35 +328,223 @@ async def delete_document(doc_id: str):
         )
 
 
+@app.post("/upload_pdfs")
+async def upload_pdfs(request: Request, files: List[UploadFile] = File(...)):
+    """
+    Upload many PDFs (or zip archives of PDFs) in one request.
+
+    Files are saved immediately and ingested in the background, a few at
+    a time; the response is an SSE progress stream ("job", "file_start",
+    "file_done", "summary", "end"). Ingestion continues if the client
+    disconnects - poll GET /upload_jobs/{job_id} instead. The whole batch
+    counts as one ingestion request for rate limiting; the request's slot
+    covers saving the files, then each file takes an ingest slot of its own
+    while it is processed, so bulk work stays within MAX_CONCURRENT_INGEST.
+    """
+    slot = await admission.admit("ingest", request)
+    try:
+        saved, rejected = [], []
+        for file in files:
+            name = file.filename or "upload"
+            remaining = BULK_MAX_FILES - len(saved)
+            if name.lower().endswith(".zip"):
+                try:
+                    zip_saved, zip_rejected = await run_in_threadpool(save_zip_pdfs, file.file, remaining)
+                except ValueError as e:
+                    rejected.append({"filename": name, "error": str(e)})
+                    continue
+                saved.extend(zip_saved)
+                rejected.extend(zip_rejected)
+            elif not name.lower().endswith(".pdf"):
+                rejected.append({"filename": name, "error": "Only PDF and zip files are allowed"})
+            elif remaining <= 0:
+                rejected.append({"filename": name, "error": f"More than {BULK_MAX_FILES} files"})
+            else:
+                saved.append(await run_in_threadpool(save_pdf, file.file, name))
+
+        if not saved:
+            raise HTTPException(
+                status_code=400,
+                detail={"message": "No PDF files to process", "rejected": rejected}
+            )
+    finally:
+        await slot.release()
+
+    job = BulkUploadJob(saved, rejected, acquire_slot=lambda: admission.acquire("ingest"))
+    register_job(job)
+    metrics.inc("bulk_upload_jobs")
+    logger.info(f"Bulk upload {job.job_id}: {len(saved)} files queued, {len(rejected)} rejected")
+
+    _spawn_background(job.run())
+
+    async def events():
+        yield {
+            "type": "job",
+            "job_id": job.job_id,
+            "files": [{"doc_id": f["doc_id"], "filename": f["filename"]} for f in saved],
+            "rejected": rejected
+        }
+        async for event in job.stream():
+            yield event
+
+    return StreamingResponse(
+        stream_sse(events(), is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"  # Disable nginx buffering
+        }
+    )
+
+
+@app.get("/upload_jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """
+    Get the progress of a bulk upload.
+    """
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload job {job_id} not found"
+        )
+    return job.status()
+
+
+@app.post("/documents/bulk_delete", status_code=202)
+async def bulk_delete_documents(request: BulkDeleteRequest):
+    """
+    Delete many documents at once.
+
+    Documents are moved to the trash and disappear immediately; their files
+    are removed in the background.
+    """
+    try:
+        result = await run_in_threadpool(processor.trash_documents, request.doc_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error deleting documents: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error deleting documents: {str(e)}"
+        )
+
+    if result["deleted"]:
+        _spawn_background(run_in_threadpool(processor.empty_trash))
+    metrics.inc("bulk_deleted_documents", len(result["deleted"]))
+    return {"status": "accepted", **result}
+
+
+@app.get("/library/export")
+async def export_library_archive(
+    doc_ids: Optional[str] = Query(default=None, description="Comma-separated doc_ids (default: all)"),
+    include_pdfs: bool = True
+):
+    """
+    Download documents' vector stores as one zip archive.
+
+    Importing the archive on another node (POST /library/import) restores
+    the documents without re-embedding them.
+    """
+    selected = [d.strip() for d in doc_ids.split(",") if d.strip()] if doc_ids else None
+    try:
+        archive_path, manifest = await run_in_threadpool(export_library, selected, include_pdfs)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error exporting library: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error exporting library: {str(e)}"
+        )
+
+    return FileResponse(
+        archive_path,
+        media_type="application/zip",
+        filename=f"library-{len(manifest['documents'])}-documents.zip",
+        background=BackgroundTask(os.remove, archive_path)
+    )
+
+
+@app.post("/library/import")
+async def import_library_archive(request: Request, file: UploadFile = File(...), overwrite: bool = False):
+    """
+    Restore documents from a library export archive.
+
+    The archive must have been built with the same embedding model.
+    Existing documents are skipped unless overwrite is set.
+    """
+    async with await admission.admit("ingest", request):
+        try:
+            result = await run_in_threadpool(import_library, file.file, overwrite)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error importing library: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error importing library: {str(e)}"
+            )
+
+    return {"status": "success", **result}
+
+
 async def stream_agent_response(
     message: str, 
     doc_id: str, 
-    checkpoint_id: Optional[str] = None
+    checkpoint_id: Optional[str] = None,
+    direct_call: Optional[AIMessage] = None
 ):
     """
-    Stream agent responses using Server-Sent Events (SSE).
+    Stream agent events for a chat turn.
     
-    Handles conversation continuity via checkpoint_id.
+    Handles conversation continuity via checkpoint_id. When direct_call is
+    given, the graph starts at tool execution and only the final answer
+    LLM call is made. Yields event dicts; SSE encoding, token coalescing
+    and heartbeats are applied by stream_sse.
     """
     is_new_conversation = checkpoint_id is None
+    partial_content = []
+    usage = {"input_tokens": 0, "cached_tokens": 0, "uncached_tokens": 0, "llm_calls": 0}
+    events = None
+    metrics.inc("chat_runs_started")
     
     try:
         # Generate checkpoint ID for new conversations
         if is_new_conversation:
             checkpoint_id = str(uuid4())
             logger.info(f"Starting new conversation with checkpoint_id: {checkpoint_id}")
-            yield f'data: {{"type": "checkpoint", "checkpoint_id": "{checkpoint_id}"}}\n\n'
+            yield {"type": "checkpoint", "checkpoint_id": checkpoint_id}
         else:
             logger.info(f"Continuing conversation with checkpoint_id: {checkpoint_id}")
         
-        # Configuration for LangGraph with thread_id for memory
-        config = {"configurable": {"thread_id": checkpoint_id}}
+        # Configuration for LangGraph with thread_id for memory and the
+        # deadline shared by every LLM call in this turn
+        config = {
+            "configurable": {
+                "thread_id": checkpoint_id,
+                "turn_deadline": turn_deadline()
+            }
+        }
+        
+        # Direct tool turns carry the prepared tool call after the user message
+        input_messages = [HumanMessage(content=message)]
+        task_type = None
+        if direct_call is not None:
+            input_messages.append(direct_call)
+            task_type = direct_call.tool_calls[0]["name"]
+            metrics.inc("chat_direct_tool_turns")
+            yield {"type": "tool_start", "action": _tool_action(task_type)}
         
-        # Stream events from the graph
-        events = graph.astream_events(
+        # Stream events from the graph (imported on first use if not warmed up)
+        agent = await load_module("LangGraph_tool")
+        events = agent.graph.astream_events(
             {
-                "messages": [HumanMessage(content=message)],
-                "doc_id": doc_id
+                "messages": input_messages,
+                "doc_id": doc_id,
+                "task_type": task_type
             },
             version="v2",
             config=config
@@ -228,51 +558,124 @@ async def stream_agent_response(
             if event_type == "on_chat_model_stream":
                 chunk = event["data"]["chunk"]
                 if hasattr(chunk, 'content') and chunk.content:
-                    # Escape special characters for JSON
-                    content = chunk.content.replace('"', '\\"').replace("\n", "\\n")
-                    yield f'data: {{"type": "content", "content": "{content}"}}\n\n'
+                    partial_content.append(chunk.content)
+                    yield {"type": "content", "content": chunk.content}
             
             # Notify when LLM finishes and tool calls begin
             elif event_type == "on_chat_model_end":
                 output = event["data"]["output"]
+                _record_output_tokens(output)
                 if hasattr(output, "tool_calls") and output.tool_calls:
                     tool_call = output.tool_calls[0]
-                    tool_name = tool_call["name"]
-                    
-                    # Determine action message based on tool
-                    action = "Processing..."
-                    if "search" in tool_name:
-                        action = "Searching document..."
-                    elif "summary" in tool_name:
-                        action = "Generating summary..."
-                    elif "quiz" in tool_name:
-                        action = "Creating quiz questions..."
                     
-                    yield f'data: {{"type": "tool_start", "action": "{action}"}}\n\n'
+                    # Only the final answer counts as the partial reply
+                    partial_content.clear()
+                    yield {"type": "tool_start", "action": _tool_action(tool_call["name"])}
+            
+            # Sources found by a tool, sent before the answer that cites them
+            elif event_type == "on_custom_event" and event.get("name") == "sources":
+                metrics.inc("chat_sources_sent", len(event["data"]["sources"]))
+                yield {"type": "sources", **event["data"]}
+            
+            # Accumulate cached vs uncached prompt tokens reported by agent_node
+            elif event_type == "on_chain_end" and event.get("name") == "agent":
+                output = event["data"].get("output") or {}
+                for msg in output.get("messages", []):
+                    stats = getattr(msg, "response_metadata", {}).get("prompt_cache")
+                    if stats:
+                        usage["llm_calls"] += 1
+                        for key in ("input_tokens", "cached_tokens", "uncached_tokens"):
+                            usage[key] += stats[key]
         
-        # Send end signal
-        yield f'data: {{"type": "end"}}\n\n'
+        # Report prompt token usage for the turn, then send end signal
+        if usage["llm_calls"]:
+            yield {"type": "usage", **usage}
+        metrics.inc("chat_runs_completed")
+        yield {"type": "end"}
         logger.info(f"Completed streaming response for checkpoint_id: {checkpoint_id}")
         
+    except (asyncio.CancelledError, GeneratorExit):
+        # Client disconnected: stop the graph run and keep the thread consistent
+        partial = "".join(partial_content)
+        saved = _estimate_tokens_saved(partial)
+        metrics.inc("chat_runs_cancelled")
+        metrics.inc("chat_tokens_saved_estimate", saved)
+        logger.info(
+            f"Cancelled run for checkpoint_id: {checkpoint_id} "
+            f"(~{saved:.0f} output tokens saved)"
+        )
+        if checkpoint_id is not None and events is not None:
+            _spawn_background(
+                agent.record_cancelled_turn({"configurable": {"thread_id": checkpoint_id}}, partial)
+            )
+        raise
+        
     except Exception as e:
         logger.error(f"Error in stream_agent_response: {str(e)}")
+        metrics.inc("chat_runs_failed")
         # Send error to client
-        error_msg = str(e).replace('"', '\\"').replace("\n", "\\n")
-        yield f'data: {{"type": "error", "message": "{error_msg}"}}\n\n'
+        yield {"type": "error", "message": str(e)}
         # Always send end signal
-        yield f'data: {{"type": "end"}}\n\n'
+        yield {"type": "end"}
+
+    finally:
+        # Closing the event stream cancels any graph tasks still running
+        if events is not None:
+            await events.aclose()
+
+
+class _SlotStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that releases an admission slot however it ends.
+
+    guard() only releases once the body has started, and a background task
+    is skipped when the client disconnects before the body is read, so the
+    release also runs when the ASGI call returns or raises (idempotent).
+    """
+
+    def __init__(self, slot, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.slot.release()
+
+
+def _slot_stream(slot, events, raw_request: Request) -> StreamingResponse:
+    """SSE response holding an admission slot until it ends (released on any error before that)"""
+    try:
+        return _SlotStreamingResponse(
+            slot,
+            slot.guard(stream_sse(events, is_disconnected=raw_request.is_disconnected)),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "X-Accel-Buffering": "no"  # Disable nginx buffering
+            }
+        )
+    except BaseException:
+        _spawn_background(slot.release())
+        raise
 
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, raw_request: Request):
     """
     Stream chat responses with conversation memory.
     
-    Supports multi-turn conversations via checkpoint_id.
+    Supports multi-turn conversations via checkpoint_id. Clients that already
+    know the intent (e.g. "Summarize" / "Quiz me" buttons) can pass tool and
+    tool_args to skip the routing LLM call. The graph run is cancelled if
+    the client disconnects mid-stream. Subject to the chat rate limit and
+    concurrency cap (429 with Retry-After when exceeded).
     """
     try:
         # Validate inputs
-        if not request.message.strip():
+        if not request.message.strip() and not request.tool:
             raise HTTPException(
                 status_code=400,
                 detail="Message cannot be empty"
@@ -292,24 +695,39 @@ async def chat_endpoint(request: ChatRequest):
                 detail=f"Document {request.doc_id} not found. Please upload it first."
             )
         
+        # Validate a direct tool call before admitting the request
+        direct_call = None
+        if request.tool:
+            agent = await load_module("LangGraph_tool")
+            try:
+                direct_call = agent.build_direct_tool_call(request.tool, request.tool_args, request.doc_id)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Invalid tool call: {str(e)}"
+                )
+        
+        message = request.message.strip() or f"Run {request.tool} with {request.tool_args or {}}"
+        
         logger.info(
             f"Chat request - doc_id: {request.doc_id}, "
             f"checkpoint_id: {request.checkpoint_id}, "
-            f"message: {request.message[:50]}..."
+            f"tool: {request.tool}, "
+            f"message: {message[:50]}..."
         )
         
-        return StreamingResponse(
+        # The slot is held until the stream finishes or the client disconnects
+        slot = await admission.admit("chat", raw_request)
+        
+        return _slot_stream(
+            slot,
             stream_agent_response(
-                request.message, 
+                message, 
                 request.doc_id, 
-                request.checkpoint_id
+                request.checkpoint_id,
+                direct_call
             ),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"  # Disable nginx buffering
-            }
+            raw_request
         )
         
     except HTTPException:
@@ -322,6 +740,66 @@ async def chat_endpoint(request: ChatRequest):
         )
 
 
+@app.post("/quiz")
+async def quiz_endpoint(request: QuizRequest, raw_request: Request):
+    """
+    Generate a quiz as structured JSON without going through the agent.
+
+    Retrieves content once and makes a single structured LLM call. With
+    stream=true, questions are sent as SSE "question" events as soon as
+    each one is complete.
+    """
+    # Verify document exists
+    db_path = os.path.join(db_base_dir, f'chroma_{request.doc_id}')
+    if not os.path.exists(db_path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document {request.doc_id} not found. Please upload it first."
+        )
+
+    logger.info(
+        f"Quiz request - doc_id: {request.doc_id}, pages: {request.pages}, "
+        f"num_questions: {request.num_questions}, difficulty: {request.difficulty}"
+    )
+
+    quiz = await load_module("Quiz")
+    slot = await admission.admit("chat", raw_request)
+
+    if request.stream:
+        return _slot_stream(
+            slot,
+            quiz.stream_quiz(
+                request.doc_id,
+                request.pages,
+                request.num_questions,
+                request.difficulty
+            ),
+            raw_request
+        )
+
+    try:
+        async with slot:
+            return await quiz.generate_quiz(
+                request.doc_id,
+                request.pages,
+                request.num_questions,
+                request.difficulty
+            )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except quiz.QuizGenerationError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in quiz_endpoint: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating quiz: {str(e)}"
+        )
+
+
 @app.get("/health")
 async def health_check():
     """
@@ -334,6 +812,37 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the embedding model, agent and preloaded
+    stores are loaded, 503 while starting (or if warmup failed).
+    /health only reports that the process is up.
+    """
+    status = warmup.status()
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+@app.get("/storage/gc")
+async def storage_gc_status():
+    """
+    Storage GC schedule and the report of its last run (findings,
+    reclaimed bytes, scan duration). Run it on demand with the CLI:
+    python -m server_apps.Storage
+    """
+    return storage_gc.status()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    In-process counters (cancelled runs, estimated tokens saved, ...).
+    """
+    return metrics.snapshot()
+
+
 @app.get("/")
 async def root():
     """
@@ -344,15 +853,27 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "upload": "POST /upload_pdf",
+            "bulk_upload": "POST /upload_pdfs",
             "list": "GET /documents",
             "delete": "DELETE /documents/{doc_id}",
+            "bulk_delete": "POST /documents/bulk_delete",
+            "export": "GET /library/export",
+            "import": "POST /library/import",
             "chat": "POST /chat",
-            "health": "GET /health"
+            "quiz": "POST /quiz",
+            "health": "GET /health",
+            "ready": "GET /ready",
+            "storage_gc": "GET /storage/gc",
+            "metrics": "GET /metrics"
         },
         "documentation": "/docs"
     }
 
 
+# Time spent importing this module and its eager dependencies
+record_timing("import_app", time.perf_counter() - _import_start)
+
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -0,0 +1,458 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+from .Metrics import metrics
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# "gemini" (default) or "standin" (local deterministic model for tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash-exp")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+
+# Overall time budget for all LLM calls in one chat turn
+LLM_TURN_BUDGET_SECONDS = float(os.getenv("LLM_TURN_BUDGET_SECONDS", "60"))
+# Upper bound for a single attempt (also capped by the remaining turn budget)
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Launch a second, parallel attempt if the first is slower than this (0 disables)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+
+# Circuit breaker: open after N consecutive failures, probe again after cooldown
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Provider errors worth retrying (matched by class name to stay provider-agnostic)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "TooManyRequests", "GatewayTimeout", "Aborted",
+    "APIConnectionError", "APITimeoutError", "RateLimitError",
+}
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the provider is failing fast (breaker open) or the budget is spent"""
+
+
+# ==========================================================
+# PROVIDERS
+# ==========================================================
+
+
+class StandInChatModel(BaseChatModel):
+    """
+    Local deterministic chat model used in place of a real provider.
+
+    Replies by echoing the last human message and never calls tools, so the
+    full agent/SSE path can be exercised without network access or API keys.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "standin"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        last_human = next(
+            (m for m in reversed(messages) if isinstance(m, HumanMessage)), None
+        )
+        text = last_human.content if last_human is not None else ""
+        return f"[stand-in] {text}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        content = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        for word in self._reply(messages).split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def _gemini_provider() -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        temperature=LLM_TEMPERATURE,
+        max_retries=0,  # Retries are handled by ResilientLLM within the turn budget
+        timeout=LLM_ATTEMPT_TIMEOUT
+    )
+
+
+def _standin_provider() -> BaseChatModel:
+    return StandInChatModel()
+
+
+PROVIDERS: Dict[str, Callable[[], BaseChatModel]] = {
+    "gemini": _gemini_provider,
+    "standin": _standin_provider,
+}
+
+
+def register_provider(name: str, factory: Callable[[], BaseChatModel]):
+    """Register an additional chat model provider by name"""
+    PROVIDERS[name] = factory
+
+
+def create_chat_model(provider: str = LLM_PROVIDER) -> BaseChatModel:
+    """
+    Build the chat model for the configured provider.
+
+    Args:
+        provider: Registered provider name
+
+    Returns:
+        LangChain chat model
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider}. Available: {list(PROVIDERS)}")
+    logger.info(f"Using LLM provider: {provider}")
+    return PROVIDERS[provider]()
+
+
+# ==========================================================
+# CIRCUIT BREAKER
+# ==========================================================
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half_open -> closed)"""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._set_state("closed")
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.set("llm_breaker_state", state)
+
+    def allow(self) -> bool:
+        """Whether a call may go through right now"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            # Let a single probe through
+            self._set_state("half_open")
+            return True
+        if self.state == "half_open":
+            # A probe is already in flight
+            return False
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != "closed":
+            logger.info("LLM circuit breaker closed")
+        self._set_state("closed")
+
+    def abandon_probe(self):
+        """A half-open probe was cancelled; allow the next call to probe again"""
+        if self.state == "half_open":
+            self.opened_at = time.monotonic() - self.cooldown
+            self._set_state("open")
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"LLM circuit breaker opened after {self.failures} failures")
+                metrics.inc("llm_breaker_opened")
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+
+# ==========================================================
+# RESILIENT WRAPPER
+# ==========================================================
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class _StreamWatcher(BaseCallbackHandler):
+    """
+    Notes whether a request has streamed tokens to the caller's callbacks.
+
+    Under graph.astream_events every token becomes an SSE content event, so
+    once a request has streamed it must be the only one that does.
+    """
+
+    run_inline = True  # Called synchronously, so first-token hooks act at once
+
+    def __init__(self, on_first_token: Optional[Callable[["_StreamWatcher"], None]] = None):
+        self.streamed = False
+        self.on_first_token = on_first_token
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if token and not self.streamed:
+            self.streamed = True
+            if self.on_first_token is not None:
+                self.on_first_token(self)
+
+
+def turn_deadline(budget: float = LLM_TURN_BUDGET_SECONDS) -> float:
+    """Monotonic deadline for a chat turn starting now"""
+    return time.monotonic() + budget
+
+
+class ResilientLLM:
+    """
+    Wrap a runnable chat model with deadline-bounded retries.
+
+    Each call gets per-attempt timeouts capped by the remaining turn budget,
+    exponential backoff with full jitter on retryable errors, optional
+    hedging (a parallel second attempt when the first is slow) and a shared
+    circuit breaker that fails fast while the provider is degraded.
+    """
+
+    def __init__(
+        self,
+        runnable: Any,
+        breaker: Optional[CircuitBreaker] = None,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT,
+        hedge_after: float = LLM_HEDGE_AFTER
+    ):
+        self.runnable = runnable
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.hedge_after = hedge_after
+
+    def wrap(self, runnable: Any) -> "ResilientLLM":
+        """Wrap another runnable (e.g. structured output) sharing this breaker and policy"""
+        return ResilientLLM(
+            runnable,
+            breaker=self.breaker,
+            max_attempts=self.max_attempts,
+            attempt_timeout=self.attempt_timeout,
+            hedge_after=self.hedge_after
+        )
+
+    def _invoke(self, messages: Any, watcher: _StreamWatcher, **kwargs):
+        """Start one request, with the watcher added to the inherited callbacks"""
+        config = merge_configs(ensure_config(), {"callbacks": [watcher]})
+        return self.runnable.ainvoke(messages, config=config, **kwargs)
+
+    async def _attempt(self, messages: Any, timeout: float, watchers: List[_StreamWatcher], **kwargs):
+        """
+        One attempt, optionally hedged with a second concurrent request.
+
+        A hedge is only sent while nothing has streamed, and the first
+        request to stream a token cancels the other, so stream events of a
+        turn always come from a single request.
+        """
+        if not self.hedge_after or self.hedge_after >= timeout:
+            watcher = _StreamWatcher()
+            watchers.append(watcher)
+            return await asyncio.wait_for(self._invoke(messages, watcher, **kwargs), timeout)
+
+        requests = {}  # task -> watcher
+
+        def cancel_others(leader: _StreamWatcher):
+            for task, watcher in requests.items():
+                if watcher is not leader:
+                    task.cancel()
+
+        def start():
+            watcher = _StreamWatcher(on_first_token=cancel_others)
+            watchers.append(watcher)
+            requests[asyncio.ensure_future(self._invoke(messages, watcher, **kwargs))] = watcher
+
+        start()
+        try:
+            done, _ = await asyncio.wait(set(requests), timeout=self.hedge_after)
+            if not done and not any(watcher.streamed for watcher in requests.values()):
+                metrics.inc("llm_hedges")
+                logger.info(f"LLM slower than {self.hedge_after}s, sending hedged request")
+                start()
+
+            attempt_deadline = time.monotonic() + timeout - self.hedge_after
+            pending = set(requests)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(0.0, attempt_deadline - time.monotonic()),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                # Requests cancelled because the other one streamed first are skipped
+                finished = [task for task in done if not task.cancelled()]
+                for task in finished:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending and finished:
+                    raise finished[0].exception()
+            raise asyncio.TimeoutError()
+        finally:
+            for task in requests:
+                task.cancel()
+
+    async def ainvoke(self, messages: Any, deadline: Optional[float] = None, **kwargs):
+        """
+        Invoke the wrapped runnable within the deadline.
+
+        Args:
+            messages: Runnable input
+            deadline: Monotonic deadline for the whole turn (None = one attempt timeout per try)
+
+        Returns:
+            The runnable's output
+
+        Raises:
+            LLMUnavailableError: If the breaker is open or the budget is exhausted
+
+        Under a streaming graph run the attempt's tokens reach the client as
+        they arrive, so once any token has streamed a failure is not retried
+        (like astream): a retry would send the answer again from the start.
+        """
+        last_error = None
+        watchers = []
+
+        for attempt in range(1, self.max_attempts + 1):
+            timeout = self.attempt_timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                metrics.inc("llm_budget_exhausted")
+                break
+
+            if not self.breaker.allow():
+                metrics.inc("llm_breaker_rejections")
+                raise LLMUnavailableError(
+                    "The AI service is temporarily unavailable. Please try again shortly."
+                )
+
+            metrics.inc("llm_attempts")
+            try:
+                result = await self._attempt(messages, timeout, watchers, **kwargs)
+                self.breaker.record_success()
+                return result
+
+            except asyncio.CancelledError:
+                self.breaker.abandon_probe()
+                raise
+
+            except Exception as e:
+                last_error = e
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.inc("llm_timeouts")
+                    logger.warning(f"LLM attempt {attempt} timed out after {timeout:.1f}s")
+                else:
+                    logger.warning(f"LLM attempt {attempt} failed: {str(e)}")
+
+                if not _is_retryable(e):
+                    # The provider answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+
+                if any(watcher.streamed for watcher in watchers):
+                    metrics.inc("llm_stream_interrupted")
+                    logger.warning("LLM failed after streaming output, not retrying")
+                    break
+
+                if attempt == self.max_attempts:
+                    break
+
+                # Full-jitter exponential backoff, never past the deadline
+                backoff = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (attempt - 1)))
+                if deadline is not None and time.monotonic() + backoff >= deadline:
+                    metrics.inc("llm_budget_exhausted")
+                    break
+                metrics.inc("llm_retries")
+                await asyncio.sleep(backoff)
+
+        reason = type(last_error).__name__ if last_error else "turn budget exhausted"
+        raise LLMUnavailableError(
+            f"The AI service did not respond in time ({reason}). Please try again."
+        )
+
+    async def astream(self, messages: Any, deadline: Optional[float] = None, **kwargs) -> AsyncIterator:
+        """
+        Stream from the wrapped runnable within the deadline.
+
+        Streams are not retried (output may already have been consumed), but
+        the breaker is honoured and updated, and each chunk must arrive
+        before the attempt timeout / turn deadline.
+
+        Raises:
+            LLMUnavailableError: If the breaker is open or the deadline passes
+        """
+        if not self.breaker.allow():
+            metrics.inc("llm_breaker_rejections")
+            raise LLMUnavailableError(
+                "The AI service is temporarily unavailable. Please try again shortly."
+            )
+
+        metrics.inc("llm_attempts")
+        iterator = self.runnable.astream(messages, **kwargs).__aiter__()
+        try:
+            while True:
+                timeout = self.attempt_timeout
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), max(0.0, timeout))
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            self.breaker.record_success()
+
+        except asyncio.TimeoutError:
+            metrics.inc("llm_timeouts")
+            self.breaker.record_failure()
+            raise LLMUnavailableError("The AI service did not respond in time. Please try again.")
+
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.abandon_probe()
+            raise
+
+        except Exception as e:
+            if _is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -1,16 +1,21 @@
 import os
+import asyncio
 import logging
-from typing import TypedDict, Annotated, Optional, Literal
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Annotated, Optional, Literal, List, Tuple
 from uuid import uuid4
 
 from langgraph.graph import add_messages, StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks.manager import adispatch_custom_event
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.tools import tool
+from langchain_core.tools import tool, InjectedToolArg
 
 from dotenv import load_dotenv
-from .Document import DocumentProcessor
+from .Document import processor
+from .LLM_client import ResilientLLM, create_chat_model, LLM_MODEL
+from .Prompts import PromptAssembler, create_prompt_cache
 
 load_dotenv()
 
@@ -18,30 +23,82 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-processor = DocumentProcessor()
+# Tools run off the event loop; queued work is dropped if the turn is cancelled
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
 
 # ==========================================================
 # LangGraph TOOLS
 # ==========================================================
 
-@tool
-def search_document_tool(doc_id: str, query: str, pages: Optional[str] = None) -> str:
+
+# Characters of chunk text sent to the client per source
+SOURCE_SNIPPET_CHARS = int(os.getenv("SOURCE_SNIPPET_CHARS", "160"))
+
+
+def display_page(page):
+    """1-based page number for citations (chunk metadata is 0-based)"""
+    return page + 1 if isinstance(page, int) else page
+
+
+def page_label(result: dict) -> str:
+    """Citation label for a search result ("Page 4" or "Pages 4-5"), 1-based"""
+    page = display_page(result.get("page", "unknown"))
+    page_end = display_page(result.get("page_end", result.get("page", "unknown")))
+    if page_end != page:
+        return f"Pages {page}-{page_end}"
+    return f"Page {page}"
+
+
+def compact_sources(results: List[dict], start: int = 1, snippet_chars: int = SOURCE_SNIPPET_CHARS) -> List[dict]:
+    """
+    Compact citation payloads for retrieved chunks.
+
+    Ids match the "[Result N ...]" labels the LLM sees and start at start, so
+    they stay unique across every tool call of a turn; pages are 1-based like
+    the labels; snippets are cut at a word boundary; page_end and section
+    are only sent when informative.
+    """
+    sources = []
+    for i, result in enumerate(results, start):
+        text = " ".join(result.get("content", "").split())
+        if len(text) > snippet_chars:
+            text = text[:snippet_chars].rsplit(" ", 1)[0] + "…"
+
+        source = {"id": i, "page": display_page(result.get("page")), "snippet": text}
+        page_end = display_page(result.get("page_end", result.get("page")))
+        if page_end != source["page"]:
+            source["page_end"] = page_end
+        if result.get("section"):
+            source["section"] = result["section"][:80]
+        sources.append(source)
+    return sources
+
+
+@tool(response_format="content_and_artifact")
+def search_document_tool(
+    doc_id: str,
+    query: str,
+    pages: Optional[str] = None,
+    source_offset: Annotated[int, InjectedToolArg] = 0
+) -> Tuple[str, List[dict]]:
     """
     Search within a specific document using semantic similarity.
     
     Args:
         doc_id: The document ID to search within
         query: The search query or question
-        pages: Optional comma-separated page numbers to filter (e.g., "1,2,3")
+        pages: Optional pages to filter: numbers, ranges or chapter names (e.g., "1,2,3", "10-25", "40-", "Chapter 3")
+        source_offset: Sources already sent this turn (set by the tool node, hidden from the LLM)
     
     Returns:
-        Formatted search results with page numbers
+        Formatted search results with page numbers, plus compact sources
+        (sent to the client as citations)
     """
     try:
-        # Parse page filter
-        page_filter = None
-        if pages:
-            page_filter = [int(p.strip()) for p in str(pages).split(",")]
+        # Page filter is parsed (ranges, chapter names) by the processor
+        page_filter = str(pages) if pages else None
+        if page_filter:
             logger.info(f"Searching doc {doc_id} with page filter: {page_filter}")
 
         # Search using processor
@@ -53,41 +110,42 @@ def search_document_tool(doc_id: str, query: str, pages: Optional[str] = None) -
         )
 
         if not results:
-            return "No relevant information found in the specified pages."
+            return "No relevant information found in the specified pages.", []
 
         # Format results for the LLM
         formatted = []
-        for i, result in enumerate(results, 1):
-            page_num = result.get("page", "unknown")
+        for i, result in enumerate(results, source_offset + 1):
             content = result.get("content", "")
             formatted.append(
-                f"[Result {i} - Page {page_num}]\n{content}\n"
+                f"[Result {i} - {page_label(result)}]\n{content}\n"
             )
         
         logger.info(f"Found {len(results)} results for query: {query}")
-        return "\n".join(formatted)
+        return "\n".join(formatted), compact_sources(results, start=source_offset + 1)
         
     except ValueError as e:
         # Document not found
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", []
     except Exception as e:
         logger.error(f"Error in search_document_tool: {str(e)}")
-        return f"Error during document search: {str(e)}"
+        return f"Error during document search: {str(e)}", []
 
 
-@tool
+@tool(response_format="content_and_artifact")
 def generate_summary_tool(
     doc_id: str, 
     pages: Optional[str] = None,
-    detail_level: str = "medium"
-) -> str:
+    detail_level: str = "medium",
+    source_offset: Annotated[int, InjectedToolArg] = 0
+) -> Tuple[str, List[dict]]:
     """
     Generate a summary of the document or specific pages.
     
     Args:
         doc_id: The document ID to summarize
-        pages: Optional comma-separated page numbers (e.g., "1,2,3")
+        pages: Optional pages: numbers, ranges or chapter names (e.g., "1,2,3", "10-25", "Chapter 3")
         detail_level: Level of detail - "brief", "medium", or "detailed"
+        source_offset: Sources already sent this turn (set by the tool node, hidden from the LLM)
     
     Returns:
         Retrieved content with instructions for the LLM to summarize
@@ -97,10 +155,8 @@ def generate_summary_tool(
             f"Generating {detail_level} summary for doc {doc_id}, pages={pages}"
         )
         
-        # Parse page filter
-        page_filter = None
-        if pages:
-            page_filter = [int(p.strip()) for p in str(pages).split(",")]
+        # Page filter is parsed (ranges, chapter names) by the processor
+        page_filter = str(pages) if pages else None
 
         # Retrieve relevant content for summarization
         query = "main topics concepts ideas key points summary"
@@ -114,7 +170,7 @@ def generate_summary_tool(
         logger.info(f"Retrieved {len(results)} chunks for summary")
         
         if not results:
-            return "No relevant information found in the specified pages."
+            return "No relevant information found in the specified pages.", []
 
         # Combine content from all results
         content = "\n\n".join([result["content"] for result in results])
@@ -134,30 +190,43 @@ def generate_summary_tool(
 CONTENT TO SUMMARIZE:
 {content}
 
-Provide a clear, well-structured summary that captures the essential information."""
+Provide a clear, well-structured summary that captures the essential information.""", compact_sources(results, start=source_offset + 1)
         
     except ValueError as e:
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", []
     except Exception as e:
         logger.error(f"Error in generate_summary_tool: {str(e)}")
-        return f"Error during summary generation: {str(e)}"
+        return f"Error during summary generation: {str(e)}", []
+
 
+# Difficulty descriptions shared by the quiz tool and the /quiz endpoint
+DIFFICULTY_DESCRIPTIONS = {
+    "easy": "simple recall questions with straightforward answers",
+    "medium": "questions requiring understanding and application of concepts",
+    "hard": "complex questions requiring deep comprehension, analysis, and critical thinking"
+}
 
-@tool
+# Retrieval query used to gather quiz material
+QUIZ_QUERY = "important concepts definitions facts key information"
+
+
+@tool(response_format="content_and_artifact")
 def generate_quiz_tool(
     doc_id: str, 
     pages: Optional[str] = None,
     num_questions: int = 5, 
-    difficulty: str = "medium"
-) -> str:
+    difficulty: str = "medium",
+    source_offset: Annotated[int, InjectedToolArg] = 0
+) -> Tuple[str, List[dict]]:
     """
     Generate quiz questions from the document or specific pages.
     
     Args:
         doc_id: The document ID to create quiz from
-        pages: Optional comma-separated page numbers (e.g., "1,2,3")
+        pages: Optional pages: numbers, ranges or chapter names (e.g., "1,2,3", "10-25", "Chapter 3")
         num_questions: Number of questions to generate (1-10)
         difficulty: Difficulty level - "easy", "medium", or "hard"
+        source_offset: Sources already sent this turn (set by the tool node, hidden from the LLM)
     
     Returns:
         Retrieved content with instructions for the LLM to create quiz
@@ -170,16 +239,13 @@ def generate_quiz_tool(
             f"Generating {num_questions} {difficulty} quiz questions for doc {doc_id}, pages={pages}"
         )
         
-        # Parse page filter
-        page_filter = None
-        if pages:
-            page_filter = [int(p.strip()) for p in str(pages).split(",")]
+        # Page filter is parsed (ranges, chapter names) by the processor
+        page_filter = str(pages) if pages else None
 
         # Retrieve content for quiz generation
-        query = "important concepts definitions facts key information"
         results = processor.search_document(
             doc_id=doc_id, 
-            query=query, 
+            query=QUIZ_QUERY, 
             k=12,  # Get more chunks for diverse questions
             page_filter=page_filter
         )
@@ -187,19 +253,12 @@ def generate_quiz_tool(
         logger.info(f"Retrieved {len(results)} chunks for quiz generation")
         
         if not results:
-            return "No relevant information found in the specified pages."
+            return "No relevant information found in the specified pages.", []
 
         # Combine content from all results
         text_for_quiz = "\n\n".join([result["content"] for result in results])
 
-        # Difficulty descriptions
-        difficulty_descriptions = {
-            "easy": "simple recall questions with straightforward answers",
-            "medium": "questions requiring understanding and application of concepts",
-            "hard": "complex questions requiring deep comprehension, analysis, and critical thinking"
-        }
-        
-        diff_desc = difficulty_descriptions.get(difficulty, difficulty_descriptions["medium"])
+        diff_desc = DIFFICULTY_DESCRIPTIONS.get(difficulty, DIFFICULTY_DESCRIPTIONS["medium"])
 
         # Return content with instructions for LLM to create quiz
         return f"""Generate exactly {num_questions} multiple-choice quiz questions at {difficulty} difficulty level ({diff_desc}) based on the following content:
@@ -225,13 +284,13 @@ Explanation: [Brief explanation of why this is correct and why others are wrong]
 
 [Repeat for all {num_questions} questions]
 
-Ensure questions test different aspects of the material and are at the {difficulty} difficulty level."""
+Ensure questions test different aspects of the material and are at the {difficulty} difficulty level.""", compact_sources(results, start=source_offset + 1)
         
     except ValueError as e:
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", []
     except Exception as e:
         logger.error(f"Error in generate_quiz_tool: {str(e)}")
-        return f"Error generating quiz: {str(e)}"
+        return f"Error generating quiz: {str(e)}", []
 
 
 # ==========================================================
@@ -242,60 +301,56 @@ class AgentState(TypedDict):
     """State definition for the LangGraph agent"""
     messages: Annotated[list, add_messages]
     doc_id: str
-    task_type: Optional[str]  # For future use to track task types
+    task_type: Optional[str]  # Tool name for direct tool turns, None for agent-routed turns
 
 
 # Initialize tools and LLM
 tools = [search_document_tool, generate_summary_tool, generate_quiz_tool]
+TOOLS_BY_NAME = {t.name: t for t in tools}
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash-exp",
-    temperature=0.7,
-    max_retries=3  # Retry on API failures
-)
+# Provider is selected via LLM_PROVIDER (gemini by default, "standin" for tests)
+llm = create_chat_model()
+
+# Deadline-bounded retries, hedging and circuit breaker around the tool-calling model
+llm_with_tools = ResilientLLM(llm.bind_tools(tools))
+
+# Unbound model: final answers of direct tool turns (exactly one call) and
+# calls whose prefix and tools live in a provider context cache
+llm_without_tools = llm_with_tools.wrap(llm)
 
-llm_with_tools = llm.bind_tools(tools)
+# Prompt assembly with a stable, cacheable static prefix
+prompt_assembler = PromptAssembler(create_prompt_cache(model=LLM_MODEL))
 
 # Initialize memory for conversation persistence
 memory = MemorySaver()
 
 
-async def agent_node(state: AgentState):
+async def agent_node(state: AgentState, config: RunnableConfig):
     """
     Main agent node that analyzes user requests and decides which tools to use.
+
+    The LLM call is bounded by the turn deadline passed in config["configurable"].
+    Cached vs uncached input tokens are attached to the response metadata.
     """
     messages = state["messages"]
     doc_id = state.get("doc_id", "")
 
-    # System message with clear instructions
-    system_message = SystemMessage(content=f"""You are an intelligent study assistant helping users learn from their PDF documents.
-
-**Current Document ID:** {doc_id}
+    # Direct tool turns already ran the requested tool: only answer
+    answer_only = bool(state.get("task_type")) and isinstance(messages[-1], ToolMessage)
 
-**Your Capabilities:**
-1. **Search & Answer Questions**: Use search_document_tool to find specific information and answer questions
-2. **Summarize Content**: Use generate_summary_tool to create summaries (brief/medium/detailed)
-3. **Create Quizzes**: Use generate_quiz_tool to generate quiz questions (easy/medium/hard)
+    # Static instructions first (cacheable prefix), then document context and history
+    prompt = await prompt_assembler.assemble(doc_id, messages, tools=None if answer_only else tools)
 
-**Instructions:**
-- When user asks a question: Use search_document_tool first, then answer based on retrieved content
-- When user requests a summary: Use generate_summary_tool with appropriate detail_level
-- When user requests a quiz: Use generate_quiz_tool with specified num_questions and difficulty
-- If user specifies page numbers (e.g., "page 5", "pages 1-3"), pass them to the tool
-- Always cite page numbers in your responses when available
-- Be clear, educational, and helpful
-- If the tools return no results, inform the user politely
+    try:
+        deadline = config.get("configurable", {}).get("turn_deadline")
 
-**Examples:**
-User: "What is machine learning?" → Use search_document_tool(query="machine learning")
-User: "Summarize chapter 3" → Use generate_summary_tool(pages="3")
-User: "Create 5 hard quiz questions" → Use generate_quiz_tool(num_questions=5, difficulty="hard")
-""")
+        # With a provider cache handle, tools live in the cache: call the unbound model
+        model = llm_with_tools
+        if answer_only or prompt.cached_content:
+            model = llm_without_tools
 
-    full_messages = [system_message] + messages
-    
-    try:
-        response = await llm_with_tools.ainvoke(full_messages)
+        response = await model.ainvoke(prompt.messages, deadline=deadline, **prompt.call_kwargs)
+        response.response_metadata["prompt_cache"] = prompt_assembler.report(prompt, response)
         return {"messages": [response]}
     except Exception as e:
         logger.error(f"Error in agent_node: {str(e)}")
@@ -305,53 +360,133 @@ User: "Create 5 hard quiz questions" → Use generate_quiz_tool(num_questions=5,
         return {"messages": [error_message]}
 
 
-async def tool_execution_node(state: AgentState):
+def sources_sent_this_turn(messages: list) -> int:
+    """Number of sources already sent by tool calls since the last user message"""
+    count = 0
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage) and isinstance(message.artifact, list):
+            count += len(message.artifact)
+    return count
+
+
+async def tool_execution_node(state: AgentState, config: RunnableConfig):
     """
     Execute tools requested by the agent.
+
+    Sources found by a tool are dispatched as a "sources" custom event, so
+    the stream can send citations before the answer tokens arrive. Source
+    ids continue from the sources already sent this turn, so citations from
+    several tool calls never share an id.
     """
     last_message = state["messages"][-1]
     tool_calls = getattr(last_message, "tool_calls", [])
 
     tool_messages = []
+    source_offset = sources_sent_this_turn(state["messages"])
     
     for call in tool_calls:
         tool_name = call["name"]
-        tool_args = call.get("args", {})
+        tool_args = dict(call.get("args", {}))  # The offset must not leak into the stored tool call
         tool_id = call.get("id", str(uuid4()))
 
         # Ensure doc_id is always passed to tools
         if "doc_id" not in tool_args and state.get("doc_id"):
             tool_args["doc_id"] = state["doc_id"]
+        tool_args["source_offset"] = source_offset
 
         logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
 
-        # Execute the appropriate tool
+        # Execute the appropriate tool in the executor so cancellation of the
+        # turn (client disconnect) does not wait on blocking retrieval work.
+        # Invoking with the full tool call returns a ToolMessage that carries
+        # the tool's artifact (compact sources).
+        message = None
         try:
-            if tool_name == "search_document_tool":
-                result = search_document_tool.invoke(tool_args)
-            elif tool_name == "generate_summary_tool":
-                result = generate_summary_tool.invoke(tool_args)
-            elif tool_name == "generate_quiz_tool":
-                result = generate_quiz_tool.invoke(tool_args)
+            selected_tool = TOOLS_BY_NAME.get(tool_name)
+
+            if selected_tool is not None:
+                loop = asyncio.get_running_loop()
+                message = await loop.run_in_executor(
+                    tool_executor,
+                    selected_tool.invoke,
+                    {"name": tool_name, "args": tool_args, "id": tool_id, "type": "tool_call"}
+                )
             else:
                 result = f"Unknown tool: {tool_name}"
                 logger.warning(f"Unknown tool called: {tool_name}")
+        except asyncio.CancelledError:
+            logger.info(f"Tool {tool_name} cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error executing {tool_name}: {str(e)}")
             result = f"Error executing {tool_name}: {str(e)}"
 
-        # Create ToolMessage with result
-        tool_messages.append(
-            ToolMessage(
+        if message is None:
+            message = ToolMessage(
                 content=str(result),
                 tool_call_id=tool_id,
                 name=tool_name
             )
-        )
+        tool_messages.append(message)
+
+        sources = getattr(message, "artifact", None)
+        if sources:
+            source_offset += len(sources)
+            await adispatch_custom_event(
+                "sources",
+                {"tool": tool_name, "sources": sources},
+                config=config
+            )
 
     return {"messages": tool_messages}
 
 
+def route_entry(state: AgentState) -> Literal["agent", "tools"]:
+    """
+    Pick the entry node for a turn.
+
+    Direct tool turns arrive with a prepared tool call as the last message
+    and start at tool execution, skipping the routing LLM call.
+    """
+    last_message = state["messages"][-1]
+    if isinstance(last_message, AIMessage) and last_message.tool_calls:
+        logger.debug("Direct tool call, entering at tools")
+        return "tools"
+    return "agent"
+
+
+def build_direct_tool_call(tool_name: str, tool_args: Optional[dict], doc_id: str) -> AIMessage:
+    """
+    Build the tool call message for a turn whose tool is chosen by the client.
+
+    Args:
+        tool_name: One of the registered tool names
+        tool_args: Tool arguments (doc_id is filled in)
+        doc_id: Document the turn is about
+
+    Returns:
+        AIMessage carrying a single validated tool call
+
+    Raises:
+        ValueError: If the tool is unknown or the arguments are invalid
+    """
+    if tool_name not in TOOLS_BY_NAME:
+        raise ValueError(f"Unknown tool: {tool_name}. Available: {list(TOOLS_BY_NAME)}")
+
+    args = dict(tool_args or {})
+    args["doc_id"] = doc_id
+
+    # Validate early so bad arguments fail the request instead of the run
+    TOOLS_BY_NAME[tool_name].args_schema.model_validate(args)
+
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": tool_name, "args": args, "id": f"direct-{uuid4()}"}]
+    )
+
+
 def should_continue(state: AgentState) -> Literal["tools", "end"]:
     """
     Determine whether to continue to tools or end the graph.
@@ -367,6 +502,48 @@ def should_continue(state: AgentState) -> Literal["tools", "end"]:
     return "end"
 
 
+async def record_cancelled_turn(config: dict, partial_content: str = ""):
+    """
+    Close out a turn the client abandoned so the thread stays consistent.
+
+    Answers any tool calls left without a ToolMessage and appends the partial
+    assistant reply, written as the agent node so the next turn starts cleanly.
+
+    Args:
+        config: LangGraph config with the conversation thread_id
+        partial_content: Assistant text streamed before the cancellation
+    """
+    try:
+        snapshot = await graph.aget_state(config)
+        messages = (snapshot.values or {}).get("messages", [])
+        if not messages:
+            return
+
+        updates = []
+        last_message = messages[-1]
+        pending_calls = getattr(last_message, "tool_calls", None) or []
+        for call in pending_calls:
+            if call.get("id"):
+                updates.append(
+                    ToolMessage(
+                        content="Cancelled: the user disconnected before this tool finished.",
+                        tool_call_id=call["id"],
+                        name=call["name"]
+                    )
+                )
+
+        content = partial_content.strip()
+        updates.append(
+            AIMessage(content=f"{content}\n\n[Response interrupted]" if content else "[Response interrupted]")
+        )
+
+        await graph.aupdate_state(config, {"messages": updates}, as_node="agent")
+        logger.info(f"Recorded cancelled turn for thread {config['configurable']['thread_id']}")
+
+    except Exception as e:
+        logger.error(f"Error recording cancelled turn: {str(e)}")
+
+
 # ==========================================================
 # BUILD THE GRAPH
 # ==========================================================
@@ -377,8 +554,14 @@ graph_builder = StateGraph(AgentState)
 graph_builder.add_node("agent", agent_node)
 graph_builder.add_node("tools", tool_execution_node)
 
-# Set entry point
-graph_builder.set_entry_point("agent")
+# Set entry point (agent, or straight to tools for direct tool turns)
+graph_builder.set_conditional_entry_point(
+    route_entry,
+    {
+        "agent": "agent",
+        "tools": "tools"
+    }
+)
 
 # Add edges
 graph_builder.add_conditional_edges(
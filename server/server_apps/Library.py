@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import zipfile
+import tempfile
+from uuid import uuid4
+from contextlib import nullcontext
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .Document import processor, uploads_dir, db_base_dir, is_doc_id, mark_ingesting, EMBEDDING_MODEL
+from .Metrics import metrics
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# Most PDFs accepted by one bulk upload (files plus zip members)
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "100"))
+# Largest PDF accepted from a zip archive, in megabytes
+BULK_MAX_FILE_MB = int(os.getenv("BULK_MAX_FILE_MB", "200"))
+# PDFs of one bulk upload ingested at the same time
+BULK_INGEST_WORKERS = int(os.getenv("BULK_INGEST_WORKERS", "2"))
+# Finished bulk jobs kept for status queries
+BULK_JOBS_KEPT = 50
+
+ARCHIVE_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+
+# ==========================================================
+# BULK UPLOAD
+# ==========================================================
+
+
+def save_pdf(source, filename: str) -> dict:
+    """
+    Copy an uploaded PDF into the uploads directory under a new doc_id.
+
+    Args:
+        source: Binary file object positioned at the start of the PDF
+        filename: Original filename (kept as metadata)
+
+    Returns:
+        Dict with doc_id, filename and file_path
+    """
+    doc_id = str(uuid4())
+    file_path = os.path.join(uploads_dir, f"{doc_id}.pdf")
+    # Marked before the file exists: queued PDFs may wait a long time
+    mark_ingesting(doc_id)
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(source, f, 1024 * 1024)
+    with open(os.path.join(uploads_dir, f"{doc_id}.txt"), "w", encoding="utf-8") as f:
+        f.write(filename)
+    return {"doc_id": doc_id, "filename": filename, "file_path": file_path}
+
+
+def save_zip_pdfs(archive, limit: int) -> Tuple[List[dict], List[dict]]:
+    """
+    Save the PDFs inside a zip archive.
+
+    Directories, non-PDF members and macOS resource forks are ignored;
+    member paths are never used on disk, only their base names as metadata.
+
+    Args:
+        archive: Binary, seekable file object of the zip
+        limit: Most PDFs to take from the archive
+
+    Returns:
+        Tuple of (saved files, rejected members with a reason)
+
+    Raises:
+        ValueError: If the file is not a zip archive
+    """
+    saved, rejected = [], []
+    max_bytes = BULK_MAX_FILE_MB * 1024 * 1024
+
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ValueError("Not a valid zip archive")
+
+    with zf:
+        for info in zf.infolist():
+            name = info.filename
+            basename = os.path.basename(name.rstrip("/"))
+            if info.is_dir() or name.startswith("__MACOSX/") or basename.startswith("._"):
+                continue
+            if not basename.lower().endswith(".pdf"):
+                rejected.append({"filename": name, "error": "Not a PDF"})
+                continue
+            if info.file_size > max_bytes:
+                rejected.append({"filename": name, "error": f"Larger than {BULK_MAX_FILE_MB} MB"})
+                continue
+            if len(saved) >= limit:
+                rejected.append({"filename": name, "error": f"More than {BULK_MAX_FILES} files"})
+                continue
+            with zf.open(info) as member:
+                saved.append(save_pdf(member, basename))
+
+    return saved, rejected
+
+
+class BulkUploadJob:
+    """
+    Ingests a batch of saved PDFs with bounded concurrency.
+
+    Runs independently of the request that created it, so ingestion
+    continues if the client stops reading the progress stream; events are
+    replayed to any reader from the beginning. Each file holds its own
+    ingest slot from acquire_slot while it is processed, so a job never
+    runs more ingestions than the global cap allows.
+    """
+
+    def __init__(
+        self,
+        files: List[dict],
+        rejected: List[dict],
+        workers: int = BULK_INGEST_WORKERS,
+        acquire_slot: Optional[Callable[[], Awaitable]] = None
+    ):
+        self.job_id = str(uuid4())
+        self.files = files
+        self.rejected = rejected
+        self.workers = workers
+        self.acquire_slot = acquire_slot
+        self.results = []
+        self.events = []
+        self.done = False
+        self._changed = asyncio.Condition()
+
+    async def _emit(self, event: dict):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def run(self):
+        """Ingest every file; failed documents are removed again"""
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def ingest(entry: dict):
+            async with semaphore:
+                slot = await self.acquire_slot() if self.acquire_slot else nullcontext()
+                async with slot:
+                    await self._emit({"type": "file_start", "doc_id": entry["doc_id"], "filename": entry["filename"]})
+                    result = await run_in_threadpool(processor.process_pdf, entry["file_path"], entry["doc_id"])
+                if result.get("status") == "error":
+                    await run_in_threadpool(processor.delete_document, entry["doc_id"])
+                    metrics.inc("bulk_upload_files_failed")
+                else:
+                    metrics.inc("bulk_upload_files_ingested")
+
+                summary = {
+                    "doc_id": entry["doc_id"],
+                    "filename": entry["filename"],
+                    "status": result.get("status"),
+                    "chunks": result.get("chunks"),
+                    "error": result.get("error")
+                }
+                self.results.append(summary)
+                await self._emit({
+                    "type": "file_done",
+                    **summary,
+                    "completed": len(self.results),
+                    "total": len(self.files)
+                })
+
+        try:
+            await asyncio.gather(*(ingest(entry) for entry in self.files))
+        finally:
+            failed = sum(1 for r in self.results if r["status"] == "error")
+            seconds = time.perf_counter() - start
+            logger.info(
+                f"Bulk upload {self.job_id}: {len(self.results) - failed} ingested, "
+                f"{failed} failed in {seconds:.1f}s"
+            )
+            await self._emit({
+                "type": "summary",
+                "job_id": self.job_id,
+                "ingested": len(self.results) - failed,
+                "failed": failed,
+                "rejected": len(self.rejected),
+                "seconds": round(seconds, 2)
+            })
+            await self._emit({"type": "end"})
+            self.done = True
+
+    async def stream(self) -> AsyncIterator[dict]:
+        """Yield the job's events from the start until it ends"""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > sent)
+                pending = self.events[sent:]
+            for event in pending:
+                yield event
+            sent += len(pending)
+            if pending[-1]["type"] == "end":
+                return
+
+    def status(self) -> dict:
+        """Progress snapshot for polling clients"""
+        return {
+            "job_id": self.job_id,
+            "done": self.done,
+            "total": len(self.files),
+            "completed": len(self.results),
+            "results": self.results,
+            "rejected": self.rejected
+        }
+
+
+# Recent bulk jobs by job_id (oldest dropped first)
+bulk_jobs = {}
+
+
+def register_job(job: BulkUploadJob):
+    """Keep a job for status queries, dropping the oldest finished ones"""
+    bulk_jobs[job.job_id] = job
+    finished = [job_id for job_id, j in bulk_jobs.items() if j.done]
+    for job_id in finished[:max(0, len(bulk_jobs) - BULK_JOBS_KEPT)]:
+        del bulk_jobs[job_id]
+
+
+# ==========================================================
+# LIBRARY ARCHIVES
+# ==========================================================
+
+
+def _document_files(doc_id: str, include_pdfs: bool) -> List[Tuple[str, str]]:
+    """(path on disk, path in archive) pairs for one document"""
+    files = []
+    store_dir = os.path.join(db_base_dir, f"chroma_{doc_id}")
+    for root, _, names in os.walk(store_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((path, os.path.join("db", os.path.relpath(path, db_base_dir)).replace(os.sep, "/")))
+
+    metadata_path = os.path.join(uploads_dir, f"{doc_id}.txt")
+    if os.path.exists(metadata_path):
+        files.append((metadata_path, f"uploads/{doc_id}.txt"))
+    pdf_path = os.path.join(uploads_dir, f"{doc_id}.pdf")
+    if include_pdfs and os.path.exists(pdf_path):
+        files.append((pdf_path, f"uploads/{doc_id}.pdf"))
+    return files
+
+
+def document_filename(doc_id: str) -> Optional[str]:
+    """Original filename of a document, from its metadata file"""
+    metadata_path = os.path.join(uploads_dir, f"{doc_id}.txt")
+    try:
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def export_library(doc_ids: Optional[List[str]] = None, include_pdfs: bool = True) -> Tuple[str, dict]:
+    """
+    Write documents' vector stores (and PDFs) to a zip archive.
+
+    The archive can seed another node through import_library without
+    re-embedding. Vector stores are only written during ingestion, so
+    exporting while serving searches is safe.
+
+    Args:
+        doc_ids: Documents to export (default: every document with a store)
+        include_pdfs: Include the uploaded PDFs (needed for /documents
+            listing and outline fallback on the importing node)
+
+    Returns:
+        Tuple of (archive path - caller removes it, manifest)
+
+    Raises:
+        ValueError: If a requested document has no vector store
+    """
+    available = sorted(
+        name[len("chroma_"):] for name in os.listdir(db_base_dir)
+        if name.startswith("chroma_") and os.path.isdir(os.path.join(db_base_dir, name))
+    )
+    if doc_ids is None:
+        doc_ids = available
+    else:
+        missing = [doc_id for doc_id in doc_ids if doc_id not in available]
+        if missing:
+            raise ValueError(f"Documents not found: {', '.join(missing)}")
+
+    start = time.perf_counter()
+    fd, archive_path = tempfile.mkstemp(prefix="library-", suffix=".zip")
+    os.close(fd)
+
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "created_at": time.time(),
+        "documents": []
+    }
+    try:
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for doc_id in doc_ids:
+                files = _document_files(doc_id, include_pdfs)
+                for path, arcname in files:
+                    zf.write(path, arcname)
+                manifest["documents"].append({
+                    "doc_id": doc_id,
+                    "filename": document_filename(doc_id),
+                    "files": [arcname for _, arcname in files]
+                })
+            zf.writestr(MANIFEST_FILENAME, json.dumps(manifest, indent=2))
+    except Exception:
+        os.remove(archive_path)
+        raise
+
+    size = os.path.getsize(archive_path)
+    metrics.inc("library_exported_documents", len(doc_ids))
+    logger.info(
+        f"Exported {len(doc_ids)} documents ({size} bytes) in {time.perf_counter() - start:.1f}s"
+    )
+    return archive_path, manifest
+
+
+def import_library(archive, overwrite: bool = False) -> dict:
+    """
+    Restore documents from an export_library archive.
+
+    Each document is extracted to a staging directory and moved into place
+    only when complete, so a failed import never leaves half a store.
+
+    Args:
+        archive: Binary, seekable file object of the zip
+        overwrite: Replace documents that already exist (default: skip them)
+
+    Returns:
+        Dict with "imported" and "skipped" doc_id lists
+
+    Raises:
+        ValueError: If the archive is invalid or was built with another
+            embedding model
+    """
+    imported, skipped = [], []
+
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ValueError("Not a valid zip archive")
+
+    with zf:
+        try:
+            manifest = json.loads(zf.read(MANIFEST_FILENAME))
+        except KeyError:
+            raise ValueError(f"Not a library archive (no {MANIFEST_FILENAME})")
+
+        if manifest.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported archive version: {manifest.get('version')}")
+        if manifest.get("embedding_model") != EMBEDDING_MODEL:
+            raise ValueError(
+                f"Archive was embedded with {manifest.get('embedding_model')}, "
+                f"this server uses {EMBEDDING_MODEL}"
+            )
+
+        members = set(zf.namelist())
+        for document in manifest.get("documents", []):
+            doc_id = document.get("doc_id", "")
+            if not is_doc_id(doc_id):
+                raise ValueError(f"Invalid doc_id in archive: {doc_id!r}")
+
+            store_prefix = f"db/chroma_{doc_id}/"
+            allowed = {f"uploads/{doc_id}.pdf", f"uploads/{doc_id}.txt"}
+            files = document.get("files", [])
+            for arcname in files:
+                if arcname not in members:
+                    raise ValueError(f"Archive is missing {arcname}")
+                if arcname not in allowed and not (arcname.startswith(store_prefix) and ".." not in arcname.split("/")):
+                    raise ValueError(f"Unexpected path in archive: {arcname}")
+            if not any(arcname.startswith(store_prefix) for arcname in files):
+                raise ValueError(f"Archive has no vector store for {doc_id}")
+
+            store_dir = os.path.join(db_base_dir, f"chroma_{doc_id}")
+            if os.path.exists(store_dir):
+                if not overwrite:
+                    skipped.append(doc_id)
+                    continue
+                processor.delete_document(doc_id)
+
+            staging = os.path.join(db_base_dir, f".import_{uuid4().hex}")
+            try:
+                for arcname in files:
+                    target = os.path.join(staging, *arcname.split("/"))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with zf.open(arcname) as source, open(target, "wb") as f:
+                        shutil.copyfileobj(source, f, 1024 * 1024)
+
+                # Uploads first: a store without its PDF is hidden from /documents
+                staged_uploads = os.path.join(staging, "uploads")
+                if os.path.isdir(staged_uploads):
+                    for name in os.listdir(staged_uploads):
+                        shutil.move(os.path.join(staged_uploads, name), os.path.join(uploads_dir, name))
+                os.replace(os.path.join(staging, "db", f"chroma_{doc_id}"), store_dir)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+            imported.append(doc_id)
+
+    metrics.inc("library_imported_documents", len(imported))
+    logger.info(f"Imported {len(imported)} documents, skipped {len(skipped)} existing")
+    return {"imported": imported, "skipped": skipped}
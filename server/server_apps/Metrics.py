@@ -0,0 +1,47 @@
+import threading
+from collections import defaultdict
+from typing import Union
+
+# ==========================================================
+# IN-PROCESS METRICS
+# ==========================================================
+
+Number = Union[int, float]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and gauges exposed via GET /metrics"""
+
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: Number = 1):
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def set(self, name: str, value):
+        """Set a gauge to an absolute value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name: str, default: Number = 0):
+        """Read a counter or gauge"""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+
+    def snapshot(self) -> dict:
+        """Return a copy of all counters and gauges"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges)
+            }
+
+
+# Shared registry for the whole process
+metrics = MetricsRegistry()
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+from .Metrics import metrics
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# OCR needs the Tesseract engine (tesseract-ocr + language data) on the host;
+# without it scanned pages are skipped and reported, never a hard failure
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Pages with fewer extractable characters than this are treated as scans
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "20"))
+# Upper bound on OCR time per document; unfinished pages are reported as failed
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "600"))
+
+_tesseract_available = None
+_pool = None
+_pool_lock = threading.Lock()
+
+# ==========================================================
+# DETECTION
+# ==========================================================
+
+
+def tesseract_available() -> bool:
+    """
+    Whether PyMuPDF can find Tesseract language data (checked once).
+
+    fitz.get_tessdata() returns TESSDATA_PREFIX without checking it, so the
+    directory itself must exist.
+    """
+    global _tesseract_available
+    if _tesseract_available is None:
+        try:
+            tessdata = fitz.get_tessdata()
+            _tesseract_available = bool(tessdata) and os.path.isdir(tessdata)
+        except AttributeError:
+            tessdata = os.getenv("TESSDATA_PREFIX")
+            if tessdata:
+                _tesseract_available = os.path.isdir(tessdata)
+            else:
+                _tesseract_available = shutil.which("tesseract") is not None
+        except Exception:
+            _tesseract_available = False
+        if not _tesseract_available:
+            logger.warning("Tesseract not found; scanned pages will not be OCR'd")
+    return _tesseract_available
+
+
+def find_textless_pages(pdf: fitz.Document, min_chars: int = OCR_MIN_CHARS) -> List[int]:
+    """Pages with (almost) no embedded text but at least one image, i.e. scans"""
+    pages = []
+    for page in pdf:
+        if len(page.get_text("text").strip()) < min_chars and page.get_images(full=False):
+            pages.append(page.number)
+    return pages
+
+
+def page_fingerprint(pdf: fitz.Document, page_number: int, dpi: int, language: str) -> str:
+    """
+    Content hash of a page for the OCR cache.
+
+    Covers the page's drawing commands and the raw bytes of every image it
+    shows, plus the OCR settings, so the same scan re-uploaded (or inside a
+    different PDF) hits the cache.
+    """
+    page = pdf[page_number]
+    digest = hashlib.sha256()
+    digest.update(f"{dpi}:{language}:".encode("utf-8"))
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(pdf.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+
+# ==========================================================
+# OCR WORKERS
+# ==========================================================
+
+
+def _ocr_page(file_path: str, page_number: int, dpi: int, language: str) -> Tuple[int, List[dict], float]:
+    """
+    OCR one page in a worker process.
+
+    Returns:
+        Tuple of (page number, text blocks in PyMuPDF "dict" layout, seconds)
+    """
+    start = time.perf_counter()
+    with fitz.open(file_path) as pdf:
+        page = pdf[page_number]
+        textpage = page.get_textpage_ocr(dpi=dpi, language=language, full=True)
+        layout = page.get_text("dict", textpage=textpage)
+
+    # Keep only what layout chunking needs so results are small to pickle and cache
+    blocks = []
+    for block in layout["blocks"]:
+        if block.get("type", 0) != 0:
+            continue
+        blocks.append({
+            "type": 0,
+            "lines": [
+                {"spans": [
+                    {"text": span["text"], "size": span["size"], "flags": span["flags"]}
+                    for span in line["spans"]
+                ]}
+                for line in block.get("lines", [])
+            ]
+        })
+    return page_number, blocks, time.perf_counter() - start
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared OCR process pool (spawned, so workers never inherit server threads)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool():
+    """Stop OCR workers (call on application shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def terminate_pool(pool: ProcessPoolExecutor):
+    """
+    Kill the workers of a pool and drop it so the next OCR starts a fresh one.
+
+    Cancelling a future does not stop a page Tesseract is already working
+    on, so after a timeout the workers are terminated to free the CPUs.
+    Pages of other documents running in the same pool fail with
+    BrokenProcessPool and are reported as failed by their callers.
+
+    Args:
+        pool: The pool the timed-out pages were submitted to
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+    # ProcessPoolExecutor has no public terminate; its worker map is stable across 3.8-3.13
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        try:
+            process.terminate()
+        except Exception as e:
+            logger.warning(f"Could not terminate OCR worker {process.pid}: {str(e)}")
+    metrics.inc("ocr_pool_terminated")
+
+
+def blocks_to_text(blocks: List[dict]) -> str:
+    """Plain text of OCR blocks (paragraphs separated by blank lines)"""
+    paragraphs = []
+    for block in blocks:
+        lines = ["".join(span["text"] for span in line["spans"]).strip() for line in block["lines"]]
+        text = "\n".join(line for line in lines if line)
+        if text:
+            paragraphs.append(text)
+    return "\n\n".join(paragraphs)
+
+
+def _write_cache(cache_path: str, blocks: List[dict]):
+    """Write a cache entry atomically so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{os.path.basename(cache_path)}.",
+        suffix=".tmp",
+        dir=os.path.dirname(cache_path)
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(blocks, f)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# ==========================================================
+# OCR PIPELINE
+# ==========================================================
+
+
+def ocr_textless_pages(
+    file_path: str,
+    cache_dir: str,
+    dpi: int = OCR_DPI,
+    language: str = OCR_LANGUAGE,
+    timeout: float = OCR_TIMEOUT_SECONDS
+) -> Tuple[Dict[int, List[dict]], dict]:
+    """
+    OCR the scanned pages of a PDF in parallel, reusing cached results.
+
+    Args:
+        file_path: Path to the PDF file
+        cache_dir: Directory holding OCR results keyed by page fingerprint
+        dpi: Render resolution for OCR
+        language: Tesseract language(s), e.g. "eng" or "eng+deu"
+        timeout: Maximum seconds to wait for all uncached pages
+
+    Returns:
+        Tuple of (page number -> text blocks, report dict with pages,
+        cached, failed, skipped, page_seconds and seconds)
+    """
+    start = time.perf_counter()
+    report = {"pages": [], "cached": 0, "failed": [], "skipped": None, "page_seconds": {}, "seconds": 0.0}
+    results = {}
+
+    with fitz.open(file_path) as pdf:
+        pages = find_textless_pages(pdf)
+        fingerprints = {page: page_fingerprint(pdf, page, dpi, language) for page in pages}
+
+    report["pages"] = pages
+    if not pages:
+        return results, report
+
+    # Cached pages are free
+    os.makedirs(cache_dir, exist_ok=True)
+    pending = []
+    for page in pages:
+        cache_path = os.path.join(cache_dir, f"{fingerprints[page]}.json")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    results[page] = json.load(f)
+                # Refresh mtime so storage GC ages entries by last use
+                os.utime(cache_path)
+                report["cached"] += 1
+                continue
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable OCR cache entry {cache_path}: {str(e)}")
+        pending.append(page)
+
+    if pending and not tesseract_available():
+        report["skipped"] = "tesseract not available"
+        report["failed"] = pending
+        report["seconds"] = time.perf_counter() - start
+        return results, report
+
+    if pending:
+        logger.info(f"OCR of {len(pending)} scanned pages with {OCR_WORKERS} workers ({report['cached']} cached)")
+        pool = _get_pool()
+        futures = {pool.submit(_ocr_page, file_path, page, dpi, language): page for page in pending}
+        done, not_done = wait(futures, timeout=timeout)
+
+        for future in not_done:
+            future.cancel()
+            report["failed"].append(futures[future])
+        if not_done:
+            logger.warning(f"OCR timed out after {timeout}s with {len(not_done)} pages unfinished")
+            # Running pages ignore cancel(): kill the workers instead of letting them finish
+            terminate_pool(pool)
+
+        for future in done:
+            page = futures[future]
+            try:
+                _, blocks, seconds = future.result()
+            except Exception as e:
+                logger.error(f"OCR failed for page {page} of {file_path}: {str(e)}")
+                report["failed"].append(page)
+                if isinstance(e, BrokenProcessPool):
+                    terminate_pool(pool)  # A worker died; start a fresh pool next time
+                continue
+
+            results[page] = blocks
+            report["page_seconds"][page] = seconds
+            metrics.inc("ocr_pages")
+            metrics.inc("ocr_seconds", seconds)
+            try:
+                _write_cache(os.path.join(cache_dir, f"{fingerprints[page]}.json"), blocks)
+            except Exception as e:
+                logger.warning(f"Could not cache OCR result for page {page}: {str(e)}")
+
+    report["failed"].sort()
+    report["seconds"] = time.perf_counter() - start
+    metrics.inc("ocr_cache_hits", report["cached"])
+    return results, report
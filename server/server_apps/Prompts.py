@@ -0,0 +1,362 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from starlette.concurrency import run_in_threadpool
+
+from .Metrics import metrics
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# "implicit" (stable prefix, provider-reported cache hits), "local" (stand-in
+# for tests), "gemini" (explicit CachedContent) or "none"
+PROMPT_CACHE_BACKEND = os.getenv("PROMPT_CACHE_BACKEND", "implicit")
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+
+# ==========================================================
+# PROMPTS
+# ==========================================================
+
+# Static instructions: identical for every turn and document so providers can
+# reuse the prefix. Anything per-document goes after it (see dynamic_context).
+STATIC_SYSTEM_PROMPT = """You are an intelligent study assistant helping users learn from their PDF documents.
+
+**Your Capabilities:**
+1. **Search & Answer Questions**: Use search_document_tool to find specific information and answer questions
+2. **Summarize Content**: Use generate_summary_tool to create summaries (brief/medium/detailed)
+3. **Create Quizzes**: Use generate_quiz_tool to generate quiz questions (easy/medium/hard)
+
+**Instructions:**
+- When user asks a question: Use search_document_tool first, then answer based on retrieved content
+- When user requests a summary: Use generate_summary_tool with appropriate detail_level
+- When user requests a quiz: Use generate_quiz_tool with specified num_questions and difficulty
+- If user specifies pages or chapters (e.g., "page 5", "pages 1-50", "chapter 3"), pass them to the tool as written ("5", "1-50", "Chapter 3"); never expand ranges into lists
+- Always cite page numbers in your responses when available
+- Be clear, educational, and helpful
+- If the tools return no results, inform the user politely
+
+**Examples:**
+User: "What is machine learning?" → Use search_document_tool(query="machine learning")
+User: "Summarize chapter 3" → Use generate_summary_tool(pages="Chapter 3")
+User: "Create 5 hard quiz questions" → Use generate_quiz_tool(num_questions=5, difficulty="hard")
+"""
+
+
+def dynamic_context(doc_id: str) -> str:
+    """Per-document part of the system prompt (kept after the static prefix)"""
+    return f"**Current Document ID:** {doc_id}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+# ==========================================================
+# CACHE BACKENDS
+# ==========================================================
+
+
+class PromptCacheBackend:
+    """
+    Base backend: relies on the provider's implicit prefix caching.
+
+    Nothing is created explicitly; cached input tokens are whatever the
+    provider reports in usage_metadata (input_token_details.cache_read).
+    """
+
+    name = "implicit"
+
+    async def prepare(self, prefix_key: str, prefix: str, tools: list) -> Optional[str]:
+        """Return a provider cache handle for the prefix, or None to send it inline"""
+        return None
+
+    def cached_tokens(self, prefix_key: str, prefix: str, usage: dict) -> int:
+        """Cached input tokens for a call"""
+        details = usage.get("input_token_details") or {}
+        return int(details.get("cache_read", 0) or 0)
+
+
+class NoPromptCache(PromptCacheBackend):
+    """Disable caching and cache accounting entirely"""
+
+    name = "none"
+
+    def cached_tokens(self, prefix_key: str, prefix: str, usage: dict) -> int:
+        return 0
+
+
+class LocalPromptCache(PromptCacheBackend):
+    """
+    Local stand-in for provider prefix caching (tests, stand-in model).
+
+    A prefix counts as cached if the same prefix was sent within the TTL;
+    cached tokens are estimated from the prefix length.
+    """
+
+    name = "local"
+
+    def __init__(self, ttl: int = PROMPT_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.seen = {}  # prefix_key -> last use (monotonic)
+
+    def cached_tokens(self, prefix_key: str, prefix: str, usage: dict) -> int:
+        now = time.monotonic()
+        last = self.seen.get(prefix_key)
+        self.seen[prefix_key] = now
+        if last is not None and now - last < self.ttl:
+            return estimate_tokens(prefix)
+        return 0
+
+
+class GeminiPromptCache(PromptCacheBackend):
+    """
+    Explicit Gemini context caching (CachedContent) of the static prefix and tools.
+
+    Gemini only accepts caches above a minimum size; when creation fails the
+    prefix is remembered as uncacheable and sent inline instead.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model: str, ttl: int = PROMPT_CACHE_TTL_SECONDS):
+        self.model = model if model.startswith("models/") else f"models/{model}"
+        self.ttl = ttl
+        self.handles = {}  # prefix_key -> (cache name, expires_at)
+        self.uncacheable = set()
+        self._create_lock = asyncio.Lock()
+
+    async def prepare(self, prefix_key: str, prefix: str, tools: list) -> Optional[str]:
+        if prefix_key in self.uncacheable:
+            return None
+
+        handle = self._valid_handle(prefix_key)
+        if handle:
+            return handle
+
+        # One creation per prefix; concurrent turns wait for it instead of racing
+        async with self._create_lock:
+            if prefix_key in self.uncacheable:
+                return None
+            handle = self._valid_handle(prefix_key)
+            if handle:
+                return handle
+
+            try:
+                # CachedContent.create is a blocking network call: keep it off the event loop
+                name = await run_in_threadpool(self._create, prefix, tools)
+                self.handles[prefix_key] = (name, time.monotonic() + self.ttl)
+                metrics.inc("prompt_cache_created")
+                logger.info(f"Created Gemini context cache {name}")
+                return name
+
+            except Exception as e:
+                self.uncacheable.add(prefix_key)
+                metrics.inc("prompt_cache_create_failed")
+                logger.warning(f"Gemini context cache unavailable, sending prompt inline: {str(e)}")
+                return None
+
+    def _valid_handle(self, prefix_key: str) -> Optional[str]:
+        """Cache name for the prefix if it is not about to expire"""
+        handle = self.handles.get(prefix_key)
+        if handle and handle[1] > time.monotonic() + 60:
+            return handle[0]
+        return None
+
+    def _create(self, prefix: str, tools: list) -> str:
+        """Create the CachedContent (blocking) and return its name"""
+        from google.generativeai import caching
+
+        cache = caching.CachedContent.create(
+            model=self.model,
+            system_instruction=prefix,
+            tools=[{"function_declarations": function_declarations(tools)}] if tools else None,
+            ttl=timedelta(seconds=self.ttl)
+        )
+        return cache.name
+
+
+# ==========================================================
+# TOOL DECLARATIONS
+# ==========================================================
+
+# JSON schema keys Gemini accepts in function parameters (an OpenAPI subset)
+GEMINI_SCHEMA_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items"}
+
+
+def _gemini_schema(schema: dict) -> dict:
+    """
+    Reduce a JSON schema to the subset Gemini function declarations accept.
+
+    Optional[X] (anyOf with null) becomes X with nullable set; titles,
+    defaults and other unsupported keys are dropped.
+    """
+    schema = dict(schema)
+    variants = schema.pop("anyOf", None)
+    if variants:
+        non_null = [v for v in variants if v.get("type") != "null"]
+        merged = dict(non_null[0]) if non_null else {"type": "string"}
+        merged.update({k: v for k, v in schema.items() if k != "default"})
+        if len(non_null) < len(variants):
+            merged["nullable"] = True
+        schema = merged
+
+    result = {}
+    for key, value in schema.items():
+        if key not in GEMINI_SCHEMA_KEYS:
+            continue
+        if key == "properties":
+            value = {name: _gemini_schema(prop) for name, prop in value.items()}
+        elif key == "items":
+            value = _gemini_schema(value)
+        elif key == "type" and isinstance(value, str):
+            value = value.upper()
+        result[key] = value
+    return result
+
+
+def function_declarations(tools: list) -> List[dict]:
+    """
+    Gemini function declarations for LangChain tools.
+
+    Built from the public OpenAI tool schema rather than langchain_google_genai
+    internals, so the cache declares the same tools the bound model sends.
+    """
+    declarations = []
+    for tool in tools:
+        function = convert_to_openai_tool(tool)["function"]
+        declaration = {"name": function["name"], "description": function.get("description", "")}
+        parameters = function.get("parameters") or {}
+        if parameters.get("properties"):
+            declaration["parameters"] = _gemini_schema(parameters)
+        declarations.append(declaration)
+    return declarations
+
+
+def create_prompt_cache(backend: str = PROMPT_CACHE_BACKEND, model: str = "") -> PromptCacheBackend:
+    """Build the configured prompt cache backend"""
+    if backend == "local":
+        return LocalPromptCache()
+    if backend == "gemini":
+        return GeminiPromptCache(model)
+    if backend == "none":
+        return NoPromptCache()
+    return PromptCacheBackend()
+
+
+# ==========================================================
+# PROMPT ASSEMBLY
+# ==========================================================
+
+
+@dataclass
+class AssembledPrompt:
+    """Messages for one LLM call plus what is needed to account for caching"""
+    messages: List[BaseMessage]
+    prefix_key: str
+    prefix: str
+    cached_content: Optional[str] = None  # Provider cache handle, if used
+    call_kwargs: dict = field(default_factory=dict)
+
+
+class PromptAssembler:
+    """
+    Builds agent prompts as a stable cacheable prefix plus per-turn content.
+
+    The static system prompt always comes first and is byte-identical across
+    turns and documents; the document context follows it. System messages
+    are built once per document and reused (LRU).
+    """
+
+    def __init__(self, backend: PromptCacheBackend, static_prompt: str = STATIC_SYSTEM_PROMPT, max_cached: int = 256):
+        self.backend = backend
+        self.static_prompt = static_prompt
+        self.prefix_key = hashlib.sha256(static_prompt.encode("utf-8")).hexdigest()[:16]
+        self.max_cached = max_cached
+        self._system_messages = OrderedDict()  # doc_id -> SystemMessage
+
+    def system_message(self, doc_id: str) -> SystemMessage:
+        """Static prefix + document context, reused across turns"""
+        if doc_id in self._system_messages:
+            self._system_messages.move_to_end(doc_id)
+            return self._system_messages[doc_id]
+
+        message = SystemMessage(content=f"{self.static_prompt}\n{dynamic_context(doc_id)}")
+        self._system_messages[doc_id] = message
+        if len(self._system_messages) > self.max_cached:
+            self._system_messages.popitem(last=False)
+        return message
+
+    async def assemble(self, doc_id: str, history: List[BaseMessage], tools: Optional[list] = None) -> AssembledPrompt:
+        """
+        Assemble the messages for one call.
+
+        Args:
+            doc_id: Current document
+            history: Conversation messages
+            tools: Tools bound to the call (part of the cacheable prefix)
+
+        Returns:
+            AssembledPrompt; when cached_content is set, call the model without
+            bound tools and pass call_kwargs (the prefix lives in the provider cache)
+        """
+        # Provider caches hold prefix + tools, so only tool-calling prompts use them
+        handle = await self.backend.prepare(self.prefix_key, self.static_prompt, tools) if tools else None
+        if handle is None:
+            return AssembledPrompt(
+                messages=[self.system_message(doc_id)] + list(history),
+                prefix_key=self.prefix_key,
+                prefix=self.static_prompt
+            )
+
+        # Static prefix and tools are in the provider cache; send only the dynamic part
+        return AssembledPrompt(
+            messages=[HumanMessage(content=dynamic_context(doc_id))] + list(history),
+            prefix_key=self.prefix_key,
+            prefix=self.static_prompt,
+            cached_content=handle,
+            call_kwargs={"cached_content": handle}
+        )
+
+    def report(self, prompt: AssembledPrompt, response) -> dict:
+        """
+        Record cached vs uncached input tokens for a call.
+
+        Returns:
+            Dict with input_tokens, cached_tokens, uncached_tokens and backend
+        """
+        usage = getattr(response, "usage_metadata", None) or {}
+        input_tokens = int(usage.get("input_tokens", 0) or 0)
+        if not input_tokens:
+            input_tokens = sum(estimate_tokens(str(m.content)) for m in prompt.messages)
+            if prompt.cached_content:
+                input_tokens += estimate_tokens(prompt.prefix)
+
+        cached = self.backend.cached_tokens(prompt.prefix_key, prompt.prefix, usage)
+        if prompt.cached_content and not cached:
+            cached = estimate_tokens(prompt.prefix)
+        cached = min(cached, input_tokens)
+
+        metrics.inc("prompt_input_tokens", input_tokens)
+        metrics.inc("prompt_cached_tokens", cached)
+
+        return {
+            "input_tokens": input_tokens,
+            "cached_tokens": cached,
+            "uncached_tokens": input_tokens - cached,
+            "backend": self.backend.name
+        }
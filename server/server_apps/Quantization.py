@@ -0,0 +1,200 @@
+import os
+import json
+import logging
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# "float32" keeps full vectors in Chroma (original layout). "float16" and
+# "int8" switch new stores to compact mode: Chroma only indexes a short
+# prefix of each vector and full vectors are kept quantized for reranking.
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+# Dimensions indexed by Chroma in compact mode (prefix truncation, re-normalized)
+EMBEDDING_INDEX_DIMS = int(os.getenv("EMBEDDING_INDEX_DIMS", "128"))
+# Candidates fetched from the coarse index per result before the exact rerank
+RERANK_OVERSAMPLE = int(os.getenv("RERANK_OVERSAMPLE", "4"))
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+# Files written next to a compact Chroma store
+COMPACT_META_FILENAME = "compact.json"
+COMPACT_CODES_FILENAME = "vectors.npy"
+COMPACT_SCALES_FILENAME = "scales.npy"
+# Written before the truncated index is built, removed once compact.json exists
+COMPACT_PENDING_FILENAME = "compact.pending"
+
+# ==========================================================
+# VECTOR CODECS
+# ==========================================================
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """
+    Keep the first dims components and re-normalize (Matryoshka-style).
+
+    Models trained with Matryoshka losses keep most quality under
+    truncation; others (e.g. all-mpnet-base-v2) lose more, so measure
+    recall with benchmarks/retrieval_bench.py before lowering dims.
+    """
+    return normalize(np.asarray(vectors, dtype=np.float32)[..., :dims])
+
+
+def quantize(vectors: np.ndarray, storage: str):
+    """
+    Encode normalized float32 vectors.
+
+    Returns:
+        Tuple of (codes, scales); scales is None except for int8, which
+        uses symmetric per-vector scaling (value = code * scale)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if storage == "float16":
+        return vectors.astype(np.float16), None
+    if storage == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors, None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Decode vectors back to float32"""
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors
+
+
+# ==========================================================
+# COMPACT VECTOR FILE
+# ==========================================================
+
+
+class CompactVectors:
+    """
+    Quantized full-dimension vectors of one document, for exact reranking.
+
+    Rows are addressed by Chroma id. Codes are memory-mapped, so only the
+    rows touched by a rerank are paged in.
+    """
+
+    def __init__(self, ids: List[str], codes: np.ndarray, scales: Optional[np.ndarray], meta: dict):
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self.codes = codes
+        self.scales = scales
+        self.meta = meta
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, COMPACT_META_FILENAME))
+
+    @staticmethod
+    def begin(directory: str):
+        """
+        Mark a store as compact before its truncated index is written.
+
+        A crash before save() leaves the marker without compact.json, so the
+        half-built store is recognized as incomplete instead of being opened
+        as a full-dimension store.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, COMPACT_PENDING_FILENAME), "w", encoding="utf-8") as f:
+            f.write("")
+
+    @staticmethod
+    def pending(directory: str) -> bool:
+        """Whether a compact build was started but never completed"""
+        return (
+            os.path.exists(os.path.join(directory, COMPACT_PENDING_FILENAME))
+            and not CompactVectors.exists(directory)
+        )
+
+    @classmethod
+    def save(cls, directory: str, ids: List[str], vectors: np.ndarray, storage: str, index_dims: int) -> "CompactVectors":
+        """
+        Quantize and write full vectors next to a Chroma store.
+
+        Args:
+            directory: Chroma persist directory
+            ids: Chroma ids in the same order as vectors
+            vectors: Normalized full-dimension embeddings
+            storage: "float16" or "int8"
+            index_dims: Dimensions indexed by Chroma
+
+        Returns:
+            Loaded CompactVectors
+        """
+        codes, scales = quantize(vectors, storage)
+        np.save(os.path.join(directory, COMPACT_CODES_FILENAME), codes)
+        if scales is not None:
+            np.save(os.path.join(directory, COMPACT_SCALES_FILENAME), scales)
+
+        meta = {
+            "storage": storage,
+            "dims": int(codes.shape[1]),
+            "index_dims": index_dims,
+            "ids": list(ids)
+        }
+        # Written last: its presence marks the store as compact and complete
+        with open(os.path.join(directory, COMPACT_META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        pending_path = os.path.join(directory, COMPACT_PENDING_FILENAME)
+        if os.path.exists(pending_path):
+            os.remove(pending_path)
+
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: str) -> "CompactVectors":
+        """Open the compact vectors of a store (memory-mapped)"""
+        with open(os.path.join(directory, COMPACT_META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        codes = np.load(os.path.join(directory, COMPACT_CODES_FILENAME), mmap_mode="r")
+        scales = None
+        scales_path = os.path.join(directory, COMPACT_SCALES_FILENAME)
+        if os.path.exists(scales_path):
+            scales = np.load(scales_path)
+
+        return cls(meta.pop("ids"), codes, scales, meta)
+
+    def get(self, ids: List[str]) -> np.ndarray:
+        """Dequantized float32 vectors for the given ids (unknown ids are skipped)"""
+        rows = [self.rows[chunk_id] for chunk_id in ids if chunk_id in self.rows]
+        scales = self.scales[rows] if self.scales is not None else None
+        return dequantize(self.codes[rows], scales)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the stored codes and scales"""
+        return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+
+class TruncatedEmbeddings(Embeddings):
+    """Embeddings wrapper producing the truncated vectors a compact store indexes"""
+
+    def __init__(self, base: Embeddings, dims: int):
+        self.base = base
+        self.dims = dims
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return truncate(np.asarray(self.base.embed_documents(texts)), self.dims).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return truncate(np.asarray(self.base.embed_query(text)), self.dims).tolist()
@@ -0,0 +1,260 @@
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from .LangGraph_tool import (
+    processor,
+    llm,
+    llm_with_tools,
+    tool_executor,
+    DIFFICULTY_DESCRIPTIONS,
+    QUIZ_QUERY,
+    page_label,
+)
+from .LLM_client import turn_deadline
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of chunks retrieved as quiz material (same as generate_quiz_tool)
+QUIZ_CONTEXT_CHUNKS = 12
+
+# ==========================================================
+# QUIZ SCHEMA
+# ==========================================================
+
+
+class QuizQuestion(BaseModel):
+    """One multiple-choice question (serialized in the shape the client uses)"""
+    question: str = Field(description="Clear, specific question about the content")
+    options: List[str] = Field(description="Exactly four answer options, without letter prefixes")
+    correct_answer: int = Field(
+        description="Index (0-3) of the correct option",
+        serialization_alias="correctAnswer"
+    )
+    explanation: str = Field(default="", description="Why the correct option is right")
+
+    @field_validator("options")
+    @classmethod
+    def check_options(cls, options: List[str]) -> List[str]:
+        options = [option.strip() for option in options if option and option.strip()]
+        if len(options) != 4:
+            raise ValueError(f"expected 4 options, got {len(options)}")
+        return options
+
+    @field_validator("correct_answer")
+    @classmethod
+    def check_correct_answer(cls, correct_answer: int) -> int:
+        if not 0 <= correct_answer <= 3:
+            raise ValueError("correct_answer must be between 0 and 3")
+        return correct_answer
+
+
+class QuizOutput(BaseModel):
+    """Structured output returned by the LLM"""
+    questions: List[QuizQuestion]
+
+
+class QuizGenerationError(Exception):
+    """Raised when the LLM output cannot be validated into a quiz"""
+
+
+# ==========================================================
+# QUIZ GENERATION
+# ==========================================================
+
+
+async def retrieve_quiz_content(doc_id: str, pages: Optional[str]) -> str:
+    """
+    Retrieve quiz material once, off the event loop.
+
+    Raises:
+        ValueError: If the document does not exist or nothing was found
+    """
+    page_filter = str(pages) if pages else None
+
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(
+        tool_executor,
+        lambda: processor.search_document(
+            doc_id=doc_id,
+            query=QUIZ_QUERY,
+            k=QUIZ_CONTEXT_CHUNKS,
+            page_filter=page_filter
+        )
+    )
+
+    if not results:
+        raise ValueError("No relevant information found in the specified pages.")
+
+    return "\n\n".join(
+        f"[{page_label(result)}]\n{result['content']}" for result in results
+    )
+
+
+def _quiz_messages(content: str, num_questions: int, difficulty: str, json_lines: bool) -> list:
+    """Build the single prompt used for quiz generation"""
+    diff_desc = DIFFICULTY_DESCRIPTIONS.get(difficulty, DIFFICULTY_DESCRIPTIONS["medium"])
+
+    if json_lines:
+        output_format = (
+            "Output exactly one JSON object per line and nothing else (no markdown, no list). "
+            'Each line: {"question": str, "options": [4 strings], '
+            '"correct_answer": 0-3 index of the correct option, "explanation": str}'
+        )
+    else:
+        output_format = "Return the questions using the provided schema."
+
+    return [
+        SystemMessage(content="You write accurate multiple-choice quizzes from study material."),
+        HumanMessage(content=f"""Generate exactly {num_questions} multiple-choice questions at {difficulty} difficulty level ({diff_desc}) based on the following content:
+
+CONTENT FOR QUIZ:
+{content}
+
+Each question must have exactly 4 options, one correct answer, and a brief explanation.
+Questions must test different aspects of the material.
+{output_format}""")
+    ]
+
+
+def _serialize(question: QuizQuestion, index: int) -> dict:
+    """Serialize a question in the client's quiz format"""
+    return {"id": index, **question.model_dump(by_alias=True)}
+
+
+async def generate_quiz(
+    doc_id: str,
+    pages: Optional[str] = None,
+    num_questions: int = 5,
+    difficulty: str = "medium"
+) -> dict:
+    """
+    Generate a quiz with one retrieval and one structured LLM call.
+
+    Args:
+        doc_id: Document identifier
+        pages: Optional page specification ("1,2,3", "10-25", "Chapter 3")
+        num_questions: Number of questions (1-10)
+        difficulty: "easy", "medium" or "hard"
+
+    Returns:
+        Dict with validated questions and timings (ms)
+
+    Raises:
+        ValueError: If the document is missing or has no content for the pages
+        QuizGenerationError: If the LLM output fails validation
+        LLMUnavailableError: If the LLM is unavailable or the deadline passes
+    """
+    num_questions = max(1, min(10, num_questions))
+    deadline = turn_deadline()
+    start = time.perf_counter()
+
+    content = await retrieve_quiz_content(doc_id, pages)
+    retrieval_done = time.perf_counter()
+
+    structured_llm = llm_with_tools.wrap(llm.with_structured_output(QuizOutput))
+    try:
+        output = await structured_llm.ainvoke(
+            _quiz_messages(content, num_questions, difficulty, json_lines=False),
+            deadline=deadline
+        )
+    except (ValidationError, OutputParserException) as e:
+        raise QuizGenerationError(f"Quiz did not match the expected format: {str(e)}")
+
+    if output is None or not output.questions:
+        raise QuizGenerationError("The model returned no quiz questions")
+
+    questions = output.questions[:num_questions]
+    end = time.perf_counter()
+
+    logger.info(f"Generated {len(questions)} quiz questions for doc {doc_id}")
+    return {
+        "doc_id": doc_id,
+        "difficulty": difficulty,
+        "questions": [_serialize(q, i) for i, q in enumerate(questions, 1)],
+        "timings": {
+            "retrieval_ms": (retrieval_done - start) * 1000,
+            "llm_ms": (end - retrieval_done) * 1000,
+            "total_ms": (end - start) * 1000
+        }
+    }
+
+
+async def stream_quiz(
+    doc_id: str,
+    pages: Optional[str] = None,
+    num_questions: int = 5,
+    difficulty: str = "medium"
+) -> AsyncIterator[dict]:
+    """
+    Stream a quiz question-by-question as event dicts (for stream_sse).
+
+    The LLM is asked for one JSON object per line; each completed line is
+    validated and emitted as a "question" event as soon as it arrives.
+    Invalid lines are skipped and counted.
+    """
+    num_questions = max(1, min(10, num_questions))
+    deadline = turn_deadline()
+    start = time.perf_counter()
+    emitted, skipped = 0, 0
+
+    try:
+        content = await retrieve_quiz_content(doc_id, pages)
+        retrieval_ms = (time.perf_counter() - start) * 1000
+
+        buffer = ""
+        messages = _quiz_messages(content, num_questions, difficulty, json_lines=True)
+        async for chunk in llm_with_tools.wrap(llm).astream(messages, deadline=deadline):
+            buffer += chunk.content if isinstance(chunk.content, str) else ""
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                question = _parse_line(line)
+                if question is None:
+                    skipped += 1 if line.strip().startswith("{") else 0
+                    continue
+                if emitted < num_questions:
+                    emitted += 1
+                    yield {"type": "question", "question": _serialize(question, emitted)}
+
+        question = _parse_line(buffer)
+        if question is not None and emitted < num_questions:
+            emitted += 1
+            yield {"type": "question", "question": _serialize(question, emitted)}
+
+        if emitted == 0:
+            yield {"type": "error", "message": "The model returned no valid quiz questions"}
+
+        yield {
+            "type": "end",
+            "count": emitted,
+            "skipped": skipped,
+            "timings": {
+                "retrieval_ms": retrieval_ms,
+                "total_ms": (time.perf_counter() - start) * 1000
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"Error streaming quiz for doc {doc_id}: {str(e)}")
+        yield {"type": "error", "message": str(e)}
+        yield {"type": "end", "count": emitted}
+
+
+def _parse_line(line: str) -> Optional[QuizQuestion]:
+    """Parse one JSON line into a validated question, or None"""
+    line = line.strip().rstrip(",")
+    if not line.startswith("{"):
+        return None
+    try:
+        return QuizQuestion.model_validate(json.loads(line))
+    except (json.JSONDecodeError, ValidationError) as e:
+        logger.warning(f"Skipping invalid quiz line: {str(e)}")
+        return None
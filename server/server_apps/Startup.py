@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+from types import ModuleType
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .Metrics import metrics
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# Load the embedding model during startup instead of on the first request
+PRELOAD_EMBEDDINGS = os.getenv("PRELOAD_EMBEDDINGS", "true").lower() == "true"
+# Import the agent (LLM client, tools, graph) and quiz modules during startup
+PRELOAD_AGENT = os.getenv("PRELOAD_AGENT", "true").lower() == "true"
+# Number of most-searched vector stores to load during startup
+PRELOAD_STORES = int(os.getenv("PRELOAD_STORES", "3"))
+
+# Seconds per boot stage (import_app, import_<module>, embeddings, stores, warmup)
+boot_timings = {}
+
+
+def record_timing(stage: str, seconds: float):
+    """Record a boot stage duration (also exported as a metric)"""
+    boot_timings[stage] = round(seconds, 3)
+    metrics.set(f"boot_{stage}_seconds", seconds)
+
+
+# ==========================================================
+# LAZY MODULES
+# ==========================================================
+
+_modules = {}
+_module_locks = {}
+
+
+async def load_module(name: str) -> ModuleType:
+    """
+    Import a heavy server_apps module once, off the event loop.
+
+    Args:
+        name: Module name inside server_apps, e.g. "LangGraph_tool"
+
+    Returns:
+        The imported module
+    """
+    module = _modules.get(name)
+    if module is not None:
+        return module
+
+    lock = _module_locks.setdefault(name, asyncio.Lock())
+    async with lock:
+        if name not in _modules:
+            start = time.perf_counter()
+            _modules[name] = await run_in_threadpool(importlib.import_module, f".{name}", __package__)
+            record_timing(f"import_{name}", time.perf_counter() - start)
+            logger.info(f"Imported {name} in {boot_timings[f'import_{name}']:.2f}s")
+    return _modules[name]
+
+
+# ==========================================================
+# WARMUP
+# ==========================================================
+
+
+class Warmup:
+    """
+    Background startup work, so the server answers /health immediately and
+    reports readiness separately once models and stores are loaded.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.preloaded_stores = []
+
+    def start(self, processor):
+        """Start warming up in the background"""
+        self.task = asyncio.create_task(self._run(processor))
+
+    async def _run(self, processor):
+        start = time.perf_counter()
+        try:
+            stages = []
+            if PRELOAD_EMBEDDINGS:
+                stages.append(self._load_embeddings(processor))
+            if PRELOAD_AGENT:
+                stages.append(load_module("LangGraph_tool"))
+            await asyncio.gather(*stages)
+
+            if PRELOAD_AGENT:
+                await load_module("Quiz")
+
+            if PRELOAD_STORES > 0:
+                stage_start = time.perf_counter()
+                self.preloaded_stores = await run_in_threadpool(processor.preload_stores, PRELOAD_STORES)
+                record_timing("stores", time.perf_counter() - stage_start)
+
+            self.ready = True
+            logger.info(f"Warmup finished in {time.perf_counter() - start:.2f}s: {boot_timings}")
+
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Warmup failed: {str(e)}")
+
+        finally:
+            record_timing("warmup", time.perf_counter() - start)
+
+    async def _load_embeddings(self, processor):
+        seconds = await run_in_threadpool(processor.warmup)
+        record_timing("embeddings", seconds)
+
+    async def stop(self):
+        """Cancel warmup if it is still running (shutdown)"""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        """Readiness details for the /ready endpoint"""
+        if self.ready:
+            status = "ready"
+        elif self.error:
+            status = "failed"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "error": self.error,
+            "preloaded_stores": len(self.preloaded_stores),
+            "boot_timings": boot_timings
+        }
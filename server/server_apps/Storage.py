@@ -0,0 +1,636 @@
+"""
+Storage garbage collector and consistency checker.
+
+Reconciles uploads_dir and db_base_dir: PDFs without a vector store are
+re-ingested (or removed), half-written stores are rebuilt, leftovers with
+no owner (metadata files, stores, trash, import staging, temp files, old
+OCR cache entries, usage counts of deleted documents) are removed, and
+vector store databases with enough free pages are vacuumed.
+
+Runs periodically inside the API (STORAGE_GC_INTERVAL_HOURS) and as a CLI:
+
+    python -m server_apps.Storage --dry-run
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import asyncio
+import logging
+import argparse
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterable, Optional
+
+from anyio import from_thread
+from starlette.concurrency import run_in_threadpool
+
+from .Document import (
+    processor,
+    uploads_dir,
+    db_base_dir,
+    ocr_cache_dir,
+    trash_dir,
+    ingesting_dir,
+    usage_path,
+    directory_size,
+    is_doc_id,
+)
+from .Quantization import (
+    COMPACT_META_FILENAME,
+    COMPACT_CODES_FILENAME,
+    COMPACT_SCALES_FILENAME,
+    COMPACT_PENDING_FILENAME,
+)
+from .Metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # No cross-process lock on Windows
+    fcntl = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# Hours between background runs inside the API (0 disables)
+STORAGE_GC_INTERVAL_HOURS = float(os.getenv("STORAGE_GC_INTERVAL_HOURS", "24"))
+# Delay before the first background run after startup
+STORAGE_GC_STARTUP_DELAY_SECONDS = float(os.getenv("STORAGE_GC_STARTUP_DELAY_SECONDS", "300"))
+# Entries modified more recently than this are left alone (may be mid-ingestion)
+STORAGE_GC_MIN_AGE_SECONDS = float(os.getenv("STORAGE_GC_MIN_AGE_SECONDS", "3600"))
+# Re-ingest PDFs that have no (complete) vector store; false removes them instead
+STORAGE_GC_REQUEUE = os.getenv("STORAGE_GC_REQUEUE", "true").lower() == "true"
+# Most PDFs re-ingested per run (the rest wait for the next run)
+STORAGE_GC_MAX_REQUEUE = int(os.getenv("STORAGE_GC_MAX_REQUEUE", "5"))
+# Failed re-ingestions before a PDF is moved to quarantine
+STORAGE_GC_MAX_REQUEUE_FAILURES = int(os.getenv("STORAGE_GC_MAX_REQUEUE_FAILURES", "3"))
+# Quarantined PDFs are removed after this many days
+STORAGE_GC_QUARANTINE_DAYS = float(os.getenv("STORAGE_GC_QUARANTINE_DAYS", "30"))
+# Ingestion markers older than this belong to crashed or cancelled ingestions
+STORAGE_GC_STALE_MARKER_HOURS = float(os.getenv("STORAGE_GC_STALE_MARKER_HOURS", "6"))
+# OCR cache entries unused for this many days are removed (0 keeps them)
+OCR_CACHE_MAX_AGE_DAYS = float(os.getenv("OCR_CACHE_MAX_AGE_DAYS", "30"))
+# Vacuum a store's database when free pages reach this share of the file
+COMPACT_MIN_FREE_RATIO = float(os.getenv("COMPACT_MIN_FREE_RATIO", "0.2"))
+COMPACT_MIN_FREE_BYTES = 1024 * 1024
+
+CHROMA_SQLITE_FILENAME = "chroma.sqlite3"
+LOCK_FILENAME = ".storage_gc.lock"
+# Failed re-ingestions per doc_id: {"failures", "last_attempt", "error"}
+REQUEUE_FAILURES_FILENAME = "requeue_failures.json"
+quarantine_dir = os.path.join(db_base_dir, "quarantine")
+
+# ==========================================================
+# CHECKS
+# ==========================================================
+
+
+def check_store(store_dir: str) -> Optional[str]:
+    """
+    Check that a vector store directory holds a complete store.
+
+    Args:
+        store_dir: chroma_{doc_id} directory
+
+    Returns:
+        None if the store looks complete, otherwise the reason it is not
+    """
+    names = set(os.listdir(store_dir))
+    if CHROMA_SQLITE_FILENAME not in names:
+        return f"no {CHROMA_SQLITE_FILENAME}"
+    # compact.json is written last; vectors without it mean an interrupted build
+    if (COMPACT_CODES_FILENAME in names or COMPACT_SCALES_FILENAME in names) and COMPACT_META_FILENAME not in names:
+        return f"compact vectors without {COMPACT_META_FILENAME}"
+    # A truncated index whose compact build never finished cannot be searched
+    if COMPACT_PENDING_FILENAME in names and COMPACT_META_FILENAME not in names:
+        return f"{COMPACT_PENDING_FILENAME} without {COMPACT_META_FILENAME}"
+
+    try:
+        conn = sqlite3.connect(f"file:{os.path.join(store_dir, CHROMA_SQLITE_FILENAME)}?mode=ro", uri=True)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return f"unreadable {CHROMA_SQLITE_FILENAME} ({str(e)})"
+
+    if count == 0:
+        return "no embeddings"
+    return None
+
+
+def _age(paths: Iterable[str], now: float) -> float:
+    """Seconds since the most recent modification of any existing path"""
+    mtimes = [os.path.getmtime(path) for path in paths if os.path.exists(path)]
+    return now - max(mtimes) if mtimes else float("inf")
+
+
+# ==========================================================
+# COLLECTOR
+# ==========================================================
+
+
+class StorageGC:
+    """
+    One garbage collection / consistency check pass.
+
+    Every finding is reported as {"kind", "path", "action", "bytes"}; with
+    dry_run nothing is changed and actions read "would_<action>".
+
+    Documents being ingested by any worker or process are found through
+    their marker files in db/ingesting and skipped. Search counts and the
+    store cache are per process, so with several API workers stale-usage
+    pruning only cleans the running worker's counts, and compaction may
+    meet a store another worker holds open (VACUUM then fails fast on the
+    lock and the store is skipped).
+
+    Inside the API, re-ingestion waits for an ingest admission slot
+    (acquire_slot) so it counts against MAX_CONCURRENT_INGEST like uploads;
+    the pass itself runs in a worker thread, so the async slot calls are
+    bridged back to the event loop. The CLI has no admission controller.
+    """
+
+    def __init__(
+        self,
+        dry_run: bool = False,
+        requeue: bool = STORAGE_GC_REQUEUE,
+        compact: bool = True,
+        min_age: float = STORAGE_GC_MIN_AGE_SECONDS,
+        max_requeue: int = STORAGE_GC_MAX_REQUEUE,
+        ocr_max_age_days: float = OCR_CACHE_MAX_AGE_DAYS,
+        busy_doc_ids: Iterable[str] = (),
+        acquire_slot: Optional[Callable[[], Awaitable]] = None
+    ):
+        self.dry_run = dry_run
+        self.requeue = requeue
+        self.compact = compact
+        self.min_age = min_age
+        self.max_requeue = max_requeue
+        self.ocr_max_age_days = ocr_max_age_days
+        self.acquire_slot = acquire_slot
+        self.findings = []
+        self.reclaimed_bytes = 0
+        self.requeued = 0
+        self.skipped_recent = 0
+        self.failures_path = os.path.join(db_base_dir, REQUEUE_FAILURES_FILENAME)
+        self.failures = self._load_failures()
+        self.busy_doc_ids = set(busy_doc_ids) | self._ingesting()
+
+    def _ingesting(self) -> set:
+        """doc_ids with a live ingestion marker (stale markers are removed)"""
+        if not os.path.exists(ingesting_dir):
+            return set()
+
+        busy = set()
+        cutoff = time.time() - STORAGE_GC_STALE_MARKER_HOURS * 3600
+        for name in os.listdir(ingesting_dir):
+            path = os.path.join(ingesting_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    busy.add(name)
+                    continue
+            except OSError:
+                continue
+            self._remove("stale_marker", path, doc_id=name)
+        return busy
+
+    @contextmanager
+    def _ingest_slot(self):
+        """Hold an ingest admission slot (from the GC's worker thread) while re-ingesting"""
+        if self.acquire_slot is None:
+            yield
+            return
+        slot = from_thread.run(self.acquire_slot)
+        try:
+            yield
+        finally:
+            from_thread.run(slot.release)
+
+    def _load_failures(self) -> dict:
+        try:
+            with open(self.failures_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_failures(self):
+        if self.dry_run:
+            return
+        tmp_path = f"{self.failures_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.failures, f)
+        os.replace(tmp_path, self.failures_path)
+
+    def _record(self, kind: str, path: str, action: str, size: int = 0, **details):
+        if self.dry_run and action not in ("kept", "deferred"):
+            action = f"would_{action}"
+        self.findings.append({"kind": kind, "path": path, "action": action, "bytes": size, **details})
+
+    def _remove(self, kind: str, path: str, **details) -> int:
+        """Remove a file or directory (unless dry run); returns its size"""
+        size = directory_size(path)
+        if not self.dry_run:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                logger.error(f"Could not remove {path}: {str(e)}")
+                self._record(kind, path, "failed", 0, error=str(e), **details)
+                return 0
+        self.reclaimed_bytes += size
+        self._record(kind, path, "removed", size, **details)
+        return size
+
+    def run(self) -> dict:
+        """
+        Scan both directories and fix what can be fixed.
+
+        Returns:
+            Report with findings, reclaimed bytes and scan duration
+        """
+        start = time.perf_counter()
+        self._check_documents()
+        self._collect_leftovers()
+        self._collect_ocr_cache()
+        if self.compact:
+            self._compact_stores()
+
+        report = {
+            "dry_run": self.dry_run,
+            "findings": self.findings,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "requeued": self.requeued,
+            "skipped_recent": self.skipped_recent,
+            "scan_seconds": round(time.perf_counter() - start, 3),
+            "finished_at": time.time()
+        }
+        logger.info(
+            f"Storage GC{' (dry run)' if self.dry_run else ''}: {len(self.findings)} findings, "
+            f"{self.reclaimed_bytes} bytes reclaimed, {self.requeued} re-queued "
+            f"in {report['scan_seconds']:.2f}s"
+        )
+        return report
+
+    # ------------------------------------------------------
+    # Documents: PDF + metadata in uploads_dir, store in db_base_dir
+    # ------------------------------------------------------
+
+    def _check_documents(self):
+        now = time.time()
+        upload_names = os.listdir(uploads_dir) if os.path.exists(uploads_dir) else []
+        pdfs = {name[:-4] for name in upload_names if name.endswith(".pdf") and is_doc_id(name[:-4])}
+        metadata = {name[:-4] for name in upload_names if name.endswith(".txt") and is_doc_id(name[:-4])}
+        stores = {
+            name[len("chroma_"):] for name in os.listdir(db_base_dir)
+            if name.startswith("chroma_") and os.path.isdir(os.path.join(db_base_dir, name))
+        }
+
+        for name in upload_names:
+            stem, ext = os.path.splitext(name)
+            if ext not in (".pdf", ".txt") or not is_doc_id(stem):
+                self._record("unknown_file", os.path.join(uploads_dir, name), "kept")
+
+        valid_stores = set()
+        orphans = []  # PDFs without a complete store
+        for doc_id in sorted(pdfs | metadata | stores):
+            pdf_path = os.path.join(uploads_dir, f"{doc_id}.pdf")
+            metadata_path = os.path.join(uploads_dir, f"{doc_id}.txt")
+            store_dir = os.path.join(db_base_dir, f"chroma_{doc_id}")
+
+            if doc_id in self.busy_doc_ids or _age((pdf_path, metadata_path, store_dir), now) < self.min_age:
+                self.skipped_recent += 1
+                if doc_id in stores:
+                    valid_stores.add(doc_id)
+                continue
+
+            if doc_id in stores:
+                problem = check_store(store_dir)
+                if problem is None:
+                    if doc_id not in pdfs and doc_id not in metadata:
+                        if not self.dry_run:
+                            processor.evict(doc_id)
+                        self._remove("orphan_store", store_dir, doc_id=doc_id)
+                        continue
+                    valid_stores.add(doc_id)
+                    if doc_id not in pdfs:
+                        # Imported without its PDF: searchable, hidden from /documents
+                        self._record("store_without_pdf", store_dir, "kept", doc_id=doc_id)
+                    continue
+
+                if not self.dry_run:
+                    processor.evict(doc_id)
+                self._remove("incomplete_store", store_dir, doc_id=doc_id, reason=problem)
+
+            if doc_id in pdfs:
+                orphans.append((doc_id, pdf_path, metadata_path))
+            elif doc_id in metadata:
+                self._remove("orphan_metadata", metadata_path, doc_id=doc_id)
+
+        # Least recently attempted first, so PDFs that keep failing cannot
+        # use up the per-run budget ahead of the others
+        orphans.sort(key=lambda orphan: self.failures.get(orphan[0], {}).get("last_attempt", 0))
+        for doc_id, pdf_path, metadata_path in orphans:
+            self._requeue_or_remove(doc_id, pdf_path, metadata_path)
+
+        orphan_ids = {doc_id for doc_id, _, _ in orphans}
+        stale_failures = [doc_id for doc_id in self.failures if doc_id not in orphan_ids]
+        for doc_id in stale_failures:
+            del self.failures[doc_id]
+        self._save_failures()
+
+        # Search counts of documents that no longer exist
+        stale = [
+            doc_id for doc_id in processor.usage_snapshot()
+            if doc_id not in valid_stores and doc_id not in self.busy_doc_ids
+        ]
+        if stale:
+            self._record("stale_usage", usage_path, "pruned", 0, count=len(stale))
+            if not self.dry_run:
+                processor.forget_usage(stale)
+                processor.save_usage()
+
+    def _requeue_or_remove(self, doc_id: str, pdf_path: str, metadata_path: str):
+        """Handle a PDF that has no complete vector store"""
+        if not self.requeue:
+            self._remove("orphan_pdf", pdf_path, doc_id=doc_id)
+            if os.path.exists(metadata_path):
+                self._remove("orphan_metadata", metadata_path, doc_id=doc_id)
+            return
+
+        if self.requeued >= self.max_requeue:
+            self._record("orphan_pdf", pdf_path, "deferred", doc_id=doc_id)
+            return
+
+        self.requeued += 1
+        if self.dry_run:
+            self._record("orphan_pdf", pdf_path, "requeued", doc_id=doc_id)
+            return
+
+        with self._ingest_slot():
+            result = processor.process_pdf(pdf_path, doc_id)
+        if result.get("status") != "error":
+            self.failures.pop(doc_id, None)
+            self._record("orphan_pdf", pdf_path, "requeued", doc_id=doc_id, chunks=result.get("chunks"))
+            return
+
+        # A half-written store never stays; the PDF is retried on later runs
+        # (the cause may be transient, e.g. the embedding server being down)
+        # until it has failed STORAGE_GC_MAX_REQUEUE_FAILURES times
+        processor.evict(doc_id)
+        shutil.rmtree(os.path.join(db_base_dir, f"chroma_{doc_id}"), ignore_errors=True)
+        failure = self.failures.get(doc_id, {"failures": 0})
+        failure.update(failures=failure["failures"] + 1, last_attempt=time.time(), error=result.get("error"))
+        self.failures[doc_id] = failure
+
+        if failure["failures"] < STORAGE_GC_MAX_REQUEUE_FAILURES:
+            self._record("orphan_pdf", pdf_path, "requeue_failed", doc_id=doc_id, **failure)
+            return
+
+        target = os.path.join(quarantine_dir, doc_id)
+        os.makedirs(target, exist_ok=True)
+        for path in (pdf_path, metadata_path):
+            if os.path.exists(path):
+                os.replace(path, os.path.join(target, os.path.basename(path)))
+        del self.failures[doc_id]
+        logger.warning(f"Quarantined {doc_id} after {failure['failures']} failed re-ingestions")
+        self._record("orphan_pdf", target, "quarantined", doc_id=doc_id, **failure)
+
+    # ------------------------------------------------------
+    # Leftovers in db_base_dir
+    # ------------------------------------------------------
+
+    def _collect_leftovers(self):
+        now = time.time()
+
+        # Documents deleted in bulk whose background removal did not finish;
+        # recent entries are left to the empty_trash task that is still running
+        if os.path.exists(trash_dir):
+            for name in os.listdir(trash_dir):
+                path = os.path.join(trash_dir, name)
+                if _age((path,), now) < self.min_age:
+                    self.skipped_recent += 1
+                    continue
+                self._remove("trash", path)
+
+        # PDFs that kept failing re-ingestion, kept for a while for inspection
+        if os.path.exists(quarantine_dir):
+            cutoff = now - STORAGE_GC_QUARANTINE_DAYS * 86400
+            for name in os.listdir(quarantine_dir):
+                path = os.path.join(quarantine_dir, name)
+                if os.path.getmtime(path) < cutoff:
+                    self._remove("quarantine", path)
+                else:
+                    self._record("quarantine", path, "kept")
+
+        known = {
+            os.path.basename(ocr_cache_dir),
+            os.path.basename(trash_dir),
+            os.path.basename(quarantine_dir),
+            os.path.basename(ingesting_dir),
+            os.path.basename(usage_path),
+            REQUEUE_FAILURES_FILENAME,
+            LOCK_FILENAME
+        }
+        for name in os.listdir(db_base_dir):
+            path = os.path.join(db_base_dir, name)
+            if name in known or name.startswith("chroma_"):
+                continue
+            if _age((path,), now) < self.min_age:
+                continue
+            if name.startswith(".import_"):
+                # Staging directory of an interrupted library import
+                self._remove("import_staging", path)
+            elif name.startswith(os.path.basename(usage_path)) and name.endswith(".tmp"):
+                self._remove("temp_file", path)
+            else:
+                self._record("unknown_file", path, "kept")
+
+    def _collect_ocr_cache(self):
+        if self.ocr_max_age_days <= 0 or not os.path.exists(ocr_cache_dir):
+            return
+
+        cutoff = time.time() - self.ocr_max_age_days * 86400
+        count, size = 0, 0
+        for name in os.listdir(ocr_cache_dir):
+            path = os.path.join(ocr_cache_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                entry_size = os.path.getsize(path)
+                if not self.dry_run:
+                    os.remove(path)
+            except OSError:
+                continue
+            count += 1
+            size += entry_size
+
+        if count:
+            self.reclaimed_bytes += size
+            self._record("stale_ocr_cache", ocr_cache_dir, "removed", size, count=count)
+
+    # ------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------
+
+    def _compact_stores(self):
+        """VACUUM store databases with many free pages (skips stores in use)"""
+        for name in os.listdir(db_base_dir):
+            if not name.startswith("chroma_"):
+                continue
+            doc_id = name[len("chroma_"):]
+            sqlite_path = os.path.join(db_base_dir, name, CHROMA_SQLITE_FILENAME)
+            if doc_id in processor.active_stores or doc_id in self.busy_doc_ids or not os.path.exists(sqlite_path):
+                continue
+
+            try:
+                conn = sqlite3.connect(sqlite_path, timeout=1)
+                try:
+                    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                    free = conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+                    size = os.path.getsize(sqlite_path)
+                    if free < max(COMPACT_MIN_FREE_BYTES, size * COMPACT_MIN_FREE_RATIO):
+                        continue
+                    if not self.dry_run:
+                        conn.execute("VACUUM")
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not compact {sqlite_path}: {str(e)}")
+                continue
+
+            saved = free if self.dry_run else max(0, size - os.path.getsize(sqlite_path))
+            self.reclaimed_bytes += saved
+            self._record("compacted_store", sqlite_path, "compacted", saved, doc_id=doc_id)
+
+
+def collect(lock: bool = True, **options) -> Optional[dict]:
+    """
+    Run one GC pass, unless another process is already running one.
+
+    Args:
+        lock: Take the cross-process lock (several API workers share the disk)
+        **options: StorageGC arguments
+
+    Returns:
+        The report, or None if another process holds the lock
+    """
+    if not lock or fcntl is None:
+        return StorageGC(**options).run()
+
+    with open(os.path.join(db_base_dir, LOCK_FILENAME), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.info("Storage GC already running in another process, skipping")
+            return None
+        try:
+            return StorageGC(**options).run()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# ==========================================================
+# SCHEDULED TASK
+# ==========================================================
+
+
+class StorageGCTask:
+    """
+    Runs the storage GC in the background every STORAGE_GC_INTERVAL_HOURS.
+
+    acquire_slot (an async factory of admission slots) is handed to every
+    pass so re-ingestion stays within the API's ingest concurrency cap.
+    """
+
+    def __init__(
+        self,
+        interval_hours: float = STORAGE_GC_INTERVAL_HOURS,
+        acquire_slot: Optional[Callable[[], Awaitable]] = None
+    ):
+        self.interval = interval_hours * 3600
+        self.acquire_slot = acquire_slot
+        self.task: Optional[asyncio.Task] = None
+        self.last_report: Optional[dict] = None
+        self.next_run_at: Optional[float] = None
+
+    def start(self):
+        """Start the periodic task (no-op when the interval is 0)"""
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        delay = STORAGE_GC_STARTUP_DELAY_SECONDS
+        while True:
+            self.next_run_at = time.time() + delay
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                report = await run_in_threadpool(collect, acquire_slot=self.acquire_slot)
+            except Exception as e:
+                logger.error(f"Storage GC failed: {str(e)}")
+                continue
+            if report is not None:
+                self.last_report = report
+                metrics.inc("storage_gc_runs")
+                metrics.inc("storage_gc_reclaimed_bytes", report["reclaimed_bytes"])
+                metrics.set("storage_gc_scan_seconds", report["scan_seconds"])
+
+    async def stop(self):
+        """Cancel the periodic task (shutdown)"""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        """Schedule and last report for the /storage/gc endpoint"""
+        return {
+            "enabled": self.interval > 0,
+            "interval_hours": self.interval / 3600,
+            "next_run_at": self.next_run_at,
+            "last_report": self.last_report
+        }
+
+
+# ==========================================================
+# CLI
+# ==========================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Garbage-collect and check uploads/ and db/")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, change nothing")
+    parser.add_argument("--no-requeue", action="store_true", help="Remove PDFs without a store instead of re-ingesting them")
+    parser.add_argument("--no-compact", action="store_true", help="Skip vacuuming store databases")
+    parser.add_argument("--min-age", type=float, default=STORAGE_GC_MIN_AGE_SECONDS,
+                        help="Leave entries modified within this many seconds alone")
+    parser.add_argument("--max-requeue", type=int, default=STORAGE_GC_MAX_REQUEUE)
+    parser.add_argument("--ocr-max-age-days", type=float, default=OCR_CACHE_MAX_AGE_DAYS)
+    args = parser.parse_args()
+
+    report = collect(
+        dry_run=args.dry_run,
+        requeue=not args.no_requeue,
+        compact=not args.no_compact,
+        min_age=args.min_age,
+        max_requeue=args.max_requeue,
+        ocr_max_age_days=args.ocr_max_age_days
+    )
+    if report is None:
+        sys.exit("Storage GC is already running in another process")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
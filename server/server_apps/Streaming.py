@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIGURATION
+# ==========================================================
+
+# Flush buffered content once it reaches this many bytes (0 disables coalescing)
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "256"))
+# ...or once the oldest buffered token is this many milliseconds old
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "50"))
+# Send a keepalive comment when nothing was written for this long (0 disables)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Minimum interval between client disconnect checks
+SSE_DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", "0.25"))
+
+# SSE comment line - ignored by EventSource and by streamService.js
+HEARTBEAT_FRAME = b": keepalive\n\n"
+
+# ==========================================================
+# SSE ENCODING
+# ==========================================================
+
+
+def encode_event(payload: dict) -> bytes:
+    """
+    Encode a payload as a single SSE data frame.
+
+    JSON serialization escapes quotes, backslashes, newlines and control
+    characters, so the frame can never be split or corrupted by content.
+
+    Args:
+        payload: JSON-serializable event (must contain a "type" key)
+
+    Returns:
+        Encoded "data: {...}\\n\\n" frame
+    """
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"data: " + body + b"\n\n"
+
+
+class ClientDisconnected(Exception):
+    """Raised internally when the client has gone away mid-stream"""
+
+
+async def stream_sse(
+    events: AsyncIterator[dict],
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    coalesce_bytes: int = SSE_COALESCE_BYTES,
+    coalesce_ms: float = SSE_COALESCE_MS,
+    heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS
+) -> AsyncIterator[bytes]:
+    """
+    Turn an async iterator of event dicts into encoded SSE frames.
+
+    Consecutive "content" events are coalesced into one frame, flushed by
+    size or age. Keepalive comments are emitted while the source is idle.
+    When the client disconnects, the source iterator is cancelled and closed
+    so upstream work (graph runs, LLM calls) stops.
+
+    Args:
+        events: Source of event dicts
+        is_disconnected: Async callable returning True once the client is gone
+        coalesce_bytes: Flush buffered content at this size (0 disables coalescing)
+        coalesce_ms: Flush buffered content after this many milliseconds
+        heartbeat_seconds: Idle interval before a keepalive frame (0 disables)
+
+    Yields:
+        Encoded SSE frames
+    """
+    iterator = events.__aiter__()
+    pending: Optional[asyncio.Future] = None
+
+    buffer = []
+    buffered_bytes = 0
+    buffered_at = 0.0
+    last_write = time.monotonic()
+    last_disconnect_check = 0.0
+
+    async def check_disconnected():
+        nonlocal last_disconnect_check
+        if is_disconnected is None:
+            return
+        now = time.monotonic()
+        if now - last_disconnect_check < SSE_DISCONNECT_POLL_SECONDS:
+            return
+        last_disconnect_check = now
+        if await is_disconnected():
+            raise ClientDisconnected()
+
+    def flush() -> bytes:
+        nonlocal buffer, buffered_bytes, last_write
+        frame = encode_event({"type": "content", "content": "".join(buffer)})
+        buffer = []
+        buffered_bytes = 0
+        last_write = time.monotonic()
+        return frame
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            # Wake up for whichever comes first: next event, flush deadline or heartbeat
+            now = time.monotonic()
+            timeout = None
+            if heartbeat_seconds > 0:
+                timeout = max(0.0, last_write + heartbeat_seconds - now)
+            if buffer:
+                flush_in = max(0.0, buffered_at + coalesce_ms / 1000 - now)
+                timeout = flush_in if timeout is None else min(timeout, flush_in)
+
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            await check_disconnected()
+
+            if not done:
+                now = time.monotonic()
+                if buffer and now >= buffered_at + coalesce_ms / 1000:
+                    yield flush()
+                elif heartbeat_seconds > 0 and now >= last_write + heartbeat_seconds:
+                    last_write = now
+                    yield HEARTBEAT_FRAME
+                continue
+
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+
+            if event.get("type") == "content" and coalesce_bytes > 0:
+                content = event.get("content", "")
+                if not buffer:
+                    buffered_at = time.monotonic()
+                buffer.append(content)
+                buffered_bytes += len(content.encode("utf-8"))
+                if buffered_bytes >= coalesce_bytes:
+                    yield flush()
+                continue
+
+            # Non-content events keep their order relative to buffered content
+            if buffer:
+                yield flush()
+            last_write = time.monotonic()
+            yield encode_event(event)
+
+        if buffer:
+            yield flush()
+
+    except ClientDisconnected:
+        logger.info("Client disconnected, cancelling stream")
+
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+            except Exception as e:
+                logger.warning(f"Error while cancelling stream source: {str(e)}")
+
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from server_apps import Admission
+from server_apps.Admission import ADMISSION_RETRY_AFTER, AdmissionController, InMemoryStore, PoolLimits
+
+LIMITS = {"ingest": PoolLimits(rate_per_minute=60, burst=2, max_concurrent=1)}
+
+
+class FakeClock:
+    """Stands in for the time module inside Admission"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(Admission, "time", clock)
+    return clock
+
+
+def take(store, client="10.0.0.1", limit=LIMITS["ingest"]):
+    return asyncio.run(store.take_token("ingest", client, limit))
+
+
+# ==========================================================
+# TOKEN BUCKET
+# ==========================================================
+
+
+def test_burst_then_wait_for_refill(clock):
+    store = InMemoryStore(LIMITS)
+    assert take(store) == 0
+    assert take(store) == 0
+    assert take(store) == pytest.approx(1.0)  # 1 token per second
+
+    clock.now += 0.5
+    assert take(store) == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert take(store) == 0
+
+
+def test_refill_is_capped_at_burst(clock):
+    store = InMemoryStore(LIMITS)
+    take(store)
+    clock.now += 3600
+    assert take(store) == 0
+    assert take(store) == 0
+    assert take(store) > 0
+
+
+def test_clients_have_separate_buckets(clock):
+    store = InMemoryStore(LIMITS)
+    take(store, "a")
+    take(store, "a")
+    assert take(store, "a") > 0
+    assert take(store, "b") == 0
+
+
+def test_zero_rate_asks_to_retry_later(clock):
+    limit = PoolLimits(rate_per_minute=0, burst=1, max_concurrent=1)
+    store = InMemoryStore({"ingest": limit})
+    assert take(store, limit=limit) == 0
+    assert take(store, limit=limit) == ADMISSION_RETRY_AFTER
+
+
+# ==========================================================
+# CONCURRENCY SLOTS
+# ==========================================================
+
+
+def test_slots_time_out_when_pool_is_full():
+    async def scenario():
+        store = InMemoryStore(LIMITS)
+        lease = await store.acquire_slot("ingest", LIMITS["ingest"], timeout=0.01)
+        blocked = await store.acquire_slot("ingest", LIMITS["ingest"], timeout=0.01)
+        await store.release_slot("ingest", lease)
+        again = await store.acquire_slot("ingest", LIMITS["ingest"], timeout=0.01)
+        return lease, blocked, again
+
+    lease, blocked, again = asyncio.run(scenario())
+    assert lease is not None
+    assert blocked is None
+    assert again is not None
+
+
+def test_background_acquire_waits_for_a_released_slot():
+    async def scenario():
+        controller = AdmissionController(limits=LIMITS, redis_url="")
+        first = await controller.acquire("ingest")
+        waiter = asyncio.create_task(controller.acquire("ingest"))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        assert controller.waiting["ingest"] == 1
+
+        await first.release()
+        second = await asyncio.wait_for(waiter, timeout=1)
+        assert controller.active["ingest"] == 1
+        await second.release()
+        assert controller.active["ingest"] == 0
+
+    asyncio.run(scenario())
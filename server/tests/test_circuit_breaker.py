@@ -0,0 +1,90 @@
+import pytest
+
+from server_apps import LLM_client
+from server_apps.LLM_client import CircuitBreaker
+
+
+class FakeClock:
+    """Stands in for the time module inside LLM_client"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(LLM_client, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(threshold=2, cooldown=10)
+
+
+def test_opens_after_threshold_consecutive_failures(breaker):
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_single_probe_after_cooldown(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now += 9.9
+    assert not breaker.allow()
+
+    clock.now += 0.2
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # Only one probe in flight
+
+
+def test_probe_success_closes(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_probe_failure_reopens_for_a_full_cooldown(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 5
+    assert not breaker.allow()
+
+
+def test_abandoned_probe_lets_the_next_call_probe(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+
+    breaker.abandon_probe()
+    assert breaker.state == "open"
+    assert breaker.allow()
+    assert breaker.state == "half_open"
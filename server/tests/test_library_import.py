@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import zipfile
+from uuid import uuid4
+
+import pytest
+
+from server_apps import Library
+from server_apps.Document import is_doc_id
+from server_apps.Library import ARCHIVE_VERSION, EMBEDDING_MODEL, MANIFEST_FILENAME, import_library
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    """Point the importer at empty uploads/ and db/ directories"""
+    uploads = tmp_path / "uploads"
+    db = tmp_path / "db"
+    uploads.mkdir()
+    db.mkdir()
+    monkeypatch.setattr(Library, "uploads_dir", str(uploads))
+    monkeypatch.setattr(Library, "db_base_dir", str(db))
+    return tmp_path
+
+
+def make_archive(documents, members, manifest=None) -> io.BytesIO:
+    """Zip with a manifest listing documents and the given member files"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr(MANIFEST_FILENAME, json.dumps(manifest or {
+            "version": ARCHIVE_VERSION,
+            "embedding_model": EMBEDDING_MODEL,
+            "documents": documents
+        }))
+        for name, data in members.items():
+            zf.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def single_document(doc_id, files, extra_members=None):
+    members = {name: b"data" for name in files}
+    members.update(extra_members or {})
+    return make_archive([{"doc_id": doc_id, "files": files}], members)
+
+
+def assert_untouched(dirs):
+    """Nothing was extracted anywhere under the test root"""
+    written = sorted(
+        os.path.relpath(os.path.join(root, name), dirs)
+        for root, _, names in os.walk(dirs)
+        for name in names
+    )
+    assert written == []
+
+
+# ==========================================================
+# PATH SAFETY
+# ==========================================================
+
+
+@pytest.mark.parametrize("doc_id", ["../../etc", "chroma_x", "", "not-a-uuid", f"{uuid4()}/.."])
+def test_rejects_invalid_doc_ids(dirs, doc_id):
+    archive = single_document(doc_id, [f"db/chroma_{doc_id}/chroma.sqlite3"])
+    with pytest.raises(ValueError, match="Invalid doc_id"):
+        import_library(archive)
+    assert_untouched(dirs)
+
+
+@pytest.mark.parametrize("path", [
+    "db/chroma_{id}/../../escape.txt",
+    "db/chroma_{id}/../chroma_other/chroma.sqlite3",
+    "uploads/../../escape.pdf",
+    "uploads/{other}.pdf",
+    "/etc/passwd",
+    "db/chroma_{other}/chroma.sqlite3",
+])
+def test_rejects_paths_outside_the_document(dirs, path):
+    doc_id, other = str(uuid4()), str(uuid4())
+    path = path.format(id=doc_id, other=other)
+    archive = single_document(doc_id, [f"db/chroma_{doc_id}/chroma.sqlite3", path])
+    with pytest.raises(ValueError, match="Unexpected path"):
+        import_library(archive)
+    assert_untouched(dirs)
+
+
+def test_rejects_files_missing_from_the_zip(dirs):
+    doc_id = str(uuid4())
+    archive = make_archive([{"doc_id": doc_id, "files": [f"db/chroma_{doc_id}/chroma.sqlite3"]}], {})
+    with pytest.raises(ValueError, match="missing"):
+        import_library(archive)
+
+
+def test_rejects_documents_without_a_store(dirs):
+    doc_id = str(uuid4())
+    archive = single_document(doc_id, [f"uploads/{doc_id}.pdf"])
+    with pytest.raises(ValueError, match="no vector store"):
+        import_library(archive)
+    assert_untouched(dirs)
+
+
+def test_rejects_other_embedding_models(dirs):
+    archive = make_archive([], {}, manifest={
+        "version": ARCHIVE_VERSION,
+        "embedding_model": "some/other-model",
+        "documents": []
+    })
+    with pytest.raises(ValueError, match="embedded with"):
+        import_library(archive)
+
+
+def test_rejects_non_zip(dirs):
+    with pytest.raises(ValueError, match="zip"):
+        import_library(io.BytesIO(b"not a zip"))
+
+
+# ==========================================================
+# IMPORT
+# ==========================================================
+
+
+def test_imports_valid_document(dirs):
+    doc_id = str(uuid4())
+    files = [
+        f"uploads/{doc_id}.pdf",
+        f"uploads/{doc_id}.txt",
+        f"db/chroma_{doc_id}/chroma.sqlite3",
+        f"db/chroma_{doc_id}/segment/data.bin",
+    ]
+    result = import_library(single_document(doc_id, files))
+
+    assert result == {"imported": [doc_id], "skipped": []}
+    assert (dirs / "uploads" / f"{doc_id}.pdf").read_bytes() == b"data"
+    assert (dirs / "db" / f"chroma_{doc_id}" / "segment" / "data.bin").read_bytes() == b"data"
+    # No staging directory is left behind
+    assert sorted(os.listdir(dirs / "db")) == [f"chroma_{doc_id}"]
+
+
+def test_existing_documents_are_skipped_without_overwrite(dirs):
+    doc_id = str(uuid4())
+    (dirs / "db" / f"chroma_{doc_id}").mkdir()
+    result = import_library(single_document(doc_id, [f"db/chroma_{doc_id}/chroma.sqlite3"]))
+    assert result == {"imported": [], "skipped": [doc_id]}
+    assert os.listdir(dirs / "db" / f"chroma_{doc_id}") == []
+
+
+def test_is_doc_id_accepts_only_canonical_uuids():
+    doc_id = str(uuid4())
+    assert is_doc_id(doc_id)
+    assert not is_doc_id(doc_id.upper())
+    assert not is_doc_id(doc_id.replace("-", ""))
+    assert not is_doc_id("../" + doc_id)
@@ -0,0 +1,86 @@
+import pytest
+
+from server_apps.Document import compile_page_filter, parse_page_spec
+
+OUTLINE = [
+    {"title": "Chapter 30: Appendix Tables", "level": 1, "page_start": 300, "page_end": 320},
+    {"title": "Introduction", "level": 1, "page_start": 0, "page_end": 9},
+    {"title": "Chapter 3: Thermodynamics", "level": 1, "page_start": 40, "page_end": 59},
+]
+
+
+# ==========================================================
+# parse_page_spec
+# ==========================================================
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("5", [(4, 4)]),
+    ("10-25", [(9, 24)]),
+    ("5 to 8", [(4, 7)]),
+    ("40-", [(39, None)]),
+    ("-10", [(0, 9)]),
+    ("1,2,3", [(0, 2)]),
+    ("1-10, 5-20, 30", [(0, 19), (29, 29)]),
+    ([1, 2, 5], [(0, 1), (4, 4)]),
+])
+def test_numbers_are_one_based(spec, expected):
+    assert parse_page_spec(spec) == expected
+
+
+def test_open_range_absorbs_later_ranges():
+    assert parse_page_spec("40-, 50-60") == [(39, None)]
+
+
+def test_outline_titles_use_outline_pages():
+    assert parse_page_spec("Chapter 3", OUTLINE) == [(40, 59)]
+    assert parse_page_spec("introduction", OUTLINE) == [(0, 9)]
+
+
+def test_chapter_number_does_not_match_longer_number():
+    assert parse_page_spec("chapter 3", OUTLINE) == [(40, 59)]
+
+
+def test_titles_and_pages_mix():
+    assert parse_page_spec("Introduction, 11-12", OUTLINE) == [(0, 11)]
+
+
+@pytest.mark.parametrize("spec", ["0", "0-5", "8-3", "Appendix Z", "page five"])
+def test_invalid_specs_raise(spec):
+    with pytest.raises(ValueError):
+        parse_page_spec(spec, OUTLINE)
+
+
+# ==========================================================
+# compile_page_filter
+# ==========================================================
+
+
+def test_user_range_covers_exactly_the_written_pages():
+    # "1-50" must select pages 0-49 of chunk metadata: nothing before, nothing after
+    assert compile_page_filter(parse_page_spec("1-50"), page_spans=True) == {"page_start": {"$lte": 49}}
+
+
+def test_closed_range_with_spans_matches_overlapping_chunks():
+    assert compile_page_filter([(9, 24)], page_spans=True) == {
+        "$and": [{"page_start": {"$lte": 24}}, {"page_end": {"$gte": 9}}]
+    }
+
+
+def test_closed_range_on_legacy_store_uses_page():
+    assert compile_page_filter([(9, 24)], page_spans=False) == {
+        "$and": [{"page": {"$lte": 24}}, {"page": {"$gte": 9}}]
+    }
+
+
+def test_single_page_on_legacy_store_is_equality():
+    assert compile_page_filter([(4, 4)], page_spans=False) == {"page": 4}
+
+
+def test_open_ranges():
+    assert compile_page_filter([(39, None)], page_spans=True) == {"page_end": {"$gte": 39}}
+    assert compile_page_filter([(0, None)], page_spans=False) == {"page": {"$gte": 0}}
+
+
+def test_several_ranges_are_or_ed():
+    assert compile_page_filter([(0, 0), (4, 4)], page_spans=False) == {"$or": [{"page": 0}, {"page": 4}]}
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from server_apps.Quantization import (
+    COMPACT_META_FILENAME,
+    COMPACT_SCALES_FILENAME,
+    CompactVectors,
+    TruncatedEmbeddings,
+    dequantize,
+    normalize,
+    quantize,
+    truncate,
+)
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return normalize(rng.standard_normal((32, 384)).astype(np.float32))
+
+
+class FixedEmbeddings(Embeddings):
+    """Deterministic embeddings: one basis-like vector per text length"""
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] + [1.0] * 7 for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# ==========================================================
+# CODECS
+# ==========================================================
+
+
+def test_normalize_gives_unit_rows_and_keeps_zero_rows():
+    result = normalize(np.array([[3.0, 4.0], [0.0, 0.0]], dtype=np.float32))
+    assert np.allclose(result[0], [0.6, 0.8])
+    assert np.allclose(result[1], [0.0, 0.0])
+
+
+def test_truncate_keeps_prefix_and_renormalizes(vectors):
+    result = truncate(vectors, 64)
+    assert result.shape == (32, 64)
+    assert np.allclose(np.linalg.norm(result, axis=1), 1.0, atol=1e-5)
+    # Same direction as the prefix it came from
+    prefix = vectors[:, :64]
+    assert np.allclose(result * np.linalg.norm(prefix, axis=1, keepdims=True), prefix, atol=1e-5)
+
+
+def test_float32_is_passthrough(vectors):
+    codes, scales = quantize(vectors, "float32")
+    assert scales is None
+    assert np.array_equal(dequantize(codes, scales), vectors)
+
+
+def test_float16_round_trip(vectors):
+    codes, scales = quantize(vectors, "float16")
+    assert codes.dtype == np.float16 and scales is None
+    assert np.allclose(dequantize(codes, scales), vectors, atol=1e-3)
+
+
+def test_int8_round_trip_error_is_within_half_a_step(vectors):
+    codes, scales = quantize(vectors, "int8")
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    assert codes.shape == vectors.shape and scales.shape == (32,)
+
+    decoded = dequantize(codes, scales)
+    error = np.abs(decoded - vectors).max(axis=1)
+    assert np.all(error <= scales / 2 + 1e-6)
+    cosine = np.sum(normalize(decoded) * vectors, axis=1)
+    assert cosine.min() > 0.999
+
+
+def test_int8_handles_zero_vectors():
+    codes, scales = quantize(np.zeros((2, 8), dtype=np.float32), "int8")
+    assert np.all(codes == 0)
+    assert np.allclose(dequantize(codes, scales), 0.0)
+
+
+# ==========================================================
+# COMPACT VECTOR FILE
+# ==========================================================
+
+
+@pytest.mark.parametrize("storage, atol", [("float16", 1e-3), ("int8", 1e-2)])
+def test_compact_vectors_save_load_round_trip(tmp_path, vectors, storage, atol):
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    saved = CompactVectors.save(str(tmp_path), ids, vectors, storage, index_dims=64)
+
+    loaded = CompactVectors.load(str(tmp_path))
+    assert loaded.meta == {"storage": storage, "dims": 384, "index_dims": 64}
+    assert loaded.nbytes == saved.nbytes
+    assert os.path.exists(tmp_path / COMPACT_SCALES_FILENAME) == (storage == "int8")
+
+    wanted = ["chunk-5", "chunk-0", "chunk-31"]
+    assert np.allclose(loaded.get(wanted), vectors[[5, 0, 31]], atol=atol)
+
+
+def test_compact_vectors_skip_unknown_ids(tmp_path, vectors):
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    compact = CompactVectors.save(str(tmp_path), ids, vectors, "int8", index_dims=64)
+    assert compact.get(["missing", "chunk-1"]).shape == (1, 384)
+
+
+def test_pending_marker_until_save_completes(tmp_path, vectors):
+    directory = str(tmp_path / "chroma_doc")
+    CompactVectors.begin(directory)
+    assert CompactVectors.pending(directory)
+    assert not CompactVectors.exists(directory)
+
+    CompactVectors.save(directory, ["a"], vectors[:1], "float16", index_dims=64)
+    assert CompactVectors.exists(directory)
+    assert not CompactVectors.pending(directory)
+    assert os.path.exists(os.path.join(directory, COMPACT_META_FILENAME))
+
+
+def test_truncated_embeddings_match_truncate():
+    embeddings = TruncatedEmbeddings(FixedEmbeddings(), dims=4)
+    documents = embeddings.embed_documents(["ab", "abcd"])
+    expected = truncate(np.asarray(FixedEmbeddings().embed_documents(["ab", "abcd"])), 4)
+    assert np.allclose(documents, expected)
+    assert np.allclose(embeddings.embed_query("ab"), expected[0])